@@ -10,6 +10,8 @@ env = os.getenv('FLASK_ENV', 'development')
 config_name = f"config.{env.capitalize()}Config"
 
 app = create_app(config_name)
+# Celery workers: celery -A app.celery_app worker --loglevel=info
+celery_app = app.extensions["celery"]
 
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=int(os.getenv('PORT', 5000)))
\ No newline at end of file
@@ -0,0 +1,6 @@
+from app import app
+from src.asgi import create_asgi_app
+
+# Serve with an ASGI server so chat questions are awaited instead of holding a worker:
+#   uvicorn asgi:asgi_app --host 0.0.0.0 --port 5000 --workers 4
+asgi_app = create_asgi_app(app)
@@ -15,6 +15,15 @@ class Config:
     
     # Redis Configuration
     REDIS_URL = os.environ.get('REDIS_URL') or 'redis://localhost:6379/0'
+
+    # Background chat jobs (POST /api/chat/sessions/<id>/messages?async=1), run by Celery workers
+    CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL') or REDIS_URL
+    CELERY_TASK_ALWAYS_EAGER = os.environ.get('CELERY_TASK_ALWAYS_EAGER', 'false').lower() == 'true'
+    CELERY_WORKER_CONCURRENCY = int(os.environ.get('CELERY_WORKER_CONCURRENCY', 4))
+    CHAT_JOB_MAX_CONCURRENT_PER_ORG = int(os.environ.get('CHAT_JOB_MAX_CONCURRENT_PER_ORG', 2))
+    CHAT_JOB_RETRY_DELAY_SECONDS = int(os.environ.get('CHAT_JOB_RETRY_DELAY_SECONDS', 5))
+    CHAT_JOB_TIMEOUT_SECONDS = int(os.environ.get('CHAT_JOB_TIMEOUT_SECONDS', 900))
+    CHAT_JOB_TTL_SECONDS = int(os.environ.get('CHAT_JOB_TTL_SECONDS', 86400))
     
     # Encryption key for data at rest
     ENCRYPTION_KEY = os.environ.get('ENCRYPTION_KEY')
@@ -32,7 +41,98 @@ class Config:
     OPENAI_API_KEY: Optional[str] = os.getenv("OPENAI_API_KEY")
     ANTHROPIC_API_KEY: Optional[str] = os.getenv("ANTHROPIC_API_KEY")
     GEMINI_API_KEY: Optional[str] = os.getenv("GEMINI_API_KEY")
+    # Upper bound on generated tokens per LLM call (required by the Anthropic API)
+    LLM_MAX_OUTPUT_TOKENS: int = int(os.getenv("LLM_MAX_OUTPUT_TOKENS", 4096))
+    # 'stateless' sends each pipeline stage only its own prompt plus a compact conversation summary;
+    # 'session' keeps one growing conversation per question
+    LLM_CONTEXT_MODE: str = os.getenv("LLM_CONTEXT_MODE", "stateless")
+    LLM_HISTORY_SUMMARY_MESSAGES: int = int(os.getenv("LLM_HISTORY_SUMMARY_MESSAGES", 6))
+    LLM_HISTORY_SUMMARY_CHARS: int = int(os.getenv("LLM_HISTORY_SUMMARY_CHARS", 500))
+    # Shared LLM HTTP clients: HTTP/2 keep-alive pools reused across requests
+    LLM_HTTP2: bool = os.getenv("LLM_HTTP2", "true").lower() == "true"
+    LLM_MAX_CONNECTIONS: int = int(os.getenv("LLM_MAX_CONNECTIONS", 50))
+    LLM_KEEPALIVE_EXPIRY_SECONDS: float = float(os.getenv("LLM_KEEPALIVE_EXPIRY_SECONDS", 120))
+    LLM_REQUEST_TIMEOUT_SECONDS: float = float(os.getenv("LLM_REQUEST_TIMEOUT_SECONDS", 120))
+    # Admission control per provider/model: RPM/TPM token buckets (0 = unlimited) and concurrent calls per
+    # worker, overridable per 'provider' or 'provider/model' with LLM_RATE_LIMITS (JSON). 'shared' keeps the
+    # buckets in Redis, 'local' per worker. 429/5xx responses are retried with jittered exponential backoff.
+    LLM_ADMISSION_ENABLED: bool = os.getenv("LLM_ADMISSION_ENABLED", "true").lower() == "true"
+    LLM_ADMISSION_MODE: str = os.getenv("LLM_ADMISSION_MODE", "shared").lower()
+    LLM_RPM_LIMIT: int = int(os.getenv("LLM_RPM_LIMIT", 0))
+    LLM_TPM_LIMIT: int = int(os.getenv("LLM_TPM_LIMIT", 0))
+    LLM_MAX_CONCURRENT_REQUESTS: int = int(os.getenv("LLM_MAX_CONCURRENT_REQUESTS", 16))
+    LLM_RATE_LIMITS: str = os.getenv("LLM_RATE_LIMITS", "{}")
+    LLM_OUTPUT_TOKENS_ESTIMATE: int = int(os.getenv("LLM_OUTPUT_TOKENS_ESTIMATE", 512))
+    LLM_ADMISSION_TIMEOUT_SECONDS: float = float(os.getenv("LLM_ADMISSION_TIMEOUT_SECONDS", 30))
+    LLM_RETRY_MAX_ATTEMPTS: int = int(os.getenv("LLM_RETRY_MAX_ATTEMPTS", 4))
+    LLM_RETRY_BASE_DELAY_SECONDS: float = float(os.getenv("LLM_RETRY_BASE_DELAY_SECONDS", 0.5))
+    LLM_RETRY_MAX_DELAY_SECONDS: float = float(os.getenv("LLM_RETRY_MAX_DELAY_SECONDS", 8))
+    # Hedged requests: LLM_STAGE_PROVIDERS (JSON) maps a stage ('classify', 'classify_plan', 'plan', 'summary',
+    # 'insight', 'general') to a 'provider' or 'provider/model' chain. The next provider is asked as well when
+    # the previous one has not answered within its LLM_HEDGE_PERCENTILE latency; the first valid answer wins
+    LLM_HEDGING_ENABLED: bool = os.getenv("LLM_HEDGING_ENABLED", "false").lower() == "true"
+    LLM_STAGE_PROVIDERS: str = os.getenv("LLM_STAGE_PROVIDERS", "{}")
+    LLM_HEDGE_PERCENTILE: float = float(os.getenv("LLM_HEDGE_PERCENTILE", 95))
+    LLM_HEDGE_MIN_SAMPLES: int = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", 20))
+    LLM_HEDGE_WINDOW: int = int(os.getenv("LLM_HEDGE_WINDOW", 200))
+    LLM_HEDGE_INITIAL_DELAY_SECONDS: float = float(os.getenv("LLM_HEDGE_INITIAL_DELAY_SECONDS", 8))
+    LLM_HEDGE_MIN_DELAY_SECONDS: float = float(os.getenv("LLM_HEDGE_MIN_DELAY_SECONDS", 1))
+    # Exact-match cache of LLM responses, scoped per organization (in-memory LRU plus Redis)
+    LLM_CACHE_ENABLED: bool = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+    LLM_CACHE_TTL_SECONDS: int = int(os.getenv("LLM_CACHE_TTL_SECONDS", 3600))
+    LLM_CACHE_MAX_ENTRIES: int = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 1024))
+    # Reuse of validated query plans for near-identical questions, per organization
+    PLAN_CACHE_ENABLED: bool = os.getenv("PLAN_CACHE_ENABLED", "true").lower() == "true"
+    PLAN_CACHE_SIMILARITY_THRESHOLD: float = float(os.getenv("PLAN_CACHE_SIMILARITY_THRESHOLD", 0.9))
+    PLAN_CACHE_TTL_SECONDS: int = int(os.getenv("PLAN_CACHE_TTL_SECONDS", 86400))
+    PLAN_CACHE_MAX_ENTRIES: int = int(os.getenv("PLAN_CACHE_MAX_ENTRIES", 2048))
+    # 'separate' (classify, then plan) or 'fused' (one LLM call returns intent, databases and plan,
+    # falling back to 'separate' when its output does not validate)
+    CLASSIFY_PLAN_MODE: str = os.getenv("CLASSIFY_PLAN_MODE", "separate").lower()
+    CLASSIFY_PLAN_FUSED_MAX_DBS: int = int(os.getenv("CLASSIFY_PLAN_FUSED_MAX_DBS", 3))
+    # Start planning on the only granted database while the classifier runs; the plan is used when
+    # the classifier agrees and cancelled otherwise
+    SPECULATIVE_PLANNING_ENABLED: bool = os.getenv("SPECULATIVE_PLANNING_ENABLED", "true").lower() == "true"
+    # Local intent pre-classifier in front of the LLM classifier; a share of its confident
+    # decisions is still sent to the LLM to measure agreement. The threshold is calibrated on
+    # held-out seed examples (flask train-intent-model --holdout): 0.99 is the lowest without misses
+    INTENT_PRECLASSIFIER_ENABLED: bool = os.getenv("INTENT_PRECLASSIFIER_ENABLED", "true").lower() == "true"
+    INTENT_PRECLASSIFIER_THRESHOLD: float = float(os.getenv("INTENT_PRECLASSIFIER_THRESHOLD", 0.99))
+    INTENT_PRECLASSIFIER_SHADOW_RATE: float = float(os.getenv("INTENT_PRECLASSIFIER_SHADOW_RATE", 0.05))
+    # Stream planner completions and start each query as soon as it is parsed
+    LLM_STREAMING_ENABLED: bool = os.getenv("LLM_STREAMING_ENABLED", "true").lower() == "true"
+    # Rows of each query result included in the 'query_result' events of streamed answers
+    SSE_PREVIEW_ROWS: int = int(os.getenv("SSE_PREVIEW_ROWS", 50))
     DEFAULT_MODEL_PROVIDER: str = os.getenv("DEFAULT_MODEL_PROVIDER", "gemini")
+
+    # Upper bound for one orchestrator run submitted from a sync view
+    ORCHESTRATOR_TIMEOUT_SECONDS: int = int(os.getenv("ORCHESTRATOR_TIMEOUT_SECONDS", 300))
+
+    # --- CUSTOMER DATA SOURCE CONNECTION POOLING ---
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", 5))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", 5))
+    DB_POOL_RECYCLE_SECONDS: int = int(os.getenv("DB_POOL_RECYCLE_SECONDS", 1800))
+    DB_ENGINE_IDLE_TTL_SECONDS: int = int(os.getenv("DB_ENGINE_IDLE_TTL_SECONDS", 900))
+    DB_ENGINE_MAX_PER_WORKER: int = int(os.getenv("DB_ENGINE_MAX_PER_WORKER", 32))
+    DB_CONNECT_TIMEOUT_SECONDS: float = float(os.getenv("DB_CONNECT_TIMEOUT_SECONDS", 10))
+    # When true, a question continues with the reachable data sources instead of failing
+    DB_SKIP_UNREACHABLE_SOURCES: bool = os.getenv("DB_SKIP_UNREACHABLE_SOURCES", "false").lower() == "true"
+    SCHEMA_CACHE_TTL_SECONDS: int = int(os.getenv("SCHEMA_CACHE_TTL_SECONDS", 3600))
+    SCHEMA_CACHE_MAX_ENTRIES: int = int(os.getenv("SCHEMA_CACHE_MAX_ENTRIES", 256))
+    SCHEMA_SAMPLE_ROWS: int = int(os.getenv("SCHEMA_SAMPLE_ROWS", 5))
+    SCHEMA_SAMPLE_CONCURRENCY: int = int(os.getenv("SCHEMA_SAMPLE_CONCURRENCY", 4))
+    SCHEMA_SAMPLE_VALUE_MAX_BYTES: int = int(os.getenv("SCHEMA_SAMPLE_VALUE_MAX_BYTES", 256))
+    # 'all' samples every table once and caches it, 'relevant' samples only the tables relevant to each question
+    SCHEMA_SAMPLE_MODE: str = os.getenv("SCHEMA_SAMPLE_MODE", "all")
+    SCHEMA_PRUNE_TOP_K: int = int(os.getenv("SCHEMA_PRUNE_TOP_K", 8))
+    SCHEMA_PRUNE_MIN_TABLES: int = int(os.getenv("SCHEMA_PRUNE_MIN_TABLES", 10))
+    MONGO_SCHEMA_MAX_DEPTH: int = int(os.getenv("MONGO_SCHEMA_MAX_DEPTH", 5))
+    MONGO_SCHEMA_MAX_FIELDS: int = int(os.getenv("MONGO_SCHEMA_MAX_FIELDS", 300))
+    MONGO_SCHEMA_CACHE_MAX_COLLECTIONS: int = int(os.getenv("MONGO_SCHEMA_CACHE_MAX_COLLECTIONS", 5000))
+    MONGO_MAX_CLIENTS_PER_WORKER: int = int(os.getenv("MONGO_MAX_CLIENTS_PER_WORKER", 16))
+    MONGO_MAX_POOL_SIZE: int = int(os.getenv("MONGO_MAX_POOL_SIZE", 20))
+    MONGO_SERVER_SELECTION_TIMEOUT_MS: int = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", 10000))
+    MONGO_HEARTBEAT_FREQUENCY_MS: int = int(os.getenv("MONGO_HEARTBEAT_FREQUENCY_MS", 10000))
     
     # Security
     BCRYPT_LOG_ROUNDS = 12
@@ -52,4 +152,7 @@ class TestingConfig(Config):
     ENCRYPTION_KEY = 'CejMECLCNMP2gbV7ugfAxH6zwo_WKqeF5WHx2_FFRZI='
     # Set dummy keys for testing
     GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "test-gemini-key")
-    GROQ_API_KEY = os.getenv("GROQ_API_KEY", "test-groq-key")
\ No newline at end of file
+    GROQ_API_KEY = os.getenv("GROQ_API_KEY", "test-groq-key")
+    # Jobs run in-process on an in-memory broker
+    CELERY_BROKER_URL = 'memory://'
+    CELERY_TASK_ALWAYS_EAGER = True
\ No newline at end of file
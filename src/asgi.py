@@ -0,0 +1,192 @@
+import asyncio
+import io
+import logging
+import re
+from urllib.parse import parse_qs
+
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+from flask import jsonify, Response
+
+from src.controllers.ai_controller import AICompute
+from src.controllers.chat_controller import ChatController
+from src.extensions import db
+from src.utils.async_runner import _close_shared_pools
+from src.utils.sse import format_sse, SSE_HEADERS
+
+logger = logging.getLogger(__name__)
+
+
+CHAT_MESSAGE_PATH = re.compile(r"^/api/chat/sessions/(?P<session_id>[^/]+)/messages/?$")
+CHAT_STREAM_PATH = re.compile(r"^/api/chat/sessions/(?P<session_id>[^/]+)/messages/stream/?$")
+
+
+class AskitASGIApp:
+    """
+    ASGI front for the Flask application.
+
+    Posting a chat message is handled natively: authentication, RBAC and the
+    database work run in a thread under a regular Flask request context, while
+    the orchestrator itself is awaited directly on the server's event loop.
+    A single process can therefore hold many in-flight questions without
+    tying up one worker per question. The streaming variant (Server-Sent
+    Events) is handled the same way. Every other route, including the rest
+    of the chat blueprint, is served through the WSGI adapter unchanged.
+    """
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.wsgi_app = WsgiToAsgi(flask_app)
+
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self._lifespan(receive, send)
+
+        if scope["type"] == "http" and scope["method"] == "POST":
+            match = CHAT_MESSAGE_PATH.match(scope["path"])
+            # Background submissions (?async=1) only queue a job; Flask handles them
+            if match and not self._is_async_submission(scope):
+                return await self._post_message(scope, receive, send, match["session_id"])
+            match = CHAT_STREAM_PATH.match(scope["path"])
+            if match:
+                return await self._stream_message(scope, receive, send, match["session_id"])
+
+        await self.wsgi_app(scope, receive, send)
+
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                try:
+                    await _close_shared_pools()
+                except Exception as e:
+                    logger.warning(f"Failed to close shared pools on shutdown: {e}")
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+    async def _post_message(self, scope, receive, send, session_id):
+        body = await self._read_body(receive)
+        environ = WsgiToAsgiInstance(self.flask_app).build_environ(scope, io.BytesIO(body))
+
+        exchange, response = await asyncio.to_thread(self._authorize, environ, session_id)
+        if response is None:
+            try:
+                ai_response_content, ai_metadata = await AICompute.process_query(**exchange['ai_inputs'])
+                response = await asyncio.to_thread(self._complete, environ, exchange, ai_response_content, ai_metadata)
+            except Exception as e:
+                logger.error(f"AI processing failed: {e}")
+                response = await asyncio.to_thread(self._error, environ, str(e))
+
+        status, headers, content = response
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": content})
+
+
+    async def _stream_message(self, scope, receive, send, session_id):
+        body = await self._read_body(receive)
+        environ = WsgiToAsgiInstance(self.flask_app).build_environ(scope, io.BytesIO(body))
+
+        exchange, response = await asyncio.to_thread(self._authorize, environ, session_id)
+        if response is not None:
+            status, headers, content = response
+            await send({"type": "http.response.start", "status": status, "headers": headers})
+            await send({"type": "http.response.body", "body": content})
+            return
+
+        status, headers, _ = await asyncio.to_thread(self._stream_start, environ)
+        headers = [(k, v) for k, v in headers if k != b"content-length"]
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+
+        async def emit(event, data):
+            await send({"type": "http.response.body", "body": format_sse(event, data).encode("utf-8"), "more_body": True})
+
+        events = asyncio.Queue()
+        task = asyncio.create_task(AICompute.process_query(**exchange['ai_inputs'], progress=lambda event, data: events.put_nowait((event, data))))
+        task.add_done_callback(lambda _: events.put_nowait(None))
+        try:
+            await emit("accepted", {"session_id": exchange['session_id']})
+            while (item := await events.get()) is not None:
+                await emit(*item)
+
+            try:
+                ai_response_content, ai_metadata = task.result()
+                message = await asyncio.to_thread(self._save, environ, exchange, ai_response_content, ai_metadata)
+                await emit("message", message)
+            except Exception as e:
+                logger.error(f"AI processing failed: {e}")
+                await asyncio.to_thread(self._rollback, environ)
+                await emit("error", {"message": str(e)})
+            await emit("done", {})
+        finally:
+            # Also reached when the client disconnects mid-stream
+            if not task.done():
+                task.cancel()
+            await send({"type": "http.response.body", "body": b""})
+
+
+    def _stream_start(self, environ):
+        with self.flask_app.request_context(environ):
+            return self._finalize_response(Response(mimetype='text/event-stream', headers=SSE_HEADERS))
+
+
+    def _save(self, environ, exchange, ai_response_content, ai_metadata):
+        with self.flask_app.request_context(environ):
+            return ChatController.save_message(exchange, ai_response_content, ai_metadata)
+
+
+    def _rollback(self, environ):
+        with self.flask_app.request_context(environ):
+            db.session.rollback()
+
+
+    def _authorize(self, environ, session_id):
+        with self.flask_app.request_context(environ):
+            rv = ChatController.authorize_message(session_id)
+            if isinstance(rv, dict):
+                return rv, None
+            return None, self._finalize_response(rv)
+
+
+    def _complete(self, environ, exchange, ai_response_content, ai_metadata):
+        with self.flask_app.request_context(environ):
+            return self._finalize_response(ChatController.complete_message(exchange, ai_response_content, ai_metadata))
+
+
+    def _error(self, environ, message):
+        with self.flask_app.request_context(environ):
+            db.session.rollback()
+            return self._finalize_response((jsonify({'message': message}), 500))
+
+
+    def _finalize_response(self, rv):
+        """Runs Flask's after-request processing (e.g. CORS) and serializes the response."""
+        response = self.flask_app.process_response(self.flask_app.make_response(rv))
+        headers = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in response.headers.items()]
+        return response.status_code, headers, response.get_data()
+
+
+    @staticmethod
+    def _is_async_submission(scope) -> bool:
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        return query.get("async", [""])[0].lower() in ("1", "true")
+
+
+    @staticmethod
+    async def _read_body(receive) -> bytes:
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] != "http.request":
+                break
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body"):
+                break
+        return b"".join(chunks)
+
+
+def create_asgi_app(flask_app) -> AskitASGIApp:
+    return AskitASGIApp(flask_app)
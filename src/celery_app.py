@@ -0,0 +1,33 @@
+from celery import Celery, Task
+from flask import Flask
+
+
+def celery_init_app(app: Flask) -> Celery:
+    """
+    Creates the Celery application for background chat jobs. Every task runs
+    inside the Flask app context, so models and extensions work as in a view.
+    Start workers with `celery -A app.celery_app worker`.
+    """
+
+    class FlaskTask(Task):
+        def __call__(self, *args, **kwargs):
+            with app.app_context():
+                return self.run(*args, **kwargs)
+
+    celery_app = Celery(app.import_name, task_cls=FlaskTask)
+    celery_app.conf.update(
+        broker_url=app.config["CELERY_BROKER_URL"],
+        task_always_eager=app.config["CELERY_TASK_ALWAYS_EAGER"],
+        task_default_queue="chat",
+        # Status and results live in the chat job store, not in a result backend
+        task_ignore_result=True,
+        # One question at a time per worker process; a crashed worker's job is redelivered
+        task_acks_late=True,
+        worker_prefetch_multiplier=1,
+        worker_concurrency=app.config["CELERY_WORKER_CONCURRENCY"],
+    )
+    celery_app.set_default()
+    app.extensions["celery"] = celery_app
+
+    import src.tasks.chat_tasks  # noqa: F401  (registers the tasks)
+    return celery_app
@@ -179,4 +179,64 @@ def seed():
         db.session.commit()
         click.echo(f'Created super admin user: {super_admin_user.email}')
 
-    click.echo('Database seeding process complete.')
\ No newline at end of file
+    click.echo('Database seeding process complete.')
+
+@click.command(name='benchmark-schema-format')
+@click.option('--tables', default=300, show_default=True, help='Number of synthetic tables.')
+@click.option('--columns', default=20, show_default=True, help='Columns per table.')
+@click.option('--rounds', default=20, show_default=True, help='Rendering rounds to time.')
+def benchmark_schema_format(tables, columns, rounds):
+    """Compares prompt size and rendering time of the JSON and compact schema formats."""
+    import json
+    import time
+    from src.utils.schema_format import SCHEMA_FORMAT_LEGEND, render_databases, render_schema_lines
+
+    types = ['INTEGER', 'VARCHAR(255)', 'TIMESTAMP WITHOUT TIME ZONE', 'NUMERIC(12, 2)', 'BOOLEAN', 'TEXT']
+    schema = {}
+    for t in range(tables):
+        cols = [{'name': 'id', 'type': 'INTEGER', 'nullable': False}]
+        cols += [{'name': f'column_{c}', 'type': types[c % len(types)], 'nullable': c % 3 == 0} for c in range(1, columns)]
+        fks = [{'column': 'column_1', 'referred_table': f'table_{t - 1}', 'referred_column': 'id'}] if t else []
+        schema[f'table_{t}'] = {'columns': cols, 'primary_key': ['id'], 'foreign_keys': fks}
+    schemas = {'synthetic_db': {'db_type': 'postgresql', 'schema': schema}}
+
+    def timed(render):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            text = render()
+        return text, (time.perf_counter() - start) * 1000 / rounds
+
+    # What the classifier (indented JSON) and the planner (dict repr) used to receive
+    json_text, json_ms = timed(lambda: json.dumps(schemas, indent=2))
+    repr_text, repr_ms = timed(lambda: str(schema))
+    compact_text, compact_ms = timed(lambda: f"{SCHEMA_FORMAT_LEGEND}\n\n{render_databases(schemas)}")
+
+    # In production the per-table lines are rendered once and cached with the schema
+    schemas['synthetic_db']['schema_lines'] = render_schema_lines(schema)
+    _, cached_ms = timed(lambda: f"{SCHEMA_FORMAT_LEGEND}\n\n{render_databases(schemas)}")
+
+    click.echo(f'Synthetic schema: {tables} tables x {columns} columns')
+    click.echo(f'{"format":<22}{"chars":>10}{"~tokens":>10}{"render ms":>12}')
+    for name, text, ms in [('json (indent=2)', json_text, json_ms), ('dict repr', repr_text, repr_ms),
+                           ('compact', compact_text, compact_ms), ('compact (cached)', compact_text, cached_ms)]:
+        click.echo(f'{name:<22}{len(text):>10}{len(text) // 4:>10}{ms:>12.2f}')
+    click.echo(f'Token reduction vs JSON: {100 * (1 - len(compact_text) / len(json_text)):.1f}%, '
+               f'vs dict repr: {100 * (1 - len(compact_text) / len(repr_text)):.1f}%')
+
+
+@click.command(name='train-intent-model')
+@click.option('--holdout', is_flag=True, help='Report leave-one-out precision and coverage per confidence threshold.')
+def train_intent_model(holdout):
+    """Retrains the local intent pre-classifier from src/resources/intent_seed_examples.json."""
+    import json
+    from config import Config
+    from src.utils.intent_model import train_from_seed, evaluate_holdout, MODEL_PATH, SEED_EXAMPLES_PATH
+    model = train_from_seed()
+    click.echo(f'Trained intent model on {len(model["vocabulary"])} features for intents {", ".join(model["classes"])}; saved to {MODEL_PATH}')
+    if holdout:
+        with open(SEED_EXAMPLES_PATH, 'r', encoding='utf-8') as f:
+            examples = json.load(f)
+        click.echo(f'{"threshold":<12}{"coverage":>10}{"precision":>11}   (current INTENT_PRECLASSIFIER_THRESHOLD={Config.INTENT_PRECLASSIFIER_THRESHOLD})')
+        for row in evaluate_holdout(examples, (0.8, 0.9, 0.95, 0.97, 0.99)):
+            precision = f'{row["precision"]:.2f}' if row["precision"] is not None else '-'
+            click.echo(f'{row["threshold"]:<12}{row["coverage"]:>10.2f}{precision:>11}')
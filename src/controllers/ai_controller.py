@@ -15,17 +15,18 @@ class AICompute:
     """
     
     @staticmethod
-    async def process_query(chat_id: str, user_query: str, db_credentials: list, enriched_schemas: dict, chat_history: list):
+    async def process_query(chat_id: str, user_query: str, db_credentials: list, enriched_schemas: dict, chat_history: list, organization_id: str = None, bypass_cache: bool = False, skip_unreachable_sources: bool = None, progress=None):
         """
         Translates Flask app data into the Pydantic models required by the AI orchestrator,
         runs the orchestrator, and returns the result.
         
         NOTE: Password decryption happens in the `UserDatabaseAccess.to_dict()` method
         before the data is passed to this function.
+
+        `progress(event, data)`, when given, is called as each stage of the
+        orchestrator finishes (see `ChatController.stream_message`).
         """
 
-        # TODO use the enriched schemas
-        
         connections: List[DBConnectionParams] = []
         for cred in db_credentials:
             params = DBConnectionParams(
@@ -36,16 +37,21 @@ class AICompute:
                 username=cred['username'],
                 password=SecretStr(cred['password']),
                 database=cred['database_name'],
+                schemas=(cred.get('extra_params') or {}).get('schemas'),
             )
             connections.append(params)
             
         request_payload = NLQueryRequest(
             question=user_query,
             chat_history=chat_history,
-            connections=connections
+            connections=connections,
+            schema_descriptions=enriched_schemas or {},
+            organization_id=organization_id,
+            bypass_cache=bypass_cache,
+            skip_unreachable_sources=skip_unreachable_sources
         )
 
-        final_response = await run_orchestrator(request_payload)
+        final_response = await run_orchestrator(request_payload, progress=progress)
         
         
         if final_response.success:
@@ -60,6 +66,10 @@ class AICompute:
                 "response_type": final_response.response_type,
                 "execution_time_ms": final_response.execution_time_ms,
             }
+            if final_response.unreachable_sources:
+                metadata["unreachable_sources"] = final_response.unreachable_sources
+            if final_response.diagnostics:
+                metadata["diagnostics"] = final_response.diagnostics
             return response_content, metadata
         else:
             raise Exception(f"AI Processing Error: {final_response.error_message}")
\ No newline at end of file
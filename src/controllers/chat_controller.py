@@ -1,13 +1,27 @@
-from flask import request, jsonify, g
+import logging
+import queue
+import uuid
+
+from flask import request, jsonify, g, Response, stream_with_context
 from src.models.chat import ChatSession, ChatMessage
 from src.extensions import db
 from src.middleware.auth_middleware import jwt_required_with_org
 from src.middleware.rbac_middleware import require_permission
 from src.services.audit_service import AuditService
 from src.services.schema_service import SchemaService
+from src.services.chat_service import ChatService
 from src.controllers.ai_controller import AICompute
-import asyncio
-import uuid
+from src.utils.async_runner import run_coroutine_sync, get_background_loop
+from src.utils.sse import format_sse, SSE_HEADERS
+from config import Config
+from src.services.llm_cache_service import llm_response_cache
+from src.services.intent_preclassifier_service import intent_preclassifier
+from src.services.speculation_service import speculation_tracker
+from src.services.llm_admission_service import llm_admission
+from src.services.llm_hedging_service import llm_hedging
+from src.services.chat_job_service import chat_jobs
+
+logger = logging.getLogger(__name__)
 
 class ChatController:
 
@@ -57,10 +71,11 @@ class ChatController:
         return jsonify([message.to_dict() for message in session.messages]), 200
 
     @staticmethod
-    @jwt_required_with_org
-    @require_permission('chat.create')
-    def post_message(session_id):
-        """Posts a message to a chat, gets a response from the AI, and returns it."""
+    def _prepare_message(session_id):
+        """
+        Validates a new question and gathers what the AI orchestrator needs.
+        Returns an error response, or a dict describing the pending exchange.
+        """
         session = ChatSession.query.filter_by(id=session_id, user_id=g.current_user.id).first()
         if not session:
             return jsonify({'message': 'Chat session not found or access denied'}), 404
@@ -70,58 +85,186 @@ class ChatController:
         if not user_query:
             return jsonify({'message': 'Query is required'}), 400
 
-        user_message = ChatMessage(session_id=session.id, sender='user', content=user_query)
-        db.session.add(user_message)
-
-        db_accesses = g.current_user.database_accesses.all()
-        if not db_accesses:
+        skip_unreachable = data.get('skip_unreachable_sources')
+        ai_inputs = ChatService.build_ai_inputs(
+            session, g.current_user, user_query,
+            bypass_cache=bool(data.get('bypass_cache', False)),
+            skip_unreachable_sources=None if skip_unreachable is None else bool(skip_unreachable)
+        )
+        if ai_inputs is None:
             return jsonify({'message': 'You do not have access to any databases to query.'}), 403
-        
-        db_credentials = [access.to_dict() for access in db_accesses]
-        
-        chat_history_models = ChatMessage.query.filter_by(session_id=session.id).order_by(ChatMessage.created_at.desc()).limit(10).all()
-        chat_history_models.reverse()
-        chat_history = [msg.to_dict() for msg in chat_history_models]
+
+        return {
+            'session_id': session.id,
+            'user_id': g.current_user.id,
+            'organization_id': g.current_organization.id,
+            'user_query': user_query,
+            'ai_inputs': ai_inputs,
+        }
+
+    @staticmethod
+    @jwt_required_with_org
+    @require_permission('chat.create')
+    def authorize_message(session_id):
+        """Authenticated entry point used by the ASGI chat handler before it awaits the orchestrator."""
+        return ChatController._prepare_message(session_id)
+
+    @staticmethod
+    def complete_message(exchange, ai_response_content, ai_metadata):
+        """Persists a finished exchange and builds the response returned to the client."""
+        response_message = ChatController.save_message(exchange, ai_response_content, ai_metadata)
+        return jsonify(response_message), 200
+
+    @staticmethod
+    def save_message(exchange, ai_response_content, ai_metadata):
+        """Persists a finished exchange and returns the saved AI message as a dict."""
+        ai_message = ChatService.save_exchange(
+            session_id=exchange['session_id'],
+            user_id=exchange['user_id'],
+            organization_id=exchange['organization_id'],
+            user_query=exchange['user_query'],
+            ai_content=ai_response_content,
+            ai_metadata=ai_metadata
+        )
+        return ai_message.to_dict()
+
+    @staticmethod
+    @jwt_required_with_org
+    @require_permission('chat.create')
+    def post_message(session_id):
+        """Posts a message to a chat, gets a response from the AI, and returns it."""
+        exchange = ChatController._prepare_message(session_id)
+        if not isinstance(exchange, dict):
+            return exchange
+
+        if request.args.get('async', '').lower() in ('1', 'true'):
+            return ChatController._submit_job(exchange)
         
         try:
-            # Run the async AI orchestrator from our sync Flask route
-            ai_response_content, ai_metadata = asyncio.run(AICompute.process_query(
-                chat_id=session.id,
-                user_query=user_query,
-                db_credentials=db_credentials,
-                enriched_schemas={}, # Pass enriched schemas if available, for now it's empty
-                chat_history=chat_history
-            ))
+            # Run the async AI orchestrator on the worker's long-lived event loop
+            ai_response_content, ai_metadata = run_coroutine_sync(AICompute.process_query(**exchange['ai_inputs']))
         except Exception as e:
             db.session.rollback()
-            print(f"AI processing failed: {e}")
+            logger.exception("AI processing failed")
             return jsonify({'message': str(e)}), 500
-        
-        import uuid
-
-        def make_json_serializable(obj):
-            if isinstance(obj, dict):
-                return {k: make_json_serializable(v) for k, v in obj.items()}
-            elif isinstance(obj, list):
-                return [make_json_serializable(i) for i in obj]
-            elif isinstance(obj, uuid.UUID):
-                return str(obj)
-            else:
-                return obj
-
-        # Ensure all UUIDs are converted to strings before saving
-        serializable_content = make_json_serializable(ai_response_content)
-        serializable_metadata = make_json_serializable(ai_metadata)
-        ai_message = ChatMessage(session_id=session.id, sender='ai', content=serializable_content, ai_metadata=serializable_metadata)
-        db.session.add(ai_message)
-        db.session.commit()
 
-        AuditService.log_action(
-            user_id=g.current_user.id,
-            organization_id=g.current_organization.id,
-            action='CHAT_MESSAGE_POSTED',
-            resource_type='chat_session',
-            resource_id=session.id
+        return ChatController.complete_message(exchange, ai_response_content, ai_metadata)
+
+    @staticmethod
+    def _submit_job(exchange):
+        """Queues the question for a Celery worker and returns 202 with the job id."""
+        from src.tasks.chat_tasks import answer_question
+
+        job_id = str(uuid.uuid4())
+        job = chat_jobs.create(job_id, exchange['user_id'], exchange['organization_id'], exchange['session_id'])
+        try:
+            answer_question.delay(
+                job_id, exchange['session_id'], exchange['user_id'], exchange['organization_id'],
+                exchange['user_query'], exchange['ai_inputs']['bypass_cache'],
+                skip_unreachable_sources=exchange['ai_inputs']['skip_unreachable_sources']
+            )
+        except Exception as e:
+            chat_jobs.update(job_id, status='failed', error=str(e))
+            return jsonify({'message': f'Could not queue the question: {e}'}), 503
+
+        # In eager mode the job has already run; report its current status when the store can tell
+        try:
+            job = chat_jobs.get(job_id) or job
+        except Exception:
+            pass
+        return jsonify({'job_id': job_id, 'status': job['status'], 'status_url': f'/api/chat/jobs/{job_id}'}), 202
+
+    @staticmethod
+    @jwt_required_with_org
+    @require_permission('chat.read')
+    def get_job(job_id):
+        """Returns the status, progress and, once finished, the saved message or error of a background question."""
+        try:
+            job = chat_jobs.get(job_id)
+        except Exception as e:
+            return jsonify({'message': f'Job status is temporarily unavailable: {e}'}), 503
+        if not job or job.get('user_id') != g.current_user.id:
+            return jsonify({'message': 'Job not found or access denied'}), 404
+        return jsonify(job), 200
+
+    @staticmethod
+    @jwt_required_with_org
+    @require_permission('chat.create')
+    def stream_message(session_id):
+        """
+        Streaming variant of post_message: reports each orchestrator stage as a
+        Server-Sent Event while the answer is computed, streams the analysis
+        text, and ends with the saved message ('message') and 'done'.
+        """
+        exchange = ChatController._prepare_message(session_id)
+        if not isinstance(exchange, dict):
+            return exchange
+
+        # The orchestrator runs on the worker's background loop; its progress reaches this thread through a queue
+        events = queue.Queue()
+        future = get_background_loop().submit(
+            AICompute.process_query(**exchange['ai_inputs'], progress=lambda event, data: events.put((event, data)))
         )
-        response_message = ai_message.to_dict()
-        return jsonify(response_message), 200
\ No newline at end of file
+        future.add_done_callback(lambda _: events.put(None))
+
+        @stream_with_context
+        def generate():
+            try:
+                yield format_sse('accepted', {'session_id': exchange['session_id']})
+                while True:
+                    item = events.get(timeout=Config.ORCHESTRATOR_TIMEOUT_SECONDS)
+                    if item is None:
+                        break
+                    yield format_sse(*item)
+
+                try:
+                    ai_response_content, ai_metadata = future.result()
+                    yield format_sse('message', ChatController.save_message(exchange, ai_response_content, ai_metadata))
+                except Exception as e:
+                    db.session.rollback()
+                    logger.exception("AI processing failed")
+                    yield format_sse('error', {'message': str(e)})
+            except queue.Empty:
+                yield format_sse('error', {'message': f"No progress within {Config.ORCHESTRATOR_TIMEOUT_SECONDS} seconds."})
+            finally:
+                # Also reached when the client disconnects mid-stream
+                if not future.done():
+                    future.cancel()
+            yield format_sse('done', {})
+
+        return Response(generate(), mimetype='text/event-stream', headers=SSE_HEADERS)
+
+    @staticmethod
+    @jwt_required_with_org
+    @require_permission('audit.read')
+    def get_llm_cache_stats():
+        """Returns the LLM response cache counters of this worker and of the current organization."""
+        return jsonify(llm_response_cache.stats(g.current_organization.id)), 200
+
+    @staticmethod
+    @jwt_required_with_org
+    @require_permission('audit.read')
+    def get_preclassifier_stats():
+        """Returns how often the local intent pre-classifier decided alone and how often it agreed with the LLM."""
+        return jsonify(intent_preclassifier.stats()), 200
+
+    @staticmethod
+    @jwt_required_with_org
+    @require_permission('audit.read')
+    def get_speculation_stats():
+        """Returns the hit rate and wasted tokens of speculative plan generation."""
+        return jsonify(speculation_tracker.stats()), 200
+
+    @staticmethod
+    @jwt_required_with_org
+    @require_permission('audit.read')
+    def get_llm_admission_stats():
+        """Returns queue depth, wait times, rejections and retries of LLM calls per provider and model."""
+        return jsonify(llm_admission.stats()), 200
+
+    @staticmethod
+    @jwt_required_with_org
+    @require_permission('audit.read')
+    def get_llm_hedging_stats():
+        """Returns which provider of each stage's chain answered, and the current hedge delays."""
+        return jsonify(llm_hedging.stats()), 200
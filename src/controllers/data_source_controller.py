@@ -7,6 +7,7 @@ from src.middleware.auth_middleware import jwt_required_with_org
 from src.middleware.rbac_middleware import require_permission
 from src.services.audit_service import AuditService
 from src.services.schema_service import SchemaService
+from src.services.schema_cache_service import schema_cache
 from src.utils.security import DataEncryption
 import uuid
 
@@ -210,4 +211,24 @@ class DataSourceController:
             )
             return jsonify(metadata.to_dict()), 200
         except Exception as e:
-            return jsonify({'message': f'Failed to update description: {e}'}), 500
\ No newline at end of file
+            return jsonify({'message': f'Failed to update description: {e}'}), 500
+
+    @staticmethod
+    @jwt_required_with_org
+    @require_permission('datasource.update')
+    def refresh_schema_cache(data_source_id):
+        """Discards the cached schema so the next question re-introspects the data source."""
+        ds = DataSource.query.filter_by(id=data_source_id, organization_id=g.current_organization.id).first()
+        if not ds:
+            return jsonify({'message': 'Data source not found or access denied'}), 404
+
+        schema_cache.invalidate(data_source_id)
+
+        AuditService.log_action(
+            user_id=g.current_user.id,
+            organization_id=g.current_organization.id,
+            action='SCHEMA_CACHE_REFRESHED',
+            resource_type='data_source',
+            resource_id=data_source_id
+        )
+        return jsonify({'message': 'Schema cache cleared. The schema will be re-inspected on the next question.'}), 200
\ No newline at end of file
@@ -14,6 +14,9 @@ def create_app(config_object_name='config.DevelopmentConfig'):
     if app.config.get('REDIS_URL'):
         redis_client.init_app(app)
 
+    from src.celery_app import celery_init_app
+    celery_init_app(app)
+
     from src.routes.auth_routes import auth_bp
     from src.routes.user_routes import user_bp
     from src.routes.role_routes import role_bp
@@ -36,8 +39,10 @@ def create_app(config_object_name='config.DevelopmentConfig'):
     app.register_blueprint(role_request_bp, url_prefix='/api/role-requests')
     app.register_blueprint(chat_bp, url_prefix='/api/chat')
 
-    from src.commands import seed
+    from src.commands import seed, benchmark_schema_format, train_intent_model
     app.cli.add_command(seed)
+    app.cli.add_command(benchmark_schema_format)
+    app.cli.add_command(train_intent_model)
 
     @jwt.expired_token_loader
     def expired_token_callback(jwt_header, jwt_payload):
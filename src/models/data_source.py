@@ -1,4 +1,7 @@
 from src.extensions import db
+from src.utils.connection_pool import engine_registry
+from src.services.schema_cache_service import schema_cache
+from sqlalchemy import event
 from datetime import datetime, timezone
 import uuid
 
@@ -42,6 +45,14 @@ class DataSource(db.Model):
             'created_at': self.created_at.isoformat()
         }
 
+@event.listens_for(DataSource, 'after_update')
+@event.listens_for(DataSource, 'after_delete')
+def _release_pooled_connections(mapper, connection, target):
+    """Drops pooled connections and cached schemas so changed or removed sources are never reused."""
+    engine_registry.invalidate(target.id)
+    schema_cache.invalidate(target.id)
+
+
 class SchemaMetadata(db.Model):
     __tablename__ = 'schema_metadata'
     
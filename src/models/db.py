@@ -1,5 +1,5 @@
 from pydantic import BaseModel, ConfigDict, Field, SecretStr
-from typing import Literal, Optional
+from typing import List, Literal, Optional
 
 
 # DB connection params
@@ -14,6 +14,7 @@ class DBConnectionParams(BaseModel):
     username: Optional[str] = None
     password: Optional[SecretStr] = None
     database: Optional[str] = None
+    schemas: Optional[List[str]] = Field(None, description="Database schemas to inspect, e.g. ['public', 'sales']. Defaults to the connection's current schema.")
     
 
     model_config = ConfigDict(extra="forbid")
\ No newline at end of file
@@ -13,6 +13,10 @@ class NLQueryRequest(BaseModel):
     model_provider: Optional[str] = Field(None)
     connections: List[DBConnectionParams] = []
     chat_history: List[ChatHistory] = []
+    skip_unreachable_sources: Optional[bool] = Field(None, description="Continue with reachable databases when some cannot be connected. Defaults to the server setting.")
+    schema_descriptions: Dict[str, Dict[str, Any]] = Field(default_factory=dict, description="Table and column descriptions per database, used to find the tables relevant to the question.")
+    organization_id: Optional[str] = Field(None, description="Organization asking the question; scopes the LLM response cache.")
+    bypass_cache: bool = Field(False, description="Always call the LLM, ignoring cached responses.")
 
     model_config = ConfigDict(extra="forbid")
 
@@ -33,6 +37,8 @@ class FinalResponse(BaseModel):
     visualization: Optional[Dict[str, Dict[str, Any]]] = Field(None, description="A dictionary suggesting appropriate visualizations for each data table.")
     table_desc: Optional[Dict[str, str]] = Field(None, description="A dictionary providing a one-line description for each data table.")
     error_message: Optional[str] = Field(None, description="Contains an error message if success is false.")
+    unreachable_sources: Optional[List[Dict[str, str]]] = Field(None, description="Databases that could not be connected and were left out of the answer.")
+    diagnostics: Optional[Dict[str, Any]] = Field(None, description="Per-request processing details, such as the prompt tokens saved by schema pruning.")
     
     model_config = ConfigDict(extra="forbid")
 
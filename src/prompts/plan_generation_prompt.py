@@ -1,59 +1,8 @@
-import json
-from datetime import datetime
-from bson import ObjectId
-from datetime import date
-from bson.decimal128 import Decimal128
+from src.utils.schema_format import SCHEMA_FORMAT_LEGEND, render_databases
 
 
-@staticmethod
-def _json_serializer(obj):
-    """
-    Custom JSON serializer to handle BSON and date/time types that are not
-    natively supported by the json library.
-    """
-    if isinstance(obj, ObjectId):
-        return str(obj)
-    if isinstance(obj, Decimal128):
-        return str(obj)
-    if isinstance(obj, (datetime, date)):
-        return obj.isoformat()
-    
-    # This will now only be raised for truly unhandled types.
-    raise TypeError(f"Object of type {obj.__class__.__name__} is not JSON serializable")
-  
-
-
-def get_multi_db_query_plan_prompt(schemas: dict, user_question: str, intent: str) -> str:
-    """
-    Generates a prompt that asks the LLM to act as a query planner for multiple databases.
-    """
-    
-    # We need to format the schemas nicely for the prompt.
-    formatted_schemas = ""
-    for db_id, db_info in schemas.items():
-        db_type = db_info['db_type']
-        schema_content = db_info['schema']
-        # Example data is very helpful for the LLM
-        example_data = json.dumps(db_info.get("example_data", "Not available"), indent=2, default=_json_serializer)
-        
-        formatted_schemas += f"""
-                                <database>
-                                  <db_id>{db_id}</db_id>
-                                  <db_type>{db_type}</db_type>
-                                  <schema>
-                                    {schema_content}
-                                  </schema>
-                                  <example_data>
-                                    {example_data}
-                                  </example_data>
-                                </database>
-                              """
-
-    return f'''
-      You are an expert multi-database query planner. Your sole function is to create a complete and executable "Data Assembly Plan" based on a user's question and a set of database schemas.
-Your response MUST be a single, raw JSON object and nothing else.
-
----
+# Output format, rules and worked examples shared by the planner and the fused classify-and-plan prompt
+PLAN_DIRECTIVES = '''---
 ### CORE DIRECTIVES
 
 1.  **THE JSON STRUCTURE**: Your output MUST be a JSON object with two keys: `queries` and `join_on`.
@@ -119,54 +68,69 @@ You MUST follow this exact five-step process internally before producing the fin
 **Example 1: Multiple Queries, No Joins**
 User Question: "Show me all users from 'California', and also list the 5 oldest users."
 ```json
-{{
+{
 "queries": [
-  {{ "query_id": 1, "db_id": "profiles_pg", "query_type": "select", "query": "SELECT id, email, state FROM users WHERE state = 'California'" }},
-  {{ "query_id": 2, "db_id": "profiles_pg", "query_type": "select", "query": "SELECT id, email, age FROM users ORDER BY age DESC LIMIT 5" }}
+  { "query_id": 1, "db_id": "profiles_pg", "query_type": "select", "query": "SELECT id, email, state FROM users WHERE state = 'California'" },
+  { "query_id": 2, "db_id": "profiles_pg", "query_type": "select", "query": "SELECT id, email, age FROM users ORDER BY age DESC LIMIT 5" }
 ],
 "join_on": []
-}}
+}
 
 **Example 2: Cross-Database Join (The ONLY Correct Way)
 User Question: "For users with a 'premium' membership, find their email and the tracking number for their most recent shipment."
-{{
+{
 "queries": [
-  {{ "query_id": 1, "db_id": "profiles_pg", "query_type": "select", "query": "SELECT id AS user_id, email FROM users" }},
-  {{ "query_id": 2, "db_id": "membership_mongo", "query_type": "find", "query": {{ "collection": "status", "filter": {{ "status": "premium" }}, "projection": {{ "userId": 1, "_id": 0 }} }} }},
-  {{ "query_id": 3, "db_id": "shipping_mysql", "query_type": "select", "query": "SELECT customer_id, tracking_number FROM shipments ORDER BY ship_date DESC" }}
+  { "query_id": 1, "db_id": "profiles_pg", "query_type": "select", "query": "SELECT id AS user_id, email FROM users" },
+  { "query_id": 2, "db_id": "membership_mongo", "query_type": "find", "query": { "collection": "status", "filter": { "status": "premium" }, "projection": { "userId": 1, "_id": 0 } } },
+  { "query_id": 3, "db_id": "shipping_mysql", "query_type": "select", "query": "SELECT customer_id, tracking_number FROM shipments ORDER BY ship_date DESC" }
 ],
 "join_on": [
   [
-    {{ "query_id": 1, "key": "user_id" }},
-    {{ "query_id": 2, "key": "userId" }},
-    {{ "query_id": 1, "key": "user_id" }},
-    {{ "query_id": 3, "key": "customer_id" }}
+    { "query_id": 1, "key": "user_id" },
+    { "query_id": 2, "key": "userId" },
+    { "query_id": 1, "key": "user_id" },
+    { "query_id": 3, "key": "customer_id" }
   ]
 ]
-}}
+}
 
 **Example 3: Multiple, Independent Join Groups
 User Question: "Show me the full user profiles for all premium members. Separately, list all products from 'Electronics' with their supplier's name."
-{{
+{
 "queries": [
-  {{ "query_id": 1, "db_id": "profiles_pg", "query_type": "select", "query": "SELECT id AS user_id, full_name, email FROM users" }},
-  {{ "query_id": 2, "db_id": "membership_mongo", "query_type": "find", "query": {{ "collection": "status", "filter": {{ "status": "premium" }}, "projection": {{ "userId": 1, "_id": 0 }} }} }},
-  {{ "query_id": 3, "db_id": "products_pg", "query_type": "select", "query": "SELECT product_name, supplier_id FROM products WHERE category = 'Electronics'" }},
-  {{ "query_id": 4, "db_id": "suppliers_mysql", "query_type": "select", "query": "SELECT id AS supplier_id, supplier_name FROM suppliers" }}
+  { "query_id": 1, "db_id": "profiles_pg", "query_type": "select", "query": "SELECT id AS user_id, full_name, email FROM users" },
+  { "query_id": 2, "db_id": "membership_mongo", "query_type": "find", "query": { "collection": "status", "filter": { "status": "premium" }, "projection": { "userId": 1, "_id": 0 } } },
+  { "query_id": 3, "db_id": "products_pg", "query_type": "select", "query": "SELECT product_name, supplier_id FROM products WHERE category = 'Electronics'" },
+  { "query_id": 4, "db_id": "suppliers_mysql", "query_type": "select", "query": "SELECT id AS supplier_id, supplier_name FROM suppliers" }
 ],
 "join_on": [
   [
-    {{ "query_id": 1, "key": "user_id" }},
-    {{ "query_id": 2, "key": "userId" }}
+    { "query_id": 1, "key": "user_id" },
+    { "query_id": 2, "key": "userId" }
   ],
   [
-    {{ "query_id": 3, "key": "supplier_id" }},
-    {{ "query_id": 4, "key": "supplier_id" }}
+    { "query_id": 3, "key": "supplier_id" },
+    { "query_id": 4, "key": "supplier_id" }
   ]
 ]
-}}
+}
+
+'''
+
+
+def get_multi_db_query_plan_prompt(schemas: dict, user_question: str, intent: str) -> str:
+    """
+    Generates a prompt that asks the LLM to act as a query planner for multiple databases.
+    """
+    
+    # Compact notation: one line per table, plus minified example rows
+    formatted_schemas = f"{SCHEMA_FORMAT_LEGEND}\n\n{render_databases(schemas, include_examples=True)}"
+
+    return f'''
+      You are an expert multi-database query planner. Your sole function is to create a complete and executable "Data Assembly Plan" based on a user's question and a set of database schemas.
+Your response MUST be a single, raw JSON object and nothing else.
 
-### DATABASES & SCHEMAS
+{PLAN_DIRECTIVES}### DATABASES & SCHEMAS
 {formatted_schemas}
 TASK
 You are now ready. Analyze the schemas and user question below. Adhere to all directives. Produce only the raw JSON Data Assembly Plan.
@@ -9,4 +9,15 @@ chat_bp.add_url_rule('/sessions', 'get_user_chat_sessions', ChatController.get_u
 
 # Interact with a specific chat session
 chat_bp.add_url_rule('/sessions/<session_id>/messages', 'get_chat_history', ChatController.get_chat_history, methods=['GET'])
-chat_bp.add_url_rule('/sessions/<session_id>/messages', 'post_message', ChatController.post_message, methods=['POST'])
\ No newline at end of file
+chat_bp.add_url_rule('/sessions/<session_id>/messages', 'post_message', ChatController.post_message, methods=['POST'])
+chat_bp.add_url_rule('/sessions/<session_id>/messages/stream', 'stream_message', ChatController.stream_message, methods=['POST'])
+
+# Background questions (POST .../messages?async=1)
+chat_bp.add_url_rule('/jobs/<job_id>', 'get_job', ChatController.get_job, methods=['GET'])
+
+# LLM response cache, intent pre-classifier, speculative planning, LLM admission and hedging metrics
+chat_bp.add_url_rule('/llm-cache/stats', 'get_llm_cache_stats', ChatController.get_llm_cache_stats, methods=['GET'])
+chat_bp.add_url_rule('/intent-preclassifier/stats', 'get_preclassifier_stats', ChatController.get_preclassifier_stats, methods=['GET'])
+chat_bp.add_url_rule('/speculation/stats', 'get_speculation_stats', ChatController.get_speculation_stats, methods=['GET'])
+chat_bp.add_url_rule('/llm-admission/stats', 'get_llm_admission_stats', ChatController.get_llm_admission_stats, methods=['GET'])
+chat_bp.add_url_rule('/llm-hedging/stats', 'get_llm_hedging_stats', ChatController.get_llm_hedging_stats, methods=['GET'])
\ No newline at end of file
@@ -7,4 +7,5 @@ datasource_bp.add_url_rule('/', 'list_data_sources', DataSourceController.list_d
 datasource_bp.add_url_rule('/bulk-upload', 'bulk_upload', DataSourceController.bulk_upload, methods=['POST'])
 
 datasource_bp.add_url_rule('/<data_source_id>/schema', 'get_enriched_schema', DataSourceController.get_enriched_schema, methods=['GET'])
-datasource_bp.add_url_rule('/<data_source_id>/schema/description', 'update_schema_description', DataSourceController.update_schema_description, methods=['POST'])
\ No newline at end of file
+datasource_bp.add_url_rule('/<data_source_id>/schema/description', 'update_schema_description', DataSourceController.update_schema_description, methods=['POST'])
+datasource_bp.add_url_rule('/<data_source_id>/schema/refresh', 'refresh_schema_cache', DataSourceController.refresh_schema_cache, methods=['POST'])
\ No newline at end of file
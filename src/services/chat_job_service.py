@@ -0,0 +1,142 @@
+import json
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from config import Config
+from src.utils.redis_store import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+class ChatJobStore:
+    """
+    Status, progress and result of background chat questions (`?async=1`).
+
+    A job is a Redis hash with its status ('queued', 'running', 'succeeded' or
+    'failed'), owner and result, plus a Redis list of progress events; both
+    expire after CHAT_JOB_TTL_SECONDS. The store also caps how many jobs of one
+    organization run at once, so a single organization cannot occupy every
+    worker. Without Redis (tests, eager mode) everything is kept in process.
+    """
+
+    REDIS_PREFIX = "chat_job"
+    # Events worth keeping for status polling; analysis tokens are only useful to live streams
+    PROGRESS_EVENTS = ("schemas_loaded", "intent", "connections_ready", "schemas_ready", "plan", "query_result", "join_complete")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._events: Dict[str, list] = {}
+        self._running: Dict[str, int] = {}
+
+
+    def create(self, job_id: str, user_id: str, organization_id: str, session_id: str) -> Dict[str, Any]:
+        job = {
+            "status": "queued",
+            "user_id": user_id,
+            "organization_id": organization_id,
+            "session_id": session_id,
+            "created_at": time.time(),
+        }
+        self.update(job_id, **job)
+        return {"job_id": job_id, **job}
+
+
+    def update(self, job_id: str, **fields: Any) -> None:
+        redis = get_redis()
+        if redis is None:
+            with self._lock:
+                self._jobs.setdefault(job_id, {}).update(fields)
+            return
+        try:
+            key = self._key(job_id)
+            redis.hset(key, mapping={name: json.dumps(value, default=str) for name, value in fields.items()})
+            redis.expire(key, Config.CHAT_JOB_TTL_SECONDS)
+        except Exception as e:
+            logger.warning(f"Failed to update chat job {job_id} in Redis: {e}")
+
+
+    def add_progress(self, job_id: str, event: str, data: Dict[str, Any]) -> None:
+        if event not in self.PROGRESS_EVENTS:
+            return
+        if event == "query_result":
+            data = {k: v for k, v in data.items() if k != "rows"}
+        entry = {"event": event, "data": data, "at": time.time()}
+
+        redis = get_redis()
+        if redis is None:
+            with self._lock:
+                self._events.setdefault(job_id, []).append(entry)
+            return
+        try:
+            key = f"{self._key(job_id)}:events"
+            redis.rpush(key, json.dumps(entry, default=str))
+            redis.expire(key, Config.CHAT_JOB_TTL_SECONDS)
+        except Exception as e:
+            logger.warning(f"Failed to record progress of chat job {job_id} in Redis: {e}")
+
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        redis = get_redis()
+        if redis is None:
+            with self._lock:
+                job = dict(self._jobs[job_id]) if job_id in self._jobs else None
+                events = list(self._events.get(job_id, []))
+        else:
+            try:
+                pipe = redis.pipeline()
+                pipe.hgetall(self._key(job_id))
+                pipe.lrange(f"{self._key(job_id)}:events", 0, -1)
+                raw, raw_events = pipe.execute()
+                job = {(k.decode() if isinstance(k, bytes) else k): json.loads(v) for k, v in raw.items()} or None
+                events = [json.loads(item) for item in raw_events]
+            except Exception as e:
+                logger.warning(f"Failed to read chat job {job_id} from Redis: {e}")
+                raise
+        if job is None:
+            return None
+        return {"job_id": job_id, **job, "progress": events}
+
+
+    def acquire_slot(self, organization_id: str) -> bool:
+        """Claims one of the organization's CHAT_JOB_MAX_CONCURRENT_PER_ORG running slots; Redis errors are raised."""
+        limit = Config.CHAT_JOB_MAX_CONCURRENT_PER_ORG
+        redis = get_redis()
+        if redis is None:
+            with self._lock:
+                if self._running.get(organization_id, 0) >= limit:
+                    return False
+                self._running[organization_id] = self._running.get(organization_id, 0) + 1
+                return True
+
+        key = f"{self.REDIS_PREFIX}:running:{organization_id}"
+        # A worker killed mid-job never releases its slot; the counter expires instead
+        pipe = redis.pipeline()
+        pipe.incr(key)
+        pipe.expire(key, Config.CHAT_JOB_TIMEOUT_SECONDS * 2)
+        running = pipe.execute()[0]
+        if running > limit:
+            redis.decr(key)
+            return False
+        return True
+
+
+    def release_slot(self, organization_id: str) -> None:
+        redis = get_redis()
+        if redis is None:
+            with self._lock:
+                self._running[organization_id] = max(self._running.get(organization_id, 1) - 1, 0)
+            return
+        try:
+            redis.decr(f"{self.REDIS_PREFIX}:running:{organization_id}")
+        except Exception as e:
+            logger.warning(f"Failed to release chat job slot of organization {organization_id}: {e}")
+
+
+    def _key(self, job_id: str) -> str:
+        return f"{self.REDIS_PREFIX}:{job_id}"
+
+
+chat_jobs = ChatJobStore()
@@ -0,0 +1,86 @@
+from src.models.chat import ChatMessage
+from src.models.data_source import SchemaMetadata
+from src.extensions import db
+from src.services.audit_service import AuditService
+import uuid
+
+
+class ChatService:
+
+    HISTORY_LIMIT = 10
+
+    @staticmethod
+    def _make_json_serializable(obj):
+        if isinstance(obj, dict):
+            return {k: ChatService._make_json_serializable(v) for k, v in obj.items()}
+        elif isinstance(obj, list):
+            return [ChatService._make_json_serializable(i) for i in obj]
+        elif isinstance(obj, uuid.UUID):
+            return str(obj)
+        else:
+            return obj
+
+    @staticmethod
+    def build_ai_inputs(session, user, user_query: str, bypass_cache: bool = False, skip_unreachable_sources: bool = None):
+        """
+        Collects the arguments for `AICompute.process_query` for a new question.
+        `skip_unreachable_sources` overrides DB_SKIP_UNREACHABLE_SOURCES when set.
+        Returns None if the user has not been granted any database.
+        """
+        db_accesses = user.database_accesses.all()
+        if not db_accesses:
+            return None
+
+        db_credentials = [access.to_dict() for access in db_accesses]
+
+        # The latest messages of the session, followed by the question being asked
+        chat_history_models = ChatMessage.query.filter_by(session_id=session.id).order_by(ChatMessage.created_at.desc()).limit(ChatService.HISTORY_LIMIT - 1).all()
+        chat_history_models.reverse()
+        chat_history = [msg.to_dict() for msg in chat_history_models]
+        chat_history.append({'role': 'user', 'content': user_query})
+
+        return {
+            'chat_id': session.id,
+            'user_query': user_query,
+            'db_credentials': db_credentials,
+            'enriched_schemas': ChatService._load_schema_descriptions([c['data_source_id'] for c in db_credentials]),
+            'chat_history': chat_history,
+            'organization_id': session.organization_id,
+            'bypass_cache': bypass_cache,
+            'skip_unreachable_sources': skip_unreachable_sources,
+        }
+
+    @staticmethod
+    def _load_schema_descriptions(data_source_ids: list) -> dict:
+        """Returns the stored table and column descriptions as {data_source_id: {table: {'description', 'columns'}}}."""
+        descriptions = {}
+        records = SchemaMetadata.query.filter(SchemaMetadata.data_source_id.in_(data_source_ids)).all()
+        for record in records:
+            table = descriptions.setdefault(record.data_source_id, {}).setdefault(record.table_name, {'description': None, 'columns': {}})
+            if record.column_name:
+                table['columns'][record.column_name] = record.description
+            else:
+                table['description'] = record.description
+        return descriptions
+
+    @staticmethod
+    def save_exchange(session_id: str, user_id: str, organization_id: str, user_query: str, ai_content: dict, ai_metadata: dict) -> ChatMessage:
+        """Persists the user's question and the AI answer, and records the audit entry."""
+        user_message = ChatMessage(session_id=session_id, sender='user', content=user_query)
+        db.session.add(user_message)
+
+        # Ensure all UUIDs are converted to strings before saving
+        serializable_content = ChatService._make_json_serializable(ai_content)
+        serializable_metadata = ChatService._make_json_serializable(ai_metadata)
+        ai_message = ChatMessage(session_id=session_id, sender='ai', content=serializable_content, ai_metadata=serializable_metadata)
+        db.session.add(ai_message)
+        db.session.commit()
+
+        AuditService.log_action(
+            user_id=user_id,
+            organization_id=organization_id,
+            action='CHAT_MESSAGE_POSTED',
+            resource_type='chat_session',
+            resource_id=session_id
+        )
+        return ai_message
@@ -0,0 +1,47 @@
+from src.prompts.classify_and_plan_prompt import get_classify_and_plan_prompt
+from src.services.query_generator_service import QueryGenerator
+from src.utils.llm_configuration import LLMConfig
+from src.utils.exceptions import LLMNotConfiguredError
+
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+async def classify_and_plan(model: LLMConfig, schemas: dict, question: str) -> dict:
+    """
+    Classifies the question and plans its queries with a single LLM call.
+    Returns {'error': [...]} when the response does not validate, so the caller can fall back to the two-step path.
+    """
+    if not model:
+        logger.error("LLM needs to be configured")
+        raise LLMNotConfiguredError
+
+    try:
+        prompt = get_classify_and_plan_prompt(schemas, question)
+        result = await model.agenerate_response(prompt, stage="classify_plan")
+        if not isinstance(result, dict):
+            return {"error": ["Fused response is not a JSON object"]}
+
+        intent = result.get("intent")
+        if intent in ["general", "dangerous"]:
+            return {"question_type": intent, "target_db_ids": []}
+        if intent not in ["query", "analysis"]:
+            return {"error": [f"Fused classifier returned an unknown intent: {intent}"]}
+
+        db_ids = result.get("db_ids")
+        if not isinstance(db_ids, list) or not db_ids:
+            return {"error": [f"Fused response for 'db_ids' was not a non-empty list, but {db_ids!r}"]}
+        invalid_dbs = [db_id for db_id in db_ids if db_id not in schemas]
+        if invalid_dbs:
+            return {"error": [f"Fused classifier selected one or more invalid db_ids: {', '.join(map(str, invalid_dbs))}"]}
+
+        plan = {"queries": result.get("queries"), "join_on": result.get("join_on")}
+        QueryGenerator.validate_plan(plan, db_ids)
+        if not plan["queries"]:
+            return {"error": ["Fused response contains no queries"]}
+
+        return {"question_type": intent, "target_db_ids": db_ids, "generated_query_plan": plan}
+
+    except Exception as e:
+        return {"error": [f"Failed to parse fused classify-and-plan response: {e}"]}
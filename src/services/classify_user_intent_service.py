@@ -16,7 +16,7 @@ async def classify_user_intent(model: LLMConfig, schemas_str, question, state):
 
     try:
         prompt = get_classify_user_intent_prompt(schemas_str, question)
-        response = model.generate_response(prompt)
+        response = await model.agenerate_response(prompt, stage="classify")
         result = response
 
         intent = result.get("intent")
@@ -1,18 +1,26 @@
+import asyncio
 import logging
-from typing import Union, Set, Dict, Any
-from sqlalchemy import inspect, text
+from typing import Union, Set, Dict, Any, List, Optional
+from sqlalchemy import inspect, text, bindparam
 from sqlalchemy.ext.asyncio import AsyncEngine
 from pymongo.database import Database as MongoDatabase
+from cachetools import TTLCache
+from config import Config
 import uuid
+import hashlib
 from decimal import Decimal
 
 
 logger = logging.getLogger(__name__)
 
 class DatabaseInspector:
-    def __init__(self, db_connection: Union[AsyncEngine, MongoDatabase], db_type: str):
+    def __init__(self, db_connection: Union[AsyncEngine, MongoDatabase], db_type: str, schemas: Optional[List[str]] = None, cache_namespace: Optional[str] = None):
         self.db_connection = db_connection
         self.db_type = db_type
+        # Database schemas (namespaces) to inspect; defaults to the connection's current schema
+        self.schemas = schemas
+        # Identifies the data source for per-collection caches; caching is off when None
+        self.cache_namespace = cache_namespace
     
 
     def make_json_serializable(self, obj):
@@ -27,10 +35,10 @@ class DatabaseInspector:
         else:
             return obj
 
-    async def get_schema_representation(self) -> dict:
+    async def get_schema_representation(self, include_example_data: bool = True) -> dict:
         try:
             if self.db_type in ['postgresql', 'mysql']:
-                return self.make_json_serializable(await self._get_sql_schema())
+                return self.make_json_serializable(await self._get_sql_schema(include_example_data))
             elif self.db_type == 'mongodb':
                 return self.make_json_serializable(await self._get_mongo_schema())
             else:
@@ -40,41 +48,262 @@ class DatabaseInspector:
             logger.error(f"Error inspecting database schema for {self.db_type}: {e}")
             raise ValueError(f"Unsupported database type for inspection: {self.db_type}")
 
-    async def _get_sql_schema(self) -> dict:
+    # Cheap catalog queries whose result changes whenever tables, columns, primary keys or foreign keys
+    # of the inspected schemas change
+    SQL_FINGERPRINT_QUERIES = {
+        'postgresql': """
+            SELECT
+                (SELECT md5(string_agg(table_schema || '.' || table_name || '.' || column_name || ':' || data_type || ':' || is_nullable,
+                                       ',' ORDER BY table_schema, table_name, ordinal_position))
+                 FROM information_schema.columns
+                 WHERE table_schema IN :schemas),
+                (SELECT md5(string_agg(tc.table_schema || '.' || tc.table_name || '.' || tc.constraint_name || ':' || tc.constraint_type
+                                       || ':' || k.column_name || ':' || k.ordinal_position || ':' || coalesce(rc.unique_constraint_schema || '.' || rc.unique_constraint_name, ''),
+                                       ',' ORDER BY tc.table_schema, tc.table_name, tc.constraint_name, k.ordinal_position))
+                 FROM information_schema.table_constraints tc
+                 JOIN information_schema.key_column_usage k
+                   ON k.constraint_schema = tc.constraint_schema AND k.constraint_name = tc.constraint_name AND k.table_name = tc.table_name
+                 LEFT JOIN information_schema.referential_constraints rc
+                   ON rc.constraint_schema = tc.constraint_schema AND rc.constraint_name = tc.constraint_name
+                 WHERE tc.constraint_type IN ('PRIMARY KEY', 'FOREIGN KEY') AND tc.table_schema IN :schemas)
+        """,
+        'mysql': """
+            SELECT
+                (SELECT CONCAT(COUNT(*), ':', COALESCE(SUM(CRC32(CONCAT_WS(':', table_schema, table_name, column_name, column_type, is_nullable, ordinal_position))), 0))
+                 FROM information_schema.columns
+                 WHERE table_schema IN :schemas),
+                (SELECT CONCAT(COUNT(*), ':', COALESCE(SUM(CRC32(CONCAT_WS(':', k.table_schema, k.table_name, k.constraint_name, tc.constraint_type, k.column_name,
+                                                                          k.ordinal_position, k.referenced_table_schema, k.referenced_table_name, k.referenced_column_name))), 0))
+                 FROM information_schema.key_column_usage k
+                 JOIN information_schema.table_constraints tc
+                   ON tc.constraint_schema = k.constraint_schema AND tc.table_name = k.table_name AND tc.constraint_name = k.constraint_name
+                 WHERE tc.constraint_type IN ('PRIMARY KEY', 'FOREIGN KEY') AND k.table_schema IN :schemas)
+        """,
+    }
+
+    async def get_schema_fingerprint(self) -> Union[str, None]:
+        """
+        Returns a hash describing the current shape of the database, used to
+        validate cached schemas. Returns None if it cannot be computed.
+
+        SQL fingerprints cover the columns and PK/FK constraints of the same
+        schemas that are introspected. Mongo has no catalog of fields, and
+        reading documents would cost a round trip per collection on every
+        question, so its fingerprint only covers cheap metadata: the
+        collections with their options (validators) and the index count.
+        Field changes that leave those alone go unnoticed until the cached
+        schema expires (SCHEMA_CACHE_TTL_SECONDS).
+        """
+        try:
+            if self.db_type in self.SQL_FINGERPRINT_QUERIES:
+                engine: AsyncEngine = self.db_connection
+                async with engine.connect() as connection:
+                    schemas = self.schemas
+                    if not schemas:
+                        current_schema_query = self.BULK_CATALOG_QUERIES[self.db_type]['current_schema']
+                        schemas = [(await connection.execute(text(current_schema_query))).scalar()]
+                    query = text(self.SQL_FINGERPRINT_QUERIES[self.db_type]).bindparams(bindparam('schemas', expanding=True))
+                    result = await connection.execute(query, {"schemas": schemas})
+                    raw = f"{sorted(schemas)}|{tuple(result.first() or ())}"
+            elif self.db_type == 'mongodb':
+                raw = await self._mongo_fingerprint_source()
+            else:
+                return None
+            return hashlib.md5(raw.encode('utf-8')).hexdigest()
+        except Exception as e:
+            logger.warning(f"Failed to compute schema fingerprint for {self.db_type}: {e}")
+            return None
+
+    async def _mongo_fingerprint_source(self) -> str:
+        # Two round trips regardless of the number of collections
+        db: MongoDatabase = self.db_connection
+        collections = sorted(
+            [(info["name"], str(sorted((info.get("options") or {}).items()))) async for info in await db.list_collections()]
+        )
+        stats = await db.command('dbStats')
+        return f"{collections}|{stats.get('indexes')}"
+
+    async def _get_sql_schema(self, include_example_data: bool = True) -> dict:
         engine: AsyncEngine = self.db_connection
         async with engine.connect() as connection:
-            # Call the sync schema inspector logic inside run_sync
-            schema = await connection.run_sync(self._inspect_sql_sync)
+            try:
+                schema = await self._inspect_sql_bulk(connection)
+            except Exception as e:
+                # Fall back to per-table reflection, called inside run_sync
+                logger.warning(f"Bulk catalog introspection failed for {self.db_type}, falling back to reflection: {e}")
+                schema = await connection.run_sync(self._inspect_sql_sync)
+        if not include_example_data:
+            return {"schema": schema}
+
+        example_data = await self.sample_example_data(schema)
+        return {"schema": schema, "example_data": example_data}
+
+
+    # Column types whose values are too large to be useful as prompt examples
+    OVERSIZED_TYPE_MARKERS = ('BLOB', 'BYTEA', 'BINARY', 'LONGTEXT', 'MEDIUMTEXT', 'GEOMETRY', 'TSVECTOR')
 
-            example_data = {}
-            for table_name in schema.keys():
-                result = await connection.execute(text(f"SELECT * FROM {table_name} LIMIT 5"))
-                rows = [dict(row) for row in result.mappings().all()]
-                example_data[table_name] = rows
+    async def sample_example_data(self, schema: dict, tables: Optional[List[str]] = None) -> dict:
+        """
+        Fetches a few example rows per table, concurrently over a small number of
+        pooled connections. Oversized columns are left out and long values are
+        truncated to a byte budget. Pass `tables` to sample only those tables.
+        """
+        engine: AsyncEngine = self.db_connection
+        preparer = engine.dialect.identifier_preparer
+        semaphore = asyncio.Semaphore(Config.SCHEMA_SAMPLE_CONCURRENCY)
+        row_limit = int(Config.SCHEMA_SAMPLE_ROWS)
+
+        async def sample(table_name: str):
+            columns = [
+                col['name'] for col in schema[table_name]['columns']
+                if not any(marker in str(col['type']).upper() for marker in self.OVERSIZED_TYPE_MARKERS)
+            ]
+            if not columns:
+                return table_name, []
+            select_list = ", ".join(preparer.quote(col) for col in columns)
+            table_ref = ".".join(preparer.quote(part) for part in table_name.split(".", 1))
+            try:
+                async with semaphore:
+                    async with engine.connect() as connection:
+                        result = await connection.execute(text(f"SELECT {select_list} FROM {table_ref} LIMIT {row_limit}"))
+                        rows = result.mappings().all()
+                return table_name, [{key: self._truncate_value(value) for key, value in row.items()} for row in rows]
+            except Exception as e:
+                logger.warning(f"Failed to sample example rows from {table_name}: {e}")
+                return table_name, []
+
+        table_names = [t for t in (tables if tables is not None else schema.keys()) if t in schema]
+        return dict(await asyncio.gather(*(sample(t) for t in table_names)))
+
+
+    @staticmethod
+    def _truncate_value(value):
+        budget = Config.SCHEMA_SAMPLE_VALUE_MAX_BYTES
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return f"<binary {len(value)} bytes>"
+        if isinstance(value, str):
+            encoded = value.encode('utf-8')
+            if len(encoded) > budget:
+                return encoded[:budget].decode('utf-8', errors='ignore') + '...'
+        return value
 
-            return {"schema": schema, "example_data": example_data}
+
+    # One query for every column and one for every PK/FK column of the inspected schemas.
+    # Both return rows in a dialect-neutral shape so the assembly below is shared.
+    BULK_CATALOG_QUERIES = {
+        'postgresql': {
+            'current_schema': "SELECT current_schema()",
+            'columns': """
+                SELECT n.nspname, c.relname, a.attname, format_type(a.atttypid, a.atttypmod), NOT a.attnotnull
+                FROM pg_catalog.pg_attribute a
+                JOIN pg_catalog.pg_class c ON c.oid = a.attrelid
+                JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+                WHERE c.relkind IN ('r', 'p') AND NOT c.relispartition
+                  AND a.attnum > 0 AND NOT a.attisdropped
+                  AND n.nspname IN :schemas
+                ORDER BY n.nspname, c.relname, a.attnum
+            """,
+            'constraints': """
+                SELECT n.nspname, c.relname, con.contype, a.attname, rn.nspname, rc.relname, ra.attname
+                FROM pg_catalog.pg_constraint con
+                JOIN pg_catalog.pg_class c ON c.oid = con.conrelid
+                JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+                CROSS JOIN LATERAL unnest(con.conkey, con.confkey) WITH ORDINALITY AS k(attnum, refnum, ord)
+                JOIN pg_catalog.pg_attribute a ON a.attrelid = con.conrelid AND a.attnum = k.attnum
+                LEFT JOIN pg_catalog.pg_class rc ON rc.oid = con.confrelid
+                LEFT JOIN pg_catalog.pg_namespace rn ON rn.oid = rc.relnamespace
+                LEFT JOIN pg_catalog.pg_attribute ra ON ra.attrelid = con.confrelid AND ra.attnum = k.refnum
+                WHERE con.contype IN ('p', 'f') AND n.nspname IN :schemas
+                ORDER BY n.nspname, c.relname, con.conname, k.ord
+            """,
+        },
+        'mysql': {
+            'current_schema': "SELECT DATABASE()",
+            'columns': """
+                SELECT c.TABLE_SCHEMA, c.TABLE_NAME, c.COLUMN_NAME, c.COLUMN_TYPE, c.IS_NULLABLE = 'YES'
+                FROM information_schema.COLUMNS c
+                JOIN information_schema.TABLES t ON t.TABLE_SCHEMA = c.TABLE_SCHEMA AND t.TABLE_NAME = c.TABLE_NAME
+                WHERE t.TABLE_TYPE = 'BASE TABLE' AND c.TABLE_SCHEMA IN :schemas
+                ORDER BY c.TABLE_SCHEMA, c.TABLE_NAME, c.ORDINAL_POSITION
+            """,
+            'constraints': """
+                SELECT k.TABLE_SCHEMA, k.TABLE_NAME, IF(k.CONSTRAINT_NAME = 'PRIMARY', 'p', 'f'), k.COLUMN_NAME,
+                       k.REFERENCED_TABLE_SCHEMA, k.REFERENCED_TABLE_NAME, k.REFERENCED_COLUMN_NAME
+                FROM information_schema.KEY_COLUMN_USAGE k
+                WHERE k.TABLE_SCHEMA IN :schemas
+                  AND (k.CONSTRAINT_NAME = 'PRIMARY' OR k.REFERENCED_TABLE_NAME IS NOT NULL)
+                ORDER BY k.TABLE_SCHEMA, k.TABLE_NAME, k.CONSTRAINT_NAME, k.ORDINAL_POSITION
+            """,
+        },
+    }
+
+    async def _inspect_sql_bulk(self, connection) -> dict:
+        """
+        Builds the schema for every table of the inspected schemas from two
+        catalog queries instead of two reflection round trips per table.
+        Tables outside the connection's current schema (search_path, or the
+        MySQL database) are keyed as `schema.table`, so that queries written
+        against those names resolve to the same tables.
+        """
+        queries = self.BULK_CATALOG_QUERIES[self.db_type]
+        current_schema = (await connection.execute(text(queries['current_schema']))).scalar()
+        schemas = self.schemas or [current_schema]
+
+        def qualified(schema_name, table_name):
+            return table_name if schema_name == current_schema else f"{schema_name}.{table_name}"
+
+        columns_query = text(queries['columns']).bindparams(bindparam('schemas', expanding=True))
+        constraints_query = text(queries['constraints']).bindparams(bindparam('schemas', expanding=True))
+
+        schema = {}
+        for table_schema, table_name, column_name, data_type, nullable in await connection.execute(columns_query, {"schemas": schemas}):
+            table = schema.setdefault(qualified(table_schema, table_name), {"columns": [], "primary_key": [], "foreign_keys": []})
+            table["columns"].append({"name": column_name, "type": data_type, "nullable": bool(nullable)})
+
+        for table_schema, table_name, kind, column_name, ref_schema, ref_table, ref_column in await connection.execute(constraints_query, {"schemas": schemas}):
+            table = schema.get(qualified(table_schema, table_name))
+            if table is None:
+                continue
+            if kind == 'p':
+                table["primary_key"].append(column_name)
+            else:
+                table["foreign_keys"].append({
+                    "column": column_name,
+                    "referred_table": qualified(ref_schema, ref_table),
+                    "referred_column": ref_column
+                })
+        return schema
 
 
     def _inspect_sql_sync(self, sync_connection) -> dict:
         inspector = inspect(sync_connection)
         schema = {}
-        for table_name in inspector.get_table_names():
-            columns = []
-            for col in inspector.get_columns(table_name):
-                columns.append({"name": col['name'], "type": str(col['type'])})
-            fks = inspector.get_foreign_keys(table_name)
-            foreign_keys = [
-                {
-                    "column": fk['constrained_columns'][0],
-                    "referred_table": fk['referred_table'],
-                    "referred_column": fk['referred_columns'][0]
+        # Same keys as _inspect_sql_bulk: only tables of the current schema are unqualified
+        default_schema = inspector.default_schema_name
+
+        def qualified(schema_name, table_name):
+            return table_name if schema_name in (None, default_schema) else f"{schema_name}.{table_name}"
+
+        for schema_name in (self.schemas or [None]):
+            for table_name in inspector.get_table_names(schema=schema_name):
+                columns = []
+                for col in inspector.get_columns(table_name, schema=schema_name):
+                    columns.append({"name": col['name'], "type": str(col['type']), "nullable": col['nullable']})
+                pk = inspector.get_pk_constraint(table_name, schema=schema_name)
+                fks = inspector.get_foreign_keys(table_name, schema=schema_name)
+                foreign_keys = [
+                    {
+                        "column": fk['constrained_columns'][0],
+                        "referred_table": qualified(fk.get('referred_schema') or schema_name, fk['referred_table']),
+                        "referred_column": fk['referred_columns'][0]
+                    }
+                    for fk in fks
+                ]
+                schema[qualified(schema_name, table_name)] = {
+                    "columns": columns,
+                    "primary_key": pk.get('constrained_columns', []),
+                    "foreign_keys": foreign_keys
                 }
-                for fk in fks
-            ]
-            schema[table_name] = {
-                "columns": columns,
-                "foreign_keys": foreign_keys
-            }
         return schema
 
 
@@ -83,56 +312,98 @@ class DatabaseInspector:
         schema = {}
         example_data = {}
         collection_names = await db.list_collection_names()
-        for name in collection_names:
-            collection = db[name]
+
+        # Sample all collections concurrently, a few at a time
+        semaphore = asyncio.Semaphore(Config.SCHEMA_SAMPLE_CONCURRENCY)
+        results = await asyncio.gather(*(
+            self._infer_collection_schema(db, name, sample_size, semaphore) for name in collection_names
+        ))
+        for name, collection_schema, sample_docs in results:
+            schema[name] = collection_schema
+            example_data[name] = sample_docs
+        return {"schema": schema, "example_data": example_data}
+
+
+    async def _infer_collection_schema(self, db: MongoDatabase, name: str, sample_size: int, semaphore: asyncio.Semaphore):
+        """
+        Infers the field types of one collection from a small sample. Results are
+        cached per collection and reused while the document count and indexes
+        are unchanged. When only the document count changed, the new sample is
+        merged into the previously inferred types.
+        """
+        collection = db[name]
+        async with semaphore:
+            signal, index_signature = None, None
+            cached = None
+            if self.cache_namespace:
+                try:
+                    signal = await collection.estimated_document_count()
+                    index_signature = hashlib.md5(str(sorted((await collection.index_information()).items())).encode('utf-8')).hexdigest()
+                except Exception as e:
+                    logger.warning(f"Failed to read collection stats for {name}: {e}")
+                cached = _mongo_collection_cache.get((self.cache_namespace, name))
+                if cached and signal is not None and cached["signal"] == signal and cached["index_signature"] == index_signature:
+                    return name, cached["schema"], cached["example_data"]
+
             pipeline = [{"$sample": {"size": sample_size}}]
             try:
                 sample_docs = await collection.aggregate(pipeline).to_list(length=sample_size)
             except Exception:
                 sample_docs = await collection.find().limit(sample_size).to_list(length=sample_size)
-            if not sample_docs:
-                schema[name] = {"fields": {}, "note": "No documents found to infer schema"}
-                example_data[name] = []
+
+        if not sample_docs:
+            return name, {"fields": {}, "note": "No documents found to infer schema"}, []
+
+        # Merge with the previous inference unless the indexes changed
+        field_types: Dict[str, Set[str]] = {}
+        if cached and cached["index_signature"] == index_signature:
+            field_types = {key: set(types) for key, types in cached["schema"]["fields"].items()}
+        for doc in sample_docs:
+            self._merge_field_types(field_types, doc)
+
+        collection_schema = {"fields": {key: sorted(types) for key, types in field_types.items()}}
+        examples = [self._truncate_document(doc) for doc in sample_docs]
+
+        if self.cache_namespace and signal is not None:
+            _mongo_collection_cache[(self.cache_namespace, name)] = {
+                "signal": signal,
+                "index_signature": index_signature,
+                "schema": collection_schema,
+                "example_data": examples,
+            }
+        return name, collection_schema, examples
+
+
+    def _merge_field_types(self, field_types: Dict[str, Set[str]], doc: dict, parent_key: str = None, depth: int = 0) -> None:
+        """Adds the dotted field paths of `doc` to `field_types`, bounded by depth and field count."""
+        for key, value in doc.items():
+            full_key = f"{parent_key}.{key}" if parent_key else key
+            if full_key not in field_types and len(field_types) >= Config.MONGO_SCHEMA_MAX_FIELDS:
                 continue
-            field_types: Dict[str, Set[str]] = {}
-
-        # deep nesting handling
-        def extract_field_types(doc, parent_key=None):
-            field_types = {}
-            for key, value in doc.items():
-                full_key = f"{parent_key}.{key}" if parent_key else key
-                if isinstance(value, dict):
-                    # Recurse into nested dicts
-                    nested = extract_field_types(value, full_key)
-                    for nkey, ntypes in nested.items():
-                        if nkey not in field_types:
-                            field_types[nkey] = set()
-                        field_types[nkey].update(ntypes)
-                elif isinstance(value, list):
-                    # For lists, check the type of the first element (if any)
-                    if value and isinstance(value[0], dict):
-                        nested = extract_field_types(value[0], full_key)
-                        for nkey, ntypes in nested.items():
-                            if nkey not in field_types:
-                                field_types[nkey] = set()
-                            field_types[nkey].update(ntypes)
-                    else:
-                        field_types[full_key] = set([f"list[{type(value[0]).__name__}]" if value else "list"])
+
+            if isinstance(value, dict) and depth < Config.MONGO_SCHEMA_MAX_DEPTH:
+                # Recurse into nested dicts
+                self._merge_field_types(field_types, value, full_key, depth + 1)
+            elif isinstance(value, list):
+                # For lists, inspect the first element (if any)
+                if value and isinstance(value[0], dict) and depth < Config.MONGO_SCHEMA_MAX_DEPTH:
+                    self._merge_field_types(field_types, value[0], full_key, depth + 1)
                 else:
-                    if full_key not in field_types:
-                        field_types[full_key] = set()
-                    field_types[full_key].add(type(value).__name__)
-            return field_types
+                    field_types.setdefault(full_key, set()).add(f"list[{type(value[0]).__name__}]" if value else "list")
+            else:
+                field_types.setdefault(full_key, set()).add(type(value).__name__)
 
-        # deep nesting handling
-        field_types = {}
-        for doc in sample_docs:
-            doc_field_types = extract_field_types(doc)
-            for key, types in doc_field_types.items():
-                if key not in field_types:
-                    field_types[key] = set()
-                field_types[key].update(types)
-        fields = {key: list(types) for key, types in field_types.items()}
-        schema[name] = {"fields": fields}
-        example_data[name] = sample_docs
-        return {"schema": schema, "example_data": example_data}
+
+    def _truncate_document(self, doc, depth: int = 0):
+        """Bounds an example document for the prompt: nesting depth, list length and value size."""
+        if isinstance(doc, dict):
+            if depth >= Config.MONGO_SCHEMA_MAX_DEPTH:
+                return "{...}"
+            return {k: self._truncate_document(v, depth + 1) for k, v in doc.items()}
+        if isinstance(doc, list):
+            return [self._truncate_document(v, depth + 1) for v in doc[:3]]
+        return self._truncate_value(doc)
+
+
+# Inferred collection schemas, keyed by (data source cache namespace, collection name)
+_mongo_collection_cache: TTLCache = TTLCache(maxsize=Config.MONGO_SCHEMA_CACHE_MAX_COLLECTIONS, ttl=Config.SCHEMA_CACHE_TTL_SECONDS)
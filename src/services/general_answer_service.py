@@ -15,7 +15,7 @@ async def generate_general_llm_response(model: LLMConfig, question: str) -> dict
         raise LLMNotConfiguredError("LLM needs to be configured")
     try:
         prompt = get_general_answer_prompt(question)
-        response = model.generate_response(prompt)
+        response = await model.agenerate_response(prompt, stage="general")
         return response  
     except Exception as e:
         return {"error": str(e)}
@@ -1,6 +1,7 @@
 from src.prompts.analysis_prompt import get_analysis_prompt
 from src.utils.llm_configuration import LLMConfig
 from src.utils.exceptions import LLMNotConfiguredError
+from src.utils.json_stream import JSONStringStreamParser
 
 import logging
 import json
@@ -13,9 +14,10 @@ logger = logging.getLogger(__name__)
 class InsightGenerator:
 
     # This method generates insights and visualizations based on the query result.
-    async def analyze(self, model: LLMConfig , original_question: str, query_result: List[Dict[str, Any]]) -> Dict[str, Any]:
+    async def analyze(self, model: LLMConfig , original_question: str, query_result: List[Dict[str, Any]], on_token=None) -> Dict[str, Any]:
         # Generate the detailed analysis using the LLM for deep interpretation
-        detailed_analysis = await self._generate_detailed_analysis(model, original_question, query_result)
+        # With `on_token`, the response is streamed and the `analysis` text is passed on as it arrives
+        detailed_analysis = await self._generate_detailed_analysis(model, original_question, query_result, on_token)
 
         # If the analysis is a dict, use it directly; else, return as string with a warning
         if isinstance(detailed_analysis, dict):
@@ -26,7 +28,7 @@ class InsightGenerator:
 
 
     # This method generates a detailed analysis of the query result using the Gemini LLM.
-    async def _generate_detailed_analysis(self, model: LLMConfig, question: str, data: List[Dict[str, Any]]):
+    async def _generate_detailed_analysis(self, model: LLMConfig, question: str, data: List[Dict[str, Any]], on_token=None):
         num_rows = len(data)
         if num_rows == 0:
             return "Based on the available data, I could not find any information to answer your question. The query returned no results."
@@ -39,8 +41,15 @@ class InsightGenerator:
             if not model:
                 logger.error("LLM needs to be configured")
                 raise LLMNotConfiguredError("LLM needs to be configured")
-            response = model.generate_response(prompt)
-            return response
+            if on_token is None:
+                return await model.agenerate_response(prompt, stage="insight", include_history=False)
+
+            parser = JSONStringStreamParser("analysis")
+            async for chunk in model.astream_response(prompt, stage="insight", include_history=False):
+                text = parser.feed(chunk)
+                if text:
+                    on_token(text)
+            return model.parse_json_response(parser.text)
 
         except Exception as e:
             return f"The query to support your analysis returned {num_rows} result(s). A detailed analysis could not be generated at this time."
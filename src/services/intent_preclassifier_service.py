@@ -0,0 +1,192 @@
+import logging
+import random
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from config import Config
+from src.services.schema_retrieval_service import tokenize
+from src.utils.intent_model import NaiveBayesIntentModel
+from src.utils.redis_store import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+# Write, destructive or exfiltration requests; always refused
+DANGEROUS_PATTERNS = [
+    re.compile(r"\b(drop|truncate|alter)\s+(table|database|schema|collection|index|column)\b", re.I),
+    re.compile(r"\bdelete\s+(from|all|every|the)\b", re.I),
+    re.compile(r"\b(delete|remove|erase)\s+(\w+\s+){0,2}(#?\d+|where|whose|with id)\b", re.I),
+    re.compile(r"\b(set|change|update|modify|reset)\s+(the\s+)?\w+('s)?\s+(password|email|role|permissions?|balance|price|salary)\b", re.I),
+    re.compile(r"\binsert\s+into\b", re.I),
+    re.compile(r"\bupdate\s+\w+\s+set\b", re.I),
+    re.compile(r"\b(grant|revoke)\s+\w+", re.I),
+    re.compile(r"\b(remove|wipe|erase|destroy)\s+(all|every|the)?\s*(data|records|rows|tables|users|database)\b", re.I),
+    re.compile(r"\b(export|dump|leak|reveal|show)\b.*\b(passwords?|password hashes|credentials|secrets|api keys?)\b", re.I),
+    re.compile(r"\bignore\s+(all\s+)?(previous|prior|above)\s+instructions\b", re.I),
+]
+
+# Pleasantries that never need data
+SMALL_TALK = re.compile(
+    r"^\s*(hi|hello|hey|yo|good (morning|afternoon|evening)|thanks?( you)?( so much)?|thank you|ok(ay)?|great|cool|"
+    r"bye|goodbye|see you|who are you|what can you do|how are you)[\s!.?,]*$",
+    re.I,
+)
+
+# Questions mentioning a write verb or sensitive data are never fast-pathed; the LLM decides
+WRITE_VERBS = re.compile(r"\b(set|change|update|modify|delete|remove|insert|grant|revoke|drop|truncate|alter|reset)\b", re.I)
+SENSITIVE_TERMS = re.compile(r"\b(passwords?|hash(es|ed)?|tokens?|secrets?|ssns?|social security|credentials?|api keys?|private keys?)\b", re.I)
+
+
+@dataclass
+class PreClassification:
+    intent: str
+    db_ids: List[str]
+    confidence: float
+    source: str  # 'rule', 'model' or 'uncertain'
+    scores: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def confident(self) -> bool:
+        return self.source != "uncertain"
+
+
+class IntentPreClassifier:
+    """
+    Local, LLM-free intent classification for the obvious cases.
+
+    Rules catch destructive requests and small talk. Otherwise a tiny naive
+    Bayes model (trained offline from src/resources/intent_seed_examples.json)
+    scores the intent, and a lexicon of table and column names selects the
+    target database. Only predictions that clear the confidence threshold and
+    point at exactly one database are trusted; everything else goes to the LLM.
+    Questions with write verbs or sensitive terms always go to the LLM, which
+    is the one that refuses them when they are not read-only.
+
+    Agreement with the LLM is tracked as a confusion matrix, both for
+    uncertain questions and for a sample of confident ones (shadow checks).
+    """
+
+    REDIS_KEY = "intent_preclassifier:stats"
+
+    def __init__(self, model: NaiveBayesIntentModel = None):
+        self._model = model
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {"fast_path": 0, "fallback": 0, "shadow_checks": 0}
+        self._confusion: Dict[str, Dict[str, int]] = {}
+
+
+    @property
+    def model(self) -> Optional[NaiveBayesIntentModel]:
+        if self._model is None:
+            try:
+                self._model = NaiveBayesIntentModel.load()
+            except Exception as e:
+                logger.warning(f"Intent model could not be loaded, pre-classification uses rules only: {e}")
+                self._model = False
+        return self._model or None
+
+
+    def classify(self, question: str, schemas: Dict[str, Dict[str, Any]]) -> PreClassification:
+        if any(pattern.search(question) for pattern in DANGEROUS_PATTERNS):
+            return PreClassification("dangerous", [], 1.0, "rule")
+
+        matches = self._schema_matches(question, schemas)
+        if SMALL_TALK.match(question) and not matches:
+            return PreClassification("general", [], 1.0, "rule")
+
+        scores = self.model.predict_proba(question) if self.model else {}
+        if not scores:
+            return PreClassification("general", [], 0.0, "uncertain")
+        intent = max(scores, key=scores.get)
+        confidence = scores[intent]
+        prediction = PreClassification(intent, sorted(matches), round(confidence, 4), "uncertain", scores)
+
+        if WRITE_VERBS.search(question) or SENSITIVE_TERMS.search(question):
+            return prediction
+        if confidence < Config.INTENT_PRECLASSIFIER_THRESHOLD:
+            return prediction
+        if intent == "general" and not matches:
+            prediction.source = "model"
+        elif intent in ("query", "analysis") and len(matches) == 1:
+            prediction.source = "model"
+        return prediction
+
+
+    def _schema_matches(self, question: str, schemas: Dict[str, Dict[str, Any]]) -> List[str]:
+        """Databases whose table or column names appear in the question."""
+        terms = set(tokenize(question))
+        matched = []
+        for db_id, schema_repr in schemas.items():
+            if terms & self._lexicon(schema_repr.get("schema") or {}):
+                matched.append(db_id)
+        return matched
+
+
+    @staticmethod
+    def _lexicon(schema: Dict[str, Any]) -> set:
+        words = set()
+        for table, details in schema.items():
+            words.update(tokenize(table))
+            if isinstance(details, dict):
+                for col in details.get("columns", []):
+                    words.update(tokenize(col["name"] if isinstance(col, dict) else str(col)))
+                words.update(term for field_path in (details.get("fields") or {}) for term in tokenize(field_path))
+        # Generic column words ('id', 'name', 'created') say nothing about which database is meant
+        return words - {"id", "name", "created", "updated", "at", "date", "type", "status", "value", "key"}
+
+
+    def should_shadow(self) -> bool:
+        return random.random() < Config.INTENT_PRECLASSIFIER_SHADOW_RATE
+
+
+    def record(self, prediction: PreClassification, llm_intent: Optional[str], fast_path: bool, shadow: bool = False) -> None:
+        """Counts a decision; `llm_intent` is the LLM's answer when it was asked."""
+        increments = {"fast_path": int(fast_path), "fallback": int(not fast_path and not shadow), "shadow_checks": int(shadow)}
+        cell = None
+        if llm_intent is not None:
+            cell = f"{prediction.intent}->{llm_intent}"
+        with self._lock:
+            for name, value in increments.items():
+                self._counters[name] += value
+            if cell:
+                row = self._confusion.setdefault(prediction.intent, {})
+                row[llm_intent] = row.get(llm_intent, 0) + 1
+
+        redis = get_redis()
+        if redis is not None:
+            try:
+                pipe = redis.pipeline()
+                for name, value in increments.items():
+                    if value:
+                        pipe.hincrby(self.REDIS_KEY, name, value)
+                if cell:
+                    pipe.hincrby(self.REDIS_KEY, f"confusion:{cell}", 1)
+                pipe.execute()
+            except Exception as e:
+                logger.warning(f"Failed to update pre-classifier stats in Redis: {e}")
+
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self._counters)
+            confusion = {predicted: dict(row) for predicted, row in self._confusion.items()}
+        compared = sum(n for row in confusion.values() for n in row.values())
+        agreed = sum(row.get(predicted, 0) for predicted, row in confusion.items())
+
+        shared = None
+        redis = get_redis()
+        if redis is not None:
+            try:
+                shared = {(k.decode() if isinstance(k, bytes) else k): int(v) for k, v in redis.hgetall(self.REDIS_KEY).items()}
+            except Exception as e:
+                logger.warning(f"Failed to read pre-classifier stats from Redis: {e}")
+        return {
+            "enabled": Config.INTENT_PRECLASSIFIER_ENABLED,
+            "worker": {**counters, "confusion": confusion, "agreement_rate": round(agreed / compared, 4) if compared else None},
+            "shared": shared,
+        }
+
+
+intent_preclassifier = IntentPreClassifier()
@@ -0,0 +1,435 @@
+import asyncio
+import json
+import logging
+import math
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from config import Config
+from src.utils.exceptions import LLMRateLimitedError
+from src.utils.redis_store import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+# Takes `ARGV[2]` requests and `ARGV[4]` tokens from the RPM and TPM buckets (KEYS[1], KEYS[2]) at once,
+# or nothing; returns the milliseconds to wait before retrying. KEYS[3] is set while the provider throttles.
+ACQUIRE_SCRIPT = """
+redis.replicate_commands()
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local wait = redis.call('PTTL', KEYS[3])
+if wait < 0 then wait = 0 end
+local buckets = {}
+for i = 1, 2 do
+    local capacity = tonumber(ARGV[i * 2 - 1])
+    if capacity > 0 then
+        local amount = math.min(tonumber(ARGV[i * 2]), capacity)
+        local state = redis.call('HMGET', KEYS[i], 'tokens', 'ts')
+        local tokens = tonumber(state[1]) or capacity
+        local ts = tonumber(state[2]) or now
+        tokens = math.min(capacity, tokens + (now - ts) * capacity / 60000)
+        if tokens < amount then
+            wait = math.max(wait, math.ceil((amount - tokens) * 60000 / capacity))
+        end
+        buckets[i] = {tokens - amount, capacity}
+    end
+end
+if wait > 0 then
+    return wait
+end
+for i, bucket in pairs(buckets) do
+    redis.call('HSET', KEYS[i], 'tokens', tostring(bucket[1]), 'ts', now)
+    redis.call('PEXPIRE', KEYS[i], 120000)
+end
+return 0
+"""
+
+# Corrects the TPM bucket (KEYS[1]) by ARGV[1] tokens once the actual usage of a call is known
+SETTLE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    local tokens = tonumber(redis.call('HGET', KEYS[1], 'tokens')) + tonumber(ARGV[1])
+    redis.call('HSET', KEYS[1], 'tokens', tostring(math.min(tokens, tonumber(ARGV[2]))))
+end
+return 0
+"""
+
+
+class TokenBucket:
+    """Refills continuously up to `capacity` per minute."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.capacity / 60)
+        self.updated = now
+
+
+    def wait_time(self, amount: int, now: float) -> float:
+        """Seconds until `amount` is available; amounts above the capacity wait for a full bucket."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) * 60 / self.capacity
+
+
+    def take(self, amount: int) -> None:
+        self.tokens -= min(amount, self.capacity)
+
+
+    def give(self, amount: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class LLMAdmissionController:
+    """
+    Admission control in front of every LLM provider and model.
+
+    Each provider/model pair has a requests-per-minute and a tokens-per-minute
+    token bucket and a cap on concurrent calls per worker. A call reserves one
+    request and its estimated tokens (prompt plus expected output) before it is
+    sent, and the token estimate is corrected with the actual usage afterwards.
+    Calls that do not fit wait in line until LLM_ADMISSION_TIMEOUT_SECONDS have
+    passed and then fail with `LLMRateLimitedError`.
+
+    In 'shared' mode the buckets live in Redis so all workers draw from the
+    same provider budget; in 'local' mode (or without Redis) each worker keeps
+    its own. 429 and 5xx responses are retried with jittered exponential
+    backoff, and a 429 pauses all calls to that model for its retry-after time.
+
+    Redis writes made from an event loop (stats, cooldowns, token settlement)
+    run in the loop's executor so they never stall other coroutines. Queue
+    depth is only reported per worker: a shared gauge would stay inflated by
+    the calls of workers that died while waiting.
+    """
+
+    REDIS_PREFIX = "llm_admission"
+    COUNTERS = ("admitted", "rejected", "retries", "throttled", "server_errors", "wait_ms")
+    RETRYABLE_STATUSES = {429, 500, 502, 503, 504, 529}
+    POLL_SECONDS = 0.05
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, Tuple[Optional[TokenBucket], Optional[TokenBucket]]] = {}
+        self._cooldowns: Dict[str, float] = {}
+        self._in_flight: Dict[str, int] = {}
+        self._queued: Dict[str, int] = {}
+        self._metrics: Dict[str, Dict[str, float]] = {}
+        self._overrides: Optional[Dict[str, Dict[str, int]]] = None
+        self._acquire_script = None
+        self._settle_script = None
+
+
+    def limits(self, provider: str, model: str) -> Dict[str, int]:
+        """RPM, TPM and concurrency limits; LLM_RATE_LIMITS overrides them per 'provider/model' or 'provider'."""
+        if self._overrides is None:
+            try:
+                self._overrides = json.loads(Config.LLM_RATE_LIMITS or "{}")
+            except ValueError as e:
+                logger.error(f"Ignoring invalid LLM_RATE_LIMITS: {e}")
+                self._overrides = {}
+        limits = {"rpm": Config.LLM_RPM_LIMIT, "tpm": Config.LLM_TPM_LIMIT, "concurrency": Config.LLM_MAX_CONCURRENT_REQUESTS}
+        limits.update(self._overrides.get(provider, {}))
+        limits.update(self._overrides.get(f"{provider}/{model}", {}))
+        return limits
+
+
+    @staticmethod
+    def deadline() -> float:
+        return time.monotonic() + Config.LLM_ADMISSION_TIMEOUT_SECONDS
+
+
+    @staticmethod
+    def estimate_tokens(content_chars: int) -> int:
+        # Roughly four characters per token, plus the expected completion
+        return content_chars // 4 + Config.LLM_OUTPUT_TOKENS_ESTIMATE
+
+
+    async def call(self, provider: str, model: str, estimated_tokens: int, request: Callable[[], Awaitable[Tuple[Any, Any]]]):
+        """
+        Runs `request` (returning the text and the (input, output) token usage)
+        once admitted, retrying 429 and 5xx responses within the deadline.
+        """
+        deadline = self.deadline()
+        attempt = 0
+        while True:
+            await self.acquire(provider, model, estimated_tokens, deadline)
+            usage = None
+            try:
+                text, usage = await request()
+                return text, usage
+            except Exception as e:
+                delay = self.retry_delay(provider, model, e, attempt, deadline)
+                if delay is None:
+                    raise
+            finally:
+                self.release(provider, model, estimated_tokens, usage)
+            attempt += 1
+            await asyncio.sleep(delay)
+
+
+    async def acquire(self, provider: str, model: str, estimated_tokens: int, deadline: float) -> None:
+        """Waits for a concurrency slot and rate budget; raises LLMRateLimitedError at the deadline."""
+        if not Config.LLM_ADMISSION_ENABLED:
+            return
+        key = f"{provider}/{model}"
+        limits = self.limits(provider, model)
+        start = time.monotonic()
+        self._count_queued(key, 1)
+        try:
+            while not self._try_claim_slot(key, limits["concurrency"]):
+                await self._wait_or_reject(key, self.POLL_SECONDS, deadline, "concurrency limit reached")
+            try:
+                while True:
+                    if get_redis() is not None and Config.LLM_ADMISSION_MODE == "shared":
+                        wait = await asyncio.to_thread(self._redis_take, key, limits, estimated_tokens)
+                    else:
+                        wait = self._local_take(key, limits, estimated_tokens)
+                    if wait <= 0:
+                        break
+                    await self._wait_or_reject(key, wait, deadline, "rate limit budget exhausted")
+            except BaseException:
+                self._release_slot(key)
+                raise
+        finally:
+            self._count_queued(key, -1)
+
+        waited_ms = (time.monotonic() - start) * 1000
+        self._record(key, admitted=1, wait_ms=waited_ms)
+        if waited_ms >= 1000:
+            logger.info(f"LLM call to {key} admitted after waiting {waited_ms:.0f} ms")
+
+
+    def release(self, provider: str, model: str, estimated_tokens: int, usage=None) -> None:
+        """Frees the concurrency slot and returns unused reserved tokens to the TPM budget."""
+        if not Config.LLM_ADMISSION_ENABLED:
+            return
+        key = f"{provider}/{model}"
+        self._release_slot(key)
+        input_tokens, output_tokens = usage or (None, None)
+        if input_tokens is None and output_tokens is None:
+            return
+        delta = estimated_tokens - ((input_tokens or 0) + (output_tokens or 0))
+        limits = self.limits(provider, model)
+        if not delta or limits["tpm"] <= 0:
+            return
+        if get_redis() is not None and Config.LLM_ADMISSION_MODE == "shared":
+            self._off_loop(self._redis_settle, key, delta, limits["tpm"])
+            return
+        with self._lock:
+            tpm = self._buckets.get(key, (None, None))[1]
+            if tpm is not None:
+                tpm.give(delta)
+
+
+    def retry_delay(self, provider: str, model: str, error: Exception, attempt: int, deadline: float) -> Optional[float]:
+        """
+        Seconds to wait before retrying a failed call, or None when `error` is
+        not retryable. Raises LLMRateLimitedError when a 429 can no longer be
+        retried within the attempt limit or the deadline.
+        """
+        status = self.status_of(error)
+        if status not in self.RETRYABLE_STATUSES:
+            return None
+        key = f"{provider}/{model}"
+        self._record(key, **{"throttled" if status == 429 else "server_errors": 1})
+
+        # Full jitter, but never sooner than the provider asked for
+        backoff = min(Config.LLM_RETRY_MAX_DELAY_SECONDS, Config.LLM_RETRY_BASE_DELAY_SECONDS * 2 ** attempt)
+        delay = max(random.uniform(0, backoff), self.retry_after(error) or 0)
+        if status == 429:
+            self._cool_down(key, delay)
+
+        if attempt + 1 >= Config.LLM_RETRY_MAX_ATTEMPTS or time.monotonic() + delay > deadline:
+            if status == 429:
+                self._record(key, rejected=1)
+                raise LLMRateLimitedError(provider, model, f"still throttled after {attempt + 1} attempt(s)")
+            return None
+        self._record(key, retries=1)
+        logger.warning(f"LLM call to {key} failed with status {status}, retrying in {delay:.2f}s (attempt {attempt + 2}/{Config.LLM_RETRY_MAX_ATTEMPTS})")
+        return delay
+
+
+    @staticmethod
+    def status_of(error: Exception) -> Optional[int]:
+        # openai/anthropic expose `status_code`, google.api_core exceptions `code`
+        for attr in ("status_code", "code"):
+            value = getattr(error, attr, None)
+            if isinstance(value, int):
+                return value
+        return getattr(getattr(error, "response", None), "status_code", None)
+
+
+    @staticmethod
+    def retry_after(error: Exception) -> Optional[float]:
+        headers = getattr(getattr(error, "response", None), "headers", None) or {}
+        try:
+            if headers.get("retry-after-ms"):
+                return float(headers["retry-after-ms"]) / 1000
+            if headers.get("retry-after"):
+                return float(headers["retry-after"])
+        except (TypeError, ValueError):
+            pass
+        return None
+
+
+    async def _wait_or_reject(self, key: str, wait: float, deadline: float, reason: str) -> None:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or wait > remaining:
+            self._record(key, rejected=1)
+            provider, model = key.split("/", 1)
+            raise LLMRateLimitedError(provider, model, f"{reason}, no capacity within {Config.LLM_ADMISSION_TIMEOUT_SECONDS}s")
+        await asyncio.sleep(wait)
+
+
+    def _try_claim_slot(self, key: str, limit: int) -> bool:
+        with self._lock:
+            if limit > 0 and self._in_flight.get(key, 0) >= limit:
+                return False
+            self._in_flight[key] = self._in_flight.get(key, 0) + 1
+            return True
+
+
+    def _release_slot(self, key: str) -> None:
+        with self._lock:
+            self._in_flight[key] = max(self._in_flight.get(key, 1) - 1, 0)
+
+
+    def _local_take(self, key: str, limits: Dict[str, int], estimated_tokens: int) -> float:
+        now = time.monotonic()
+        with self._lock:
+            buckets = self._buckets.get(key)
+            if buckets is None or tuple(b.capacity if b else 0 for b in buckets) != (limits["rpm"], limits["tpm"]):
+                buckets = (TokenBucket(limits["rpm"]) if limits["rpm"] > 0 else None, TokenBucket(limits["tpm"]) if limits["tpm"] > 0 else None)
+                self._buckets[key] = buckets
+            rpm, tpm = buckets
+            wait = max(self._cooldowns.get(key, 0) - now, 0)
+            if rpm is not None:
+                wait = max(wait, rpm.wait_time(1, now))
+            if tpm is not None:
+                wait = max(wait, tpm.wait_time(estimated_tokens, now))
+            if wait > 0:
+                return wait
+            if rpm is not None:
+                rpm.take(1)
+            if tpm is not None:
+                tpm.take(estimated_tokens)
+            return 0.0
+
+
+    def _redis_take(self, key: str, limits: Dict[str, int], estimated_tokens: int) -> float:
+        redis = get_redis()
+        try:
+            if self._acquire_script is None:
+                self._acquire_script = redis.register_script(ACQUIRE_SCRIPT)
+            wait_ms = self._acquire_script(
+                keys=[f"{self.REDIS_PREFIX}:rpm:{key}", f"{self.REDIS_PREFIX}:tpm:{key}", f"{self.REDIS_PREFIX}:cooldown:{key}"],
+                args=[limits["rpm"], 1, limits["tpm"], estimated_tokens],
+            )
+            return int(wait_ms) / 1000
+        except Exception as e:
+            # Never block LLM calls on Redis; fall back to this worker's own budget
+            logger.warning(f"Shared LLM rate limiting unavailable, using local buckets for {key}: {e}")
+            return self._local_take(key, limits, estimated_tokens)
+
+
+    def _cool_down(self, key: str, seconds: float) -> None:
+        if seconds <= 0:
+            return
+        with self._lock:
+            self._cooldowns[key] = max(self._cooldowns.get(key, 0), time.monotonic() + seconds)
+        if get_redis() is not None and Config.LLM_ADMISSION_MODE == "shared":
+            self._off_loop(self._redis_cool_down, key, math.ceil(seconds * 1000))
+
+
+    def _count_queued(self, key: str, delta: int) -> None:
+        with self._lock:
+            queued = self._queued.get(key, 0) + delta
+            self._queued[key] = queued
+            metrics = self._metrics.setdefault(key, {name: 0 for name in self.COUNTERS})
+            metrics["max_queued"] = max(metrics.get("max_queued", 0), queued)
+
+
+    def _record(self, key: str, **increments: float) -> None:
+        with self._lock:
+            metrics = self._metrics.setdefault(key, {name: 0 for name in self.COUNTERS})
+            for name, value in increments.items():
+                metrics[name] += value
+            if "wait_ms" in increments:
+                metrics["max_wait_ms"] = max(metrics.get("max_wait_ms", 0), increments["wait_ms"])
+        if get_redis() is not None:
+            self._off_loop(self._redis_record, key, increments)
+
+
+    @staticmethod
+    def _off_loop(write: Callable[..., None], *args: Any) -> None:
+        """Runs a Redis write in the executor when called on an event loop, inline otherwise."""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            write(*args)
+            return
+        loop.run_in_executor(None, write, *args)
+
+
+    def _redis_settle(self, key: str, delta: int, tpm: int) -> None:
+        try:
+            redis = get_redis()
+            if self._settle_script is None:
+                self._settle_script = redis.register_script(SETTLE_SCRIPT)
+            self._settle_script(keys=[f"{self.REDIS_PREFIX}:tpm:{key}"], args=[delta, tpm])
+        except Exception as e:
+            logger.warning(f"Failed to settle LLM token budget of {key} in Redis: {e}")
+
+
+    def _redis_cool_down(self, key: str, milliseconds: int) -> None:
+        try:
+            get_redis().set(f"{self.REDIS_PREFIX}:cooldown:{key}", 1, px=milliseconds)
+        except Exception as e:
+            logger.warning(f"Failed to share LLM cooldown of {key} in Redis: {e}")
+
+
+    def _redis_record(self, key: str, increments: Dict[str, float]) -> None:
+        try:
+            pipe = get_redis().pipeline()
+            for name, value in increments.items():
+                if value:
+                    pipe.hincrbyfloat(f"{self.REDIS_PREFIX}:stats", f"{key}:{name}", value)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to update LLM admission stats in Redis: {e}")
+
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            worker = {}
+            for key, metrics in self._metrics.items():
+                provider, model = key.split("/", 1)
+                entry = {name: round(value, 2) for name, value in metrics.items()}
+                entry["queued"] = self._queued.get(key, 0)
+                entry["in_flight"] = self._in_flight.get(key, 0)
+                entry["avg_wait_ms"] = round(metrics["wait_ms"] / metrics["admitted"], 2) if metrics["admitted"] else None
+                entry["limits"] = self.limits(provider, model)
+                worker[key] = entry
+
+        shared = None
+        redis = get_redis()
+        if redis is not None:
+            try:
+                shared = {}
+                for field, value in redis.hgetall(f"{self.REDIS_PREFIX}:stats").items():
+                    field = field.decode() if isinstance(field, bytes) else field
+                    key, name = field.rsplit(":", 1)
+                    shared.setdefault(key, {})[name] = round(float(value), 2)
+            except Exception as e:
+                logger.warning(f"Failed to read LLM admission stats from Redis: {e}")
+        mode = Config.LLM_ADMISSION_MODE if redis is not None else "local"
+        return {"enabled": Config.LLM_ADMISSION_ENABLED, "mode": mode, "worker": worker, "shared": shared}
+
+
+llm_admission = LLMAdmissionController()
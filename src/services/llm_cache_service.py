@@ -0,0 +1,162 @@
+import asyncio
+import copy
+import hashlib
+import json
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+from cachetools import TTLCache
+
+from config import Config
+from src.utils.redis_store import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+class LLMResponseCache:
+    """
+    Exact-match cache of parsed LLM responses.
+
+    Entries are scoped per organization and keyed by provider, model, pipeline
+    stage, the schema version the prompt was built against and a hash of the
+    exact content sent to the model. Hedged stages use their provider chain
+    in place of the provider and model; the entry names the one that answered. L1 is an in-process LRU with a TTL, L2 is
+    Redis so all workers share hits. Each entry remembers the latency and
+    tokens of the original call, which is counted as saved on every hit.
+    """
+
+    REDIS_PREFIX = "llm_cache"
+    COUNTERS = ("hits_memory", "hits_redis", "misses", "bypassed", "stores", "saved_ms", "saved_input_tokens", "saved_output_tokens")
+
+    def __init__(self, maxsize: int = None, ttl_seconds: int = None):
+        self.ttl_seconds = ttl_seconds or Config.LLM_CACHE_TTL_SECONDS
+        self._entries: TTLCache = TTLCache(maxsize=maxsize or Config.LLM_CACHE_MAX_ENTRIES, ttl=self.ttl_seconds)
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = {name: 0 for name in self.COUNTERS}
+
+
+    @staticmethod
+    def make_key(organization_id: str, provider: str, model: str, stage: str, schema_version: Optional[str], content: str) -> str:
+        content_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        raw = "\x1f".join([organization_id, provider, model, stage, schema_version or "", content_hash])
+        return f"{organization_id}:{hashlib.sha256(raw.encode('utf-8')).hexdigest()}"
+
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Returns the cached response for `key` and counts the hit or miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+        tier = "hits_memory"
+        if entry is None:
+            entry = await asyncio.to_thread(self._redis_get, key)
+            tier = "hits_redis"
+            if entry is not None:
+                with self._lock:
+                    self._entries[key] = entry
+
+        organization_id = key.split(":", 1)[0]
+        if entry is None:
+            await self._count(organization_id, misses=1)
+            return None
+        await self._count(organization_id, **{
+            tier: 1,
+            "saved_ms": entry.get("latency_ms", 0),
+            "saved_input_tokens": entry.get("input_tokens", 0),
+            "saved_output_tokens": entry.get("output_tokens", 0),
+        })
+        # Callers may modify the response; never hand out the cached object itself
+        return copy.deepcopy(entry["response"])
+
+
+    async def put(self, key: str, response: Dict[str, Any], latency_ms: float, input_tokens: Optional[int], output_tokens: Optional[int],
+                  provider: Optional[str] = None, model: Optional[str] = None) -> None:
+        """Stores `response`; `provider` and `model` record who answered when the key does not say (hedged stages)."""
+        entry = {
+            "response": copy.deepcopy(response),
+            "latency_ms": round(latency_ms, 2),
+            "input_tokens": input_tokens or 0,
+            "output_tokens": output_tokens or 0,
+            "provider": provider,
+            "model": model,
+        }
+        with self._lock:
+            self._entries[key] = entry
+        await asyncio.to_thread(self._redis_set, key, entry)
+        await self._count(key.split(":", 1)[0], stores=1)
+
+
+    async def record_bypass(self, organization_id: str) -> None:
+        await self._count(organization_id, bypassed=1)
+
+
+    def stats(self, organization_id: Optional[str] = None) -> Dict[str, Any]:
+        """This worker's counters, plus the shared counters of `organization_id` when Redis is available."""
+        with self._lock:
+            worker = dict(self._counters)
+            worker["entries"] = len(self._entries)
+        lookups = worker["hits_memory"] + worker["hits_redis"] + worker["misses"]
+        worker["hit_rate"] = round((worker["hits_memory"] + worker["hits_redis"]) / lookups, 4) if lookups else 0.0
+
+        shared = None
+        redis = get_redis()
+        if redis is not None and organization_id:
+            try:
+                raw = redis.hgetall(self._stats_key(organization_id))
+                shared = {(k.decode() if isinstance(k, bytes) else k): float(v) for k, v in raw.items()}
+            except Exception as e:
+                logger.warning(f"Failed to read LLM cache stats from Redis: {e}")
+        return {"enabled": Config.LLM_CACHE_ENABLED, "ttl_seconds": self.ttl_seconds, "worker": worker, "organization": shared}
+
+
+    async def _count(self, organization_id: str, **increments: float) -> None:
+        with self._lock:
+            for name, value in increments.items():
+                self._counters[name] += value
+        await asyncio.to_thread(self._redis_count, organization_id, increments)
+
+
+    def _stats_key(self, organization_id: str) -> str:
+        return f"{self.REDIS_PREFIX}:stats:{organization_id}"
+
+
+    def _entry_key(self, key: str) -> str:
+        return f"{self.REDIS_PREFIX}:{key}"
+
+
+    def _redis_get(self, key: str) -> Optional[Dict[str, Any]]:
+        redis = get_redis()
+        if redis is None:
+            return None
+        try:
+            raw = redis.get(self._entry_key(key))
+            return json.loads(raw) if raw else None
+        except Exception as e:
+            logger.warning(f"Failed to read cached LLM response from Redis: {e}")
+            return None
+
+
+    def _redis_set(self, key: str, entry: Dict[str, Any]) -> None:
+        redis = get_redis()
+        if redis is None:
+            return
+        try:
+            redis.setex(self._entry_key(key), self.ttl_seconds, json.dumps(entry, default=str))
+        except Exception as e:
+            logger.warning(f"Failed to store LLM response in Redis: {e}")
+
+
+    def _redis_count(self, organization_id: str, increments: Dict[str, float]) -> None:
+        redis = get_redis()
+        if redis is None:
+            return
+        try:
+            pipe = redis.pipeline()
+            for name, value in increments.items():
+                pipe.hincrbyfloat(self._stats_key(organization_id), name, value)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to update LLM cache stats in Redis: {e}")
+
+
+llm_response_cache = LLMResponseCache()
@@ -0,0 +1,177 @@
+import asyncio
+import json
+import logging
+import math
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+from config import Config
+from src.utils.redis_store import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+class LLMHedgingPolicy:
+    """
+    Hedged LLM requests over per-stage provider chains.
+
+    LLM_STAGE_PROVIDERS maps a pipeline stage ('classify', 'plan', 'summary',
+    ...) to an ordered list of 'provider' or 'provider/model' entries. The
+    first entry answers the stage. If it has not answered after the hedge
+    delay, the same prompt also goes to the next entry. The hedge delay is the
+    LLM_HEDGE_PERCENTILE latency of the primary for that stage, observed over
+    its recent calls. A provider that fails is replaced by the next one right
+    away. The first valid answer wins and the calls still running are cancelled.
+
+    Latency samples are kept per worker; outcome counters are mirrored to Redis.
+    """
+
+    REDIS_KEY = "llm_hedging:stats"
+    COUNTERS = ("calls", "primary_won", "hedge_won", "fallback_won", "hedges_fired", "cancelled", "failed")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._chains: Optional[Dict[str, List[Tuple[str, Optional[str]]]]] = None
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._counters: Dict[str, Dict[str, int]] = {}
+
+
+    def chain(self, stage: str) -> List[Tuple[str, Optional[str]]]:
+        """(provider, model) pairs configured for `stage`; empty when the stage is not hedged."""
+        if not Config.LLM_HEDGING_ENABLED:
+            return []
+        if self._chains is None:
+            try:
+                configured = json.loads(Config.LLM_STAGE_PROVIDERS or "{}")
+            except ValueError as e:
+                logger.error(f"Ignoring invalid LLM_STAGE_PROVIDERS: {e}")
+                configured = {}
+            self._chains = {
+                name: [(entry.split("/", 1)[0].lower(), entry.split("/", 1)[1] if "/" in entry else None) for entry in entries]
+                for name, entries in configured.items()
+            }
+        return self._chains.get(stage, [])
+
+
+    def delay(self, stage: str, provider: str, model: str) -> float:
+        """Seconds to wait for `provider/model` before hedging a `stage` call."""
+        with self._lock:
+            samples = sorted(self._latencies.get(f"{stage}:{provider}/{model}", ()))
+        if len(samples) < Config.LLM_HEDGE_MIN_SAMPLES:
+            return Config.LLM_HEDGE_INITIAL_DELAY_SECONDS
+        rank = max(math.ceil(Config.LLM_HEDGE_PERCENTILE / 100 * len(samples)) - 1, 0)
+        return max(samples[rank], Config.LLM_HEDGE_MIN_DELAY_SECONDS)
+
+
+    def observe(self, stage: str, provider: str, model: str, seconds: float) -> None:
+        with self._lock:
+            window = self._latencies.setdefault(f"{stage}:{provider}/{model}", deque(maxlen=Config.LLM_HEDGE_WINDOW))
+            window.append(seconds)
+
+
+    async def race(self, stage: str, candidates: Sequence[Any], start: Callable[[Any], Awaitable[Any]], accept: Callable[[Any, Any], Any]):
+        """
+        Runs `start(candidate)` for the first candidate, hedging with the next
+        ones as described above. `accept(candidate, result)` returns the value
+        to use or raises to reject the result. Returns (winner, value); raises
+        the last error when no candidate produced an accepted result.
+        """
+        primary = candidates[0]
+        delay = self.delay(stage, primary.model_provider, primary.model_name)
+        pending: Dict[asyncio.Future, int] = {}
+        started: Dict[int, float] = {}
+        errors: List[Exception] = []
+
+        def launch() -> None:
+            index = len(started)
+            started[index] = time.monotonic()
+            pending[asyncio.ensure_future(start(candidates[index]))] = index
+
+        launch()
+        try:
+            while pending:
+                more = len(started) < len(candidates)
+                done, _ = await asyncio.wait(pending, timeout=delay if more else None, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    nxt = candidates[len(started)]
+                    logger.info(f"Hedging [{stage}]: {primary.model_provider}/{primary.model_name} has not answered after {delay:.2f}s, "
+                                f"also asking {nxt.model_provider}/{nxt.model_name}")
+                    self._record(stage, hedges_fired=1)
+                    launch()
+                    continue
+
+                for task in done:
+                    index = pending.pop(task)
+                    candidate = candidates[index]
+                    try:
+                        result = task.result()
+                        self.observe(stage, candidate.model_provider, candidate.model_name, time.monotonic() - started[index])
+                        value = accept(candidate, result)
+                    except Exception as e:
+                        logger.warning(f"Hedged [{stage}] call to {candidate.model_provider}/{candidate.model_name} failed: {e}")
+                        errors.append(e)
+                        continue
+                    outcome = "primary_won" if index == 0 else ("fallback_won" if errors else "hedge_won")
+                    self._record(stage, calls=1, cancelled=len(pending), **{outcome: 1})
+                    if index:
+                        logger.info(f"Hedged [{stage}] call answered by {candidate.model_provider}/{candidate.model_name} ({outcome})")
+                    return candidate, value
+
+                # Every candidate that finished failed; fall back to the next one without waiting
+                if len(started) < len(candidates):
+                    launch()
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+        self._record(stage, calls=1, failed=1)
+        raise errors[-1]
+
+
+    def _record(self, stage: str, **increments: int) -> None:
+        with self._lock:
+            counters = self._counters.setdefault(stage, {name: 0 for name in self.COUNTERS})
+            for name, value in increments.items():
+                counters[name] += value
+
+        redis = get_redis()
+        if redis is not None:
+            try:
+                pipe = redis.pipeline()
+                for name, value in increments.items():
+                    if value:
+                        pipe.hincrby(self.REDIS_KEY, f"{stage}:{name}", value)
+                pipe.execute()
+            except Exception as e:
+                logger.warning(f"Failed to update hedging stats in Redis: {e}")
+
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            worker = {stage: dict(counters) for stage, counters in self._counters.items()}
+            keys = list(self._latencies)
+        delays = {}
+        for key in keys:
+            stage, target = key.split(":", 1)
+            provider, model = target.split("/", 1)
+            delays[key] = round(self.delay(stage, provider, model), 3)
+
+        shared = None
+        redis = get_redis()
+        if redis is not None:
+            try:
+                shared = {}
+                for field, value in redis.hgetall(self.REDIS_KEY).items():
+                    field = field.decode() if isinstance(field, bytes) else field
+                    stage, name = field.rsplit(":", 1)
+                    shared.setdefault(stage, {})[name] = int(value)
+            except Exception as e:
+                logger.warning(f"Failed to read hedging stats from Redis: {e}")
+        return {"enabled": Config.LLM_HEDGING_ENABLED, "worker": worker, "hedge_delays_seconds": delays, "shared": shared}
+
+
+llm_hedging = LLMHedgingPolicy()
@@ -7,16 +7,26 @@ from src.services.insight_generator_service import InsightGenerator
 from src.services.data_joiner_service import DataJoiner
 from src.services.classify_user_intent_service import classify_user_intent
 from src.services.general_answer_service import generate_general_llm_response
+from src.services.classify_and_plan_service import classify_and_plan
 from src.utils.exceptions import ConnectionError, SchemaError, IntentClassificationError, GeneralAnswerError, QueryGenerationError, QueryExecutionError, JoinError, AnalysisError, LLMNotConfiguredError
 from src.utils.llm_configuration import LLMConfig
 from src.utils.db_connector import get_db_connection
+from src.services.schema_cache_service import schema_cache
+from src.services.schema_retrieval_service import schema_retrieval, estimate_tokens
+from src.services.plan_cache_service import plan_cache
+from src.services.intent_preclassifier_service import intent_preclassifier
+from src.services.speculation_service import speculation_tracker
+from src.models.db import DBConnectionParams
+from src.utils.schema_format import SCHEMA_FORMAT_LEGEND, render_databases, render_schema_lines
+from config import Config
 
 from langgraph.graph import StateGraph, END
 from langgraph.graph.message import add_messages
 
 import asyncio
-import logging
+import hashlib
 import json
+import logging
 import time
 from typing import TypedDict, Annotated, List, Dict, Any, Literal
 
@@ -27,6 +37,10 @@ logger = logging.getLogger(__name__)
 
 
 
+def _merge_dicts(left: Dict[str, Any], right: Dict[str, Any]) -> Dict[str, Any]:
+    return {**(left or {}), **(right or {})}
+
+
 # 1. Define the new Graph State
 class MultiDBQueryState(TypedDict):
     # Inputs
@@ -34,10 +48,13 @@ class MultiDBQueryState(TypedDict):
     
     # Global state
     db_connections: Dict[str, Any]
+    unreachable_sources: List[Dict[str, str]]
     db_schemas: Dict[str, Dict[str, Any]]
     llm: LLMConfig
+    progress: Any # Optional callback(event, data) reporting live progress, e.g. to an SSE stream
 
     error: Annotated[List[str], add_messages]
+    diagnostics: Annotated[Dict[str, Any], _merge_dicts]
 
     # Classification
     requires_db_context: bool
@@ -46,6 +63,9 @@ class MultiDBQueryState(TypedDict):
     # Path for 'query'
     target_db_ids: List[str | None]  # The target databases ID for the query
     generated_query_plan: Dict[str, str] # db_id -> query string
+    plan_cache_entry: Dict[str, Any] # The stored plan reused for this question, if any
+    dispatched_queries: Dict[Any, Any] # query_id -> (query signature, execution task) started while the plan streamed
+    speculative_fingerprints: Dict[str, str] # db_id -> fingerprint of the cached schema a speculative plan was made from
     execution_results: List[Dict[str, Any]]
     final_data: List[Dict[str, Any]]
     
@@ -60,52 +80,194 @@ class MultiDBQueryState(TypedDict):
 
 
 
-# This node establishes connections to all databases specified in the request.
-async def get_all_db_connections_node(state: MultiDBQueryState) -> Dict[str, Any]:
+# This node loads a lightweight schema digest for every granted database.
+# Digests come from the schema cache; a database is only connected to and inspected on a cache miss.
+async def load_schema_digests_node(state: MultiDBQueryState) -> Dict[str, Any]:
     start_time = time.time()
-    connections = {}
-    for params in state["request"].connections:
-        try:
-            logger.info(f"Establishing connection to {params.id} ({params.db_type})...")
-            conn = await get_db_connection(params)
-            connections[params.id] = conn
-        except Exception as e:
-            logger.error(f"Failed to connect to DB {params.id}: {e}")
-            raise ConnectionError(params.id, str(e))
+    request = state["request"]
+
+    schemas, missing = {}, []
+    for params in request.connections:
+        digest = await schema_cache.get_digest(params)
+        if digest is not None:
+            schemas[params.id] = digest
+        else:
+            missing.append(params)
+
+    connections, unreachable = await _connect_all(missing, _skip_unreachable(request))
+    inspected = await _inspect_schemas(
+        [params for params in missing if params.id in connections], connections, include_example_data=False
+    )
+    schemas.update(inspected)
+    state["llm"].schema_version = _schema_version(schemas)
 
     try:
-        logger.info(f"Successfully established {len(connections)} DB connections.")
-        return {"db_connections": connections}
+        logger.info(f"Loaded schema digests for {len(schemas)} DB(s), {len(schemas) - len(inspected)} from cache.")
+        return {"db_connections": connections, "db_schemas": schemas, "unreachable_sources": unreachable}
     finally:
         elapsed = (time.time() - start_time) * 1000
-        logger.info(f"get_all_db_connections_node took {elapsed:.2f} ms")
+        logger.info(f"load_schema_digests_node took {elapsed:.2f} ms")
 
 
 
 
-# This node retrieves schema information from all connected databases.
-async def get_all_schemas_node(state: MultiDBQueryState) -> Dict[str, Any]:
+# This node connects only to the databases selected by the classifier.
+async def connect_target_dbs_node(state: MultiDBQueryState) -> Dict[str, Any]:
     start_time = time.time()
-    schemas, connections = {}, state["db_connections"]
+    request = state["request"]
+    existing = state.get("db_connections") or {}
+    pending = [p for p in request.connections if p.id in state["target_db_ids"] and p.id not in existing]
+
+    connections, unreachable = await _connect_all(pending, _skip_unreachable(request))
+    connections = {**existing, **connections}
+
+    target_db_ids = [db_id for db_id in state["target_db_ids"] if db_id in connections]
+    if not target_db_ids:
+        raise ConnectionError(", ".join(state["target_db_ids"]), "None of the target databases could be connected.")
+
+    try:
+        logger.info(f"Target DB connections ready: {', '.join(target_db_ids)} ({len(pending)} newly connected).")
+        return {
+            "db_connections": connections,
+            "target_db_ids": target_db_ids,
+            "unreachable_sources": (state.get("unreachable_sources") or []) + unreachable,
+        }
+    finally:
+        elapsed = (time.time() - start_time) * 1000
+        logger.info(f"connect_target_dbs_node took {elapsed:.2f} ms")
+
+
+
+
+# This node makes sure the full schema (including example data) is available for every target database.
+# In the steady state this is a cache lookup validated by one cheap fingerprint query per database.
+async def get_target_schemas_node(state: MultiDBQueryState) -> Dict[str, Any]:
+    start_time = time.time()
+    schemas = dict(state["db_schemas"])
     all_params = {p.id: p for p in state["request"].connections}
+    # In 'relevant' mode example rows are sampled per question, so the cached structure is enough
+    sample_relevant_only = Config.SCHEMA_SAMPLE_MODE == "relevant"
 
-    for db_id, conn in connections.items():
-        try:
-            params = all_params[db_id]
-            logger.info(f"Inspecting schema for {db_id}...")
-            inspector = DatabaseInspector(conn, params.db_type)
-            schema_repr = await inspector.get_schema_representation()
-            schemas[db_id] = {"db_type": params.db_type, **schema_repr}
+    async def cached_if_fresh(params: DBConnectionParams):
+        if sample_relevant_only:
+            cached = await schema_cache.get_entry(params)
+        else:
+            cached = await schema_cache.get_full(params)
+        if cached is None:
+            return params, None
+        inspector = DatabaseInspector(state["db_connections"][params.id], params.db_type, params.schemas)
+        fingerprint = await inspector.get_schema_fingerprint()
+        if fingerprint is None or fingerprint != cached.get("fingerprint"):
+            logger.info(f"Cached schema for {params.id} is stale, re-inspecting.")
+            return params, None
+        return params, cached
+
+    to_inspect = []
+    lookups = await asyncio.gather(*(cached_if_fresh(all_params[db_id]) for db_id in state["target_db_ids"]))
+    for params, cached in lookups:
+        if cached is not None:
+            schemas[params.id] = cached
+        else:
+            to_inspect.append(params)
+
+    schemas.update(await _inspect_schemas(to_inspect, state["db_connections"], include_example_data=not sample_relevant_only))
+
+    if sample_relevant_only:
+        sampled = await asyncio.gather(*(
+            _sample_relevant_examples(all_params[db_id], state["db_connections"][db_id], schemas[db_id], state["request"])
+            for db_id in state["target_db_ids"]
+        ))
+        for db_id, schema_repr in zip(state["target_db_ids"], sampled):
+            schemas[db_id] = schema_repr
 
-        except Exception as e:
-            logger.error(f'Error fetching schema for db_id: {db_id}')
-            raise SchemaError(db_id, str(e))
     try:
-        logger.info(f"Successfully inspected {len(schemas)} schemas.")
+        logger.info(f"Full schemas ready for {len(state['target_db_ids'])} target DB(s), {len(to_inspect)} inspected.")
         return {"db_schemas": schemas}
     finally:
         elapsed = (time.time() - start_time) * 1000
-        logger.info(f"get_all_schemas_node took {elapsed:.2f} ms")
+        logger.info(f"get_target_schemas_node took {elapsed:.2f} ms")
+
+
+# This helper samples example rows only for the tables relevant to the question (SQL databases only).
+async def _sample_relevant_examples(params: DBConnectionParams, conn: Any, schema_repr: Dict[str, Any], request: NLQueryRequest) -> Dict[str, Any]:
+    if params.db_type == "mongodb":
+        return schema_repr
+    descriptions = request.schema_descriptions.get(params.id)
+    tables = schema_retrieval.relevant_tables(params.id, schema_repr, request.question, descriptions)
+    inspector = DatabaseInspector(conn, params.db_type, params.schemas)
+    example_data = await inspector.sample_example_data(schema_repr["schema"], tables)
+    logger.info(f"Sampled example rows for {len(tables)} of {len(schema_repr['schema'])} tables in {params.id}.")
+    return {**schema_repr, "example_data": example_data}
+
+
+# A short hash identifying the schemas a question is answered against; part of the LLM cache key.
+def _schema_version(schemas: Dict[str, Dict[str, Any]]) -> str:
+    parts = []
+    for db_id in sorted(schemas):
+        schema_repr = schemas[db_id]
+        version = schema_repr.get("fingerprint") or hashlib.sha256(json.dumps(schema_repr.get("schema"), sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        parts.append(f"{db_id}={version}")
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+def _skip_unreachable(request: NLQueryRequest) -> bool:
+    if request.skip_unreachable_sources is None:
+        return Config.DB_SKIP_UNREACHABLE_SOURCES
+    return request.skip_unreachable_sources
+
+
+# This helper connects to the given databases concurrently.
+# Unreachable sources are reported when skipping is allowed, otherwise the first failure is raised.
+async def _connect_all(params_list: List[DBConnectionParams], skip_unreachable: bool):
+    outcomes = await asyncio.gather(*(_connect_with_timeout(params) for params in params_list))
+
+    connections, unreachable = {}, []
+    for params, conn, error in outcomes:
+        if error is None:
+            connections[params.id] = conn
+            continue
+        logger.error(f"Failed to connect to DB {params.id}: {error}")
+        if not skip_unreachable:
+            raise ConnectionError(params.id, error)
+        unreachable.append({"db_id": params.id, "db_type": params.db_type, "reason": error})
+
+    if unreachable:
+        logger.warning(f"Continuing without {len(unreachable)} unreachable DB(s): {', '.join(u['db_id'] for u in unreachable)}")
+    return connections, unreachable
+
+
+# This helper connects to one database within the per-source timeout and never raises.
+async def _connect_with_timeout(params: DBConnectionParams):
+    timeout = Config.DB_CONNECT_TIMEOUT_SECONDS
+    try:
+        logger.info(f"Establishing connection to {params.id} ({params.db_type})...")
+        conn = await asyncio.wait_for(get_db_connection(params), timeout=timeout)
+        return params, conn, None
+    except asyncio.TimeoutError:
+        return params, None, f"Connection timed out after {timeout} seconds"
+    except Exception as e:
+        return params, None, str(e)
+
+
+# This helper inspects several databases concurrently and stores the results in the schema cache.
+async def _inspect_schemas(params_list: List[DBConnectionParams], connections: Dict[str, Any], include_example_data: bool) -> Dict[str, Dict[str, Any]]:
+    async def inspect_one(params: DBConnectionParams):
+        try:
+            logger.info(f"Inspecting schema for {params.id}...")
+            inspector = DatabaseInspector(connections[params.id], params.db_type, params.schemas, cache_namespace=":".join(schema_cache.key_for(params)))
+            fingerprint = await inspector.get_schema_fingerprint()
+            schema_repr = await inspector.get_schema_representation(include_example_data=include_example_data)
+            schema_lines = render_schema_lines(schema_repr["schema"])
+            return params, {"db_type": params.db_type, **schema_repr, "schema_lines": schema_lines, "fingerprint": fingerprint}
+        except Exception as e:
+            logger.error(f'Error fetching schema for db_id: {params.id}')
+            raise SchemaError(params.id, str(e))
+
+    schemas = {}
+    for params, schema_repr in await asyncio.gather(*(inspect_one(p) for p in params_list)):
+        await schema_cache.put(params, schema_repr)
+        schemas[params.id] = schema_repr
+    return schemas
 
 
 
@@ -114,24 +276,40 @@ async def get_all_schemas_node(state: MultiDBQueryState) -> Dict[str, Any]:
 async def classify_question_node(state: MultiDBQueryState) -> Dict[str, Any]:
     start_time = time.time()
     question = state["request"].question
-    # Sanitize schema for the prompt to avoid overwhelming the LLM
-    schemas_for_prompt = {
-        db_id: {
-            "db_type": sch["db_type"],
-            "schema": sch["schema"] # Only include the core schema, not example data
-        } for db_id, sch in state["db_schemas"].items()
-    }
-
+    # Only the core schema in compact notation, not example data, to avoid overwhelming the LLM
     try:
-        schemas_str = json.dumps(schemas_for_prompt, indent=2)
+        schemas_str = f"{SCHEMA_FORMAT_LEGEND}\n\n{render_databases(state['db_schemas'])}"
     except Exception as e:
         logger.error(f"Failed to classify question: {e}")
         raise IntentClassificationError(str(e))
 
+    # Obvious cases (destructive requests, small talk, clear single-database questions) are decided locally
+    pre, shadow = None, False
+    if Config.INTENT_PRECLASSIFIER_ENABLED:
+        pre = intent_preclassifier.classify(question, state["db_schemas"])
+        if pre.confident:
+            shadow = intent_preclassifier.should_shadow()
+            if not shadow:
+                await asyncio.to_thread(intent_preclassifier.record, pre, None, fast_path=True)
+                logger.info(f"Pre-classified intent: '{pre.intent}' ({pre.source}, confidence {pre.confidence}), Target DBs: '{pre.db_ids}'")
+                elapsed = (time.time() - start_time) * 1000
+                logger.info(f"classify_question_node took {elapsed:.2f} ms")
+                return {
+                    "question_type": pre.intent,
+                    "target_db_ids": pre.db_ids,
+                    "requires_db_context": pre.intent in ['query', 'analysis'],
+                    "diagnostics": {"intent_preclassifier": {"used": True, "intent": pre.intent, "source": pre.source, "confidence": pre.confidence}},
+                }
+
     logger.info(f"Classifying question intent (query vs analysis vs general vs dangerous...)")
 
     llm = state.get("llm")
     if not llm: raise LLMNotConfiguredError("LLM needs to be configured")
+
+    # With a single granted database the plan is started speculatively while the classifier runs
+    speculation = None
+    if _should_speculate(state, pre):
+        speculation = _start_speculation(state, pre.intent if pre is not None and pre.intent in ['query', 'analysis'] else 'query')
     try:
         classification = await classify_user_intent(llm, schemas_str, question, state)
         if "error" in classification:
@@ -139,12 +317,19 @@ async def classify_question_node(state: MultiDBQueryState) -> Dict[str, Any]:
             raise IntentClassificationError(str(classification["error"]))
         
         intent = classification["question_type"]
+        diagnostics = {}
+        if pre is not None:
+            await asyncio.to_thread(intent_preclassifier.record, pre, intent, fast_path=False, shadow=shadow)
+            diagnostics["intent_preclassifier"] = {"used": False, "intent": pre.intent, "source": pre.source, "confidence": pre.confidence, "agreed": pre.intent == intent}
+
         if intent not in ['query', 'analysis']:
             logger.info(f"Classified intent: '{intent}', thus no target databases.")
+            await _settle_speculation(speculation, llm, intent, [], diagnostics)
             return {
                 "question_type": intent,
                 "target_db_ids": [],
                 "requires_db_context": False,
+                "diagnostics": diagnostics,
             }
 
         target_db_ids = classification["target_db_ids"]
@@ -155,20 +340,152 @@ async def classify_question_node(state: MultiDBQueryState) -> Dict[str, Any]:
             error = f"Target databases '{target_db_ids}' not found in schemas for question type '{intent}'."
             raise IntentClassificationError(str(error))
 
-        
+        speculative_update = await _settle_speculation(speculation, llm, intent, target_db_ids, diagnostics)
         return {
+            **speculative_update,
             "question_type": intent,
             "target_db_ids": target_db_ids,
             "requires_db_context": True if intent in ['query', 'analysis'] else False,
+            "diagnostics": diagnostics,
         }
     except Exception as e:
         logger.error(f"Failed to classify question: {e}")
+        if speculation is not None:
+            _cancel_speculation(speculation["task"])
         raise IntentClassificationError(str(e))
     finally:
         elapsed = (time.time() - start_time) * 1000
         logger.info(f"classify_question_node took {elapsed:.2f} ms")
 
 
+def _should_speculate(state: MultiDBQueryState, pre) -> bool:
+    if not Config.SPECULATIVE_PLANNING_ENABLED:
+        return False
+    connections = state["request"].connections
+    if len(connections) != 1 or connections[0].id not in state["db_schemas"]:
+        return False
+    # Not worth the tokens when the local model already expects no data to be needed
+    return pre is None or pre.intent in ['query', 'analysis']
+
+
+# This helper starts the planner call as if the classifier had already chosen `intent` on the only database.
+# Until the classifier has ruled out dangerous or general questions nothing touches the database: the plan
+# is made from the cached full schema, without connecting, and no query is dispatched. generate_query_node
+# only keeps it once the target schema has been re-validated. It runs on a stateless fork of the LLM config.
+def _start_speculation(state: MultiDBQueryState, intent: str) -> Dict[str, Any]:
+    params = state["request"].connections[0]
+    db_id = params.id
+    fork = state["llm"].fork()
+    logger.info(f"Speculatively planning '{intent}' on {db_id} while classifying.")
+
+    async def run():
+        if Config.SCHEMA_SAMPLE_MODE == "relevant":
+            cached = await schema_cache.get_entry(params)
+        else:
+            cached = await schema_cache.get_full(params)
+        if cached is None or not cached.get("fingerprint"):
+            return None
+        speculative_state = {
+            **state, "llm": fork, "question_type": intent, "target_db_ids": [db_id],
+            "db_schemas": {**state["db_schemas"], db_id: cached}, "speculative": True,
+        }
+        update = await generate_query_node(speculative_state)
+        return {**update, "speculative_fingerprints": {db_id: cached["fingerprint"]}}
+
+    return {"task": asyncio.create_task(run()), "intent": intent, "db_ids": [db_id], "llm": fork}
+
+
+# This helper stops a speculative plan, including queries it dispatched when it already finished.
+def _cancel_speculation(task: asyncio.Task) -> None:
+    if not task.done():
+        task.cancel()
+    elif not task.cancelled() and task.exception() is None and task.result():
+        _cancel_dispatched(task.result().get("dispatched_queries"))
+
+
+# This helper uses the speculative plan when the classifier agreed, otherwise cancels it and counts the wasted tokens.
+# Returns the state update of the speculative steps (empty unless it was used) and adds to `diagnostics`.
+async def _settle_speculation(speculation: Dict[str, Any], llm: LLMConfig, intent: str, target_db_ids: List[str], diagnostics: Dict[str, Any]) -> Dict[str, Any]:
+    if speculation is None:
+        return {}
+    task, fork = speculation["task"], speculation["llm"]
+
+    if intent == speculation["intent"] and list(target_db_ids) == speculation["db_ids"]:
+        try:
+            update = await task
+        except Exception as e:
+            logger.warning(f"Speculative planning failed, planning normally: {e}")
+            await asyncio.to_thread(speculation_tracker.record, "failed", fork.usage)
+            diagnostics["speculative_plan"] = {"outcome": "failed"}
+            return {}
+        if update is None:
+            diagnostics["speculative_plan"] = {"outcome": "skipped", "reason": "no cached full schema"}
+            return {}
+        llm.merge_usage(fork)
+        await asyncio.to_thread(speculation_tracker.record, "hits")
+        diagnostics.update(update.pop("diagnostics", {}))
+        diagnostics["speculative_plan"] = {"outcome": "hit"}
+        logger.info(f"Speculative plan used for '{intent}' on {', '.join(target_db_ids)}.")
+        return update
+
+    in_flight = not task.done()
+    task.cancel()
+    # Let the cancellation land so the fork's usage is final; the result is discarded either way
+    await asyncio.wait([task])
+    _cancel_speculation(task)
+    wasted = {
+        "input_tokens": sum(totals.get("input_tokens", 0) for totals in fork.usage.values()),
+        "output_tokens": sum(totals.get("output_tokens", 0) for totals in fork.usage.values()),
+    }
+    await asyncio.to_thread(speculation_tracker.record, "misses", fork.usage, in_flight)
+    diagnostics["speculative_plan"] = {"outcome": "miss", "cancelled_in_flight": in_flight, "wasted_tokens": wasted}
+    logger.info(f"Speculative plan discarded (classified '{intent}' on {target_db_ids}), wasted {wasted} tokens.")
+    return {}
+
+
+
+
+# This node classifies the question and plans its queries in one LLM call (CLASSIFY_PLAN_MODE=fused).
+# A response that does not validate leaves the state untouched, and the graph falls back to the two-step path.
+async def classify_and_plan_node(state: MultiDBQueryState) -> Dict[str, Any]:
+    start_time = time.time()
+    request = state["request"]
+    question = request.question
+    logger.info(f"Classifying question and planning queries in a single call...")
+
+    llm = state.get("llm")
+    if not llm: raise LLMNotConfiguredError("LLM needs to be configured")
+
+    try:
+        # Digest schemas only, limited to the tables relevant to the question
+        schemas = {
+            db_id: schema_retrieval.prune(db_id, schema_repr, question, request.schema_descriptions.get(db_id))
+            for db_id, schema_repr in state["db_schemas"].items()
+        }
+        result = await classify_and_plan(llm, schemas, question)
+        if "error" in result:
+            logger.warning(f"Fused classify-and-plan response rejected, falling back to two-step path: {result['error']}")
+            return {"diagnostics": {"classify_plan": {"fused": False, "fallback_reason": "; ".join(result["error"])}}}
+
+        intent = result["question_type"]
+        logger.info(f"Fused classification: '{intent}', Target DBs: '{result['target_db_ids']}'")
+        update = {
+            "question_type": intent,
+            "target_db_ids": result["target_db_ids"],
+            "requires_db_context": intent in ['query', 'analysis'],
+            "diagnostics": {"classify_plan": {"fused": True}},
+        }
+        if "generated_query_plan" in result:
+            update["generated_query_plan"] = result["generated_query_plan"]
+        return update
+    except Exception as e:
+        logger.warning(f"Fused classify-and-plan failed, falling back to two-step path: {e}")
+        return {"diagnostics": {"classify_plan": {"fused": False, "fallback_reason": str(e)}}}
+    finally:
+        elapsed = (time.time() - start_time) * 1000
+        logger.info(f"classify_and_plan_node took {elapsed:.2f} ms")
+
+
 
 
 # This node handles dangerous or security-risk questions.
@@ -238,30 +555,93 @@ async def generate_query_node(state: MultiDBQueryState) -> Dict[str, Any]:
 
     logger.info(f"Generating multi-db query plan for intent '{intent}' on DBs: {', '.join(db_ids)}")
 
-    # 1. Consolidate schemas to pass to the planner
+    llm = state.get("llm")
+    if not llm: raise LLMNotConfiguredError("LLM needs to be configured")
+
+    # A speculative plan was made from the cached schema; keep it only if get_target_schemas found that schema current
+    speculative = state.get("speculative_fingerprints")
+    if speculative and state.get("generated_query_plan"):
+        if all(state["db_schemas"].get(db_id, {}).get("fingerprint") == fingerprint for db_id, fingerprint in speculative.items()):
+            logger.info(f"Target schemas unchanged, using the speculative query plan.")
+            return {}
+        logger.info(f"Target schema changed since the speculative plan, planning again.")
+        stale = {"speculative_fingerprints": None, "plan_cache_entry": None}
+        diagnostics_override = {"speculative_plan": {"outcome": "stale"}}
+    else:
+        stale, diagnostics_override = {}, {}
+
+    # 0. Reuse a validated plan of a near-identical earlier question, skipping the planner call
+    if _plan_cache_enabled(state["request"]):
+        match = await asyncio.to_thread(plan_cache.lookup, state["request"].organization_id, llm.schema_version, intent, db_ids, question, _previous_question(state["request"]))
+        if match is not None:
+            plan, confidence, entry = match
+            logger.info(f"Reusing cached query plan (confidence {confidence}) of: {entry['question']}")
+            elapsed = (time.time() - start_time) * 1000
+            logger.info(f"generate_query_node took {elapsed:.2f} ms")
+            return {
+                **stale,
+                "generated_query_plan": plan,
+                "plan_cache_entry": entry,
+                "diagnostics": {"plan_cache": {"hit": True, "confidence": confidence, "matched_question": entry["question"]}, **diagnostics_override},
+            }
+
+    # 1. Consolidate schemas to pass to the planner, keeping only the tables relevant to the question
     schemas_to_plan = {}
+    full_tokens, pruned_tokens = 0, 0
     for db_id in db_ids:
         if db_id in state["db_schemas"]:
-            schemas_to_plan[db_id] = state["db_schemas"][db_id]
+            schema_repr = state["db_schemas"][db_id]
+            descriptions = state["request"].schema_descriptions.get(db_id)
+            schemas_to_plan[db_id] = schema_retrieval.prune(db_id, schema_repr, question, descriptions)
+            full_tokens += estimate_tokens(render_databases({db_id: schema_repr}, include_examples=True))
+            pruned_tokens += estimate_tokens(render_databases({db_id: schemas_to_plan[db_id]}, include_examples=True))
         else:
             error = f"Database ID '{db_id}' not found in schemas."
             raise QueryGenerationError(str(error))
 
-    # 2. Call the new planner method
-    llm = state.get("llm")
-    if not llm: raise LLMNotConfiguredError("LLM needs to be configured")
+    schema_pruning = {
+        "schema_tokens_full": full_tokens,
+        "schema_tokens_sent": pruned_tokens,
+        "schema_tokens_saved": full_tokens - pruned_tokens,
+        "tables_sent": {db_id: len(sch.get("schema") or {}) for db_id, sch in schemas_to_plan.items()},
+    }
+    logger.info(f"Planner schema context: ~{pruned_tokens} tokens (saved ~{full_tokens - pruned_tokens} of ~{full_tokens}).")
+
+    # 2. Call the new planner method; when streaming, each query starts executing as soon as it is parsed
+    # (never for a speculative plan, which is made before the question is known to be safe)
+    dispatched = {}
     try:
         query_gen = QueryGenerator()
-        generated_plan = await query_gen.generate_query_plan(
-            model=llm,
-            intent=intent,
-            schemas_for_planning=schemas_to_plan,
-            question=question
-        )
-        logger.info(f"Query plan generation complete.")
-        return {"generated_query_plan": generated_plan}
+        if Config.LLM_STREAMING_ENABLED and not state.get("speculative"):
+            generated_plan = await query_gen.stream_query_plan(
+                model=llm,
+                intent=intent,
+                schemas_for_planning=schemas_to_plan,
+                question=question,
+                on_query=lambda query_info: _dispatch_query(state, query_info, dispatched),
+                db_ids=db_ids
+            )
+        else:
+            generated_plan = await query_gen.generate_query_plan(
+                model=llm,
+                intent=intent,
+                schemas_for_planning=schemas_to_plan,
+                question=question,
+                db_ids=db_ids
+            )
+        logger.info(f"Query plan generation complete, {len(dispatched)} queries dispatched while streaming.")
+        return {
+            **stale,
+            "generated_query_plan": generated_plan,
+            "dispatched_queries": dispatched,
+            "diagnostics": {"schema_pruning": schema_pruning, "plan_cache": {"hit": False}, "queries_dispatched_while_streaming": len(dispatched), **diagnostics_override},
+        }
+    except asyncio.CancelledError:
+        _cancel_dispatched(dispatched)
+        raise
     except Exception as e:
         logger.error(f"Query plan generation failed: {e}")
+        _cancel_dispatched(dispatched)
         raise QueryGenerationError(str(e))
     finally:
         elapsed = (time.time() - start_time) * 1000
@@ -281,28 +661,41 @@ async def execute_query_node(state: MultiDBQueryState) -> Dict[str, Any]:
 
     # A list to hold the results from all executions, keyed by db_id.
     all_results = []
+    # Queries already started while the plan was streaming
+    dispatched = dict(state.get("dispatched_queries") or {})
     
-    # Create a list of coroutine tasks to run in parallel
-    tasks = []
+    # Validate every query before starting anything, so a bad entry leaves nothing running
+    targets = []
     for query_info in query_plan["queries"]:
-        query_id = query_info["query_id"]
         db_id = query_info["db_id"]
-        query = query_info["query"]
-        query_type = query_info["query_type"]
-        
-
-        db_conn = state["db_connections"].get(str(db_id), {})
+        db_conn = state["db_connections"].get(str(db_id))
         db_type = state["db_schemas"].get(str(db_id), {}).get("db_type")
 
-
         if db_conn is None or db_type not in ["mysql", "postgresql", "mongodb"]:
             error_msg = f"Connection or schema info not found for db_id: {db_id}"
             logger.error(f"{error_msg}")
+            _cancel_dispatched(dispatched)
             raise QueryExecutionError(db_id, str(error_msg))
+        targets.append((query_info, db_conn, db_type))
+
+    # Create a list of coroutine tasks to run in parallel
+    tasks = []
+    for query_info, db_conn, db_type in targets:
+        query_id = query_info["query_id"]
+        db_id = query_info["db_id"]
+
+        # Reuse the execution started during streaming if the final plan kept that query unchanged
+        early = dispatched.pop(query_id, None)
+        if early is not None and early[0] == _query_signature(query_info):
+            tasks.append(early[1])
+            continue
+        if early is not None:
+            early[1].cancel()
         
         # Create a task for each query execution and add it to the list
-        task = _execute_single_query(db_id, db_type, db_conn, query, query_id, query_type)
+        task = asyncio.ensure_future(_execute_single_query(db_id, db_type, db_conn, query_info["query"], query_id, query_info["query_type"]))
         tasks.append(task)
+    _cancel_dispatched(dispatched)
     
     try:
         # Run all query execution tasks concurrently
@@ -313,6 +706,7 @@ async def execute_query_node(state: MultiDBQueryState) -> Dict[str, Any]:
             if result.get("error"):
                 # If any query fails, halte and return the error
                 logger.error(f"A query execution failed: {result['error']}")
+                await _discard_cached_plan(state)
                 return {"error": [f"A query execution failed: {result['error']}"]}
             
             # Store successful result in the dictionary
@@ -324,15 +718,66 @@ async def execute_query_node(state: MultiDBQueryState) -> Dict[str, Any]:
             )
 
         logger.info(f"All queries executed successfully.")
+        if _plan_cache_enabled(state["request"]) and not state.get("plan_cache_entry"):
+            # The plan ran, so it is worth reusing for paraphrases of this question
+            await asyncio.to_thread(
+                plan_cache.store, state["request"].organization_id, state["llm"].schema_version,
+                state["question_type"], state["target_db_ids"], state["request"].question, query_plan,
+                _previous_question(state["request"])
+            )
         return {"execution_results": all_results}
     except Exception as e:
         logger.error(f"Query execution failed on DB '{db_id}': {e}")
+        await _discard_cached_plan(state)
         raise QueryExecutionError(db_id, str(e))
     finally:
+        # gather does not cancel the others when one fails (or when the node is cancelled);
+        # stop them, reused early executions included. Finished tasks ignore this.
+        for task in tasks:
+            task.cancel()
         elapsed = (time.time() - start_time) * 1000
         logger.info(f"execute_query_node took {elapsed:.2f} ms")
 
 
+def _plan_cache_enabled(request: NLQueryRequest) -> bool:
+    return Config.PLAN_CACHE_ENABLED and bool(request.organization_id) and not request.bypass_cache
+
+
+# The user's question before the current one (the last history entry is the current question).
+def _previous_question(request: NLQueryRequest) -> str:
+    user_messages = [msg.content for msg in request.chat_history if msg.role == "user" and isinstance(msg.content, str)]
+    return user_messages[-2] if len(user_messages) > 1 else ""
+
+
+# This helper starts executing one streamed plan entry right away, if it targets a connected target database.
+def _dispatch_query(state: MultiDBQueryState, query_info: Any, dispatched: Dict[Any, Any]) -> None:
+    if not isinstance(query_info, dict) or "query" not in query_info or query_info.get("query_id") in dispatched:
+        return
+    db_id = str(query_info.get("db_id"))
+    db_conn = state["db_connections"].get(db_id)
+    db_type = state["db_schemas"].get(db_id, {}).get("db_type")
+    if db_id not in state["target_db_ids"] or db_conn is None or db_type not in ["mysql", "postgresql", "mongodb"]:
+        return
+    logger.info(f"Dispatching query {query_info.get('query_id')} on '{db_id}' while the plan is still streaming.")
+    task = asyncio.create_task(_execute_single_query(db_id, db_type, db_conn, query_info["query"], query_info.get("query_id"), query_info.get("query_type")))
+    dispatched[query_info.get("query_id")] = (_query_signature(query_info), task)
+
+
+def _query_signature(query_info: Dict[str, Any]) -> str:
+    return json.dumps(query_info, sort_keys=True, default=str)
+
+
+def _cancel_dispatched(dispatched: Dict[Any, Any]) -> None:
+    for _, task in (dispatched or {}).values():
+        task.cancel()
+
+
+# A reused plan that fails is dropped so the next paraphrase goes back to the planner.
+async def _discard_cached_plan(state: MultiDBQueryState) -> None:
+    if state.get("plan_cache_entry"):
+        await asyncio.to_thread(plan_cache.discard, state["plan_cache_entry"])
+
+
 # This helper coroutine executes a single query and returns a structured result.
 async def _execute_single_query(db_id: str, db_type: str, db_conn: Any, query: Any, query_id: Any, query_type: str) -> Dict[str, Any]:
     """Helper coroutine to execute one query and return a structured result."""
@@ -388,7 +833,7 @@ async def process_query_result_node(state: MultiDBQueryState) -> Dict[str, Any]:
         if not llm: raise LLMNotConfiguredError("LLM needs to be configured")
 
         summary_service = SummaryGenerator()
-        summary = await summary_service.analyze(llm, question, final_data)
+        summary = await summary_service.analyze(llm, question, final_data, on_token=_analysis_token_callback(state))
 
         summary_data_len = len(summary["data"])
         logger.info(f"{summary_data_len} Final Table(s) created")
@@ -439,7 +884,7 @@ async def process_analysis_result_node(state: MultiDBQueryState) -> Dict[str, An
         if not llm: raise LLMNotConfiguredError("LLM needs to be configured")
 
         insight_service = InsightGenerator()
-        insights = await insight_service.analyze(llm, question, final_data)
+        insights = await insight_service.analyze(llm, question, final_data, on_token=_analysis_token_callback(state))
 
         insights_data_len = len(insights["data"])
         logger.info(f"{insights_data_len} Final Table(s) created")
@@ -480,8 +925,86 @@ async def process_analysis_result_node(state: MultiDBQueryState) -> Dict[str, An
 
 
 
+# This helper forwards streamed analysis text to the progress callback, when there is one.
+def _analysis_token_callback(state: MultiDBQueryState):
+    progress = state.get("progress")
+    if progress is None or not Config.LLM_STREAMING_ENABLED:
+        return None
+    return lambda text: progress("analysis_token", {"text": text})
+
+
+# Wraps a node so that its result is reported to the progress callback as soon as the node finishes.
+def _with_progress(name: str, node):
+    async def run(state: MultiDBQueryState) -> Dict[str, Any]:
+        update = await node(state)
+        progress = state.get("progress")
+        if progress is not None:
+            try:
+                for event, data in _progress_events(name, update, state):
+                    progress(event, data)
+            except Exception as e:
+                logger.warning(f"Failed to report progress of {name}: {e}")
+        return update
+    return run
+
+
+def _progress_events(name: str, update: Dict[str, Any], state: MultiDBQueryState):
+    if name == "load_schema_digests":
+        yield "schemas_loaded", {"db_ids": sorted(update.get("db_schemas") or {}), "unreachable_sources": update.get("unreachable_sources") or []}
+    elif name in ("classify_question", "classify_and_plan"):
+        if update.get("question_type"):
+            yield "intent", {"intent": update["question_type"], "db_ids": update.get("target_db_ids") or []}
+        if update.get("generated_query_plan"):
+            yield "plan", update["generated_query_plan"]
+    elif name == "connect_target_dbs":
+        yield "connections_ready", {"db_ids": update.get("target_db_ids") or [], "unreachable_sources": update.get("unreachable_sources") or []}
+    elif name == "get_target_schemas":
+        yield "schemas_ready", {"db_ids": state.get("target_db_ids") or []}
+    elif name == "generate_query":
+        yield "plan", update.get("generated_query_plan") or {}
+    elif name == "execute_query":
+        for result in update.get("execution_results") or []:
+            data = result["data"]
+            yield "query_result", {
+                "query_id": result["query_id"],
+                "db_id": result["db_id"],
+                "row_count": data.get("row_count"),
+                "columns": data.get("columns"),
+                "rows": (data.get("rows") or [])[:Config.SSE_PREVIEW_ROWS],
+            }
+    elif name == "join_data":
+        yield "join_complete", {"tables": len(update.get("final_data") or [])}
+
+
+
+
 ### 3. Define Conditional Edges
 
+def choose_classification_path(state: MultiDBQueryState) -> str:
+    if Config.CLASSIFY_PLAN_MODE != "fused" or not state.get("db_schemas"):
+        return "two_step"
+    if len(state["db_schemas"]) > Config.CLASSIFY_PLAN_FUSED_MAX_DBS:
+        return "two_step"
+    # Questions the local pre-classifier decides alone need no classifier call to fuse
+    if Config.INTENT_PRECLASSIFIER_ENABLED and intent_preclassifier.classify(state["request"].question, state["db_schemas"]).confident:
+        return "two_step"
+    return "fused"
+
+
+def route_after_fused(state: MultiDBQueryState) -> str:
+    if not state.get("question_type"):
+        return "fallback"
+    return should_get_db_context(state)
+
+
+def route_after_connect(state: MultiDBQueryState) -> str:
+    # A plan from the fused call only needs the connections; the full schemas are for the planner.
+    # A speculative plan still goes through them, so the schema it was made from is re-validated first.
+    if state.get("generated_query_plan") and not state.get("speculative_fingerprints"):
+        return "execute"
+    return "get_schemas"
+
+
 def should_get_db_context(state: MultiDBQueryState) -> str:
     if state.get("error"): return "error"
     if state.get("question_type") == "dangerous":
@@ -508,12 +1031,14 @@ def create_multi_db_query_graph():
     workflow = StateGraph(MultiDBQueryState)
     
     # Core flow nodes
-    workflow.add_node("get_all_db_connections", get_all_db_connections_node)
-    workflow.add_node("get_all_schemas", get_all_schemas_node)
-    workflow.add_node("classify_question", classify_question_node)
-    workflow.add_node("generate_query", generate_query_node)
-    workflow.add_node("execute_query", execute_query_node)
-    workflow.add_node("join_data",  join_data_node)
+    workflow.add_node("load_schema_digests", _with_progress("load_schema_digests", load_schema_digests_node))
+    workflow.add_node("classify_question", _with_progress("classify_question", classify_question_node))
+    workflow.add_node("classify_and_plan", _with_progress("classify_and_plan", classify_and_plan_node))
+    workflow.add_node("connect_target_dbs", _with_progress("connect_target_dbs", connect_target_dbs_node))
+    workflow.add_node("get_target_schemas", _with_progress("get_target_schemas", get_target_schemas_node))
+    workflow.add_node("generate_query", _with_progress("generate_query", generate_query_node))
+    workflow.add_node("execute_query", _with_progress("execute_query", execute_query_node))
+    workflow.add_node("join_data",  _with_progress("join_data", join_data_node))
 
     # Path-specific final processing nodes
     workflow.add_node("general_answer", general_answer_node)
@@ -521,21 +1046,37 @@ def create_multi_db_query_graph():
     workflow.add_node("process_query_result", process_query_result_node)
     workflow.add_node("process_analysis_result", process_analysis_result_node)
 
-    # Entry and edges
-    workflow.set_entry_point("get_all_db_connections")
-    workflow.add_edge("get_all_db_connections", "get_all_schemas")
-    workflow.add_edge("get_all_schemas", "classify_question")
+    # Entry and edges: classification only needs the (usually cached) schema digests
+    workflow.set_entry_point("load_schema_digests")
+    workflow.add_conditional_edges("load_schema_digests", choose_classification_path, {
+        "two_step": "classify_question",
+        "fused": "classify_and_plan",
+    })
 
     # Conditional routing based on whether the question requires database context
     workflow.add_conditional_edges("classify_question", should_get_db_context, {
-        "get_context": "generate_query",
+        "get_context": "connect_target_dbs",
         "general_question": "general_answer",
         "dangerous_question": "dangerous_question",
         "error": END
     })
     workflow.add_edge("general_answer", END)
 
-    # Continue with the context-aware flow
+    # The fused call routes like the classifier, or falls back to it when its output did not validate
+    workflow.add_conditional_edges("classify_and_plan", route_after_fused, {
+        "get_context": "connect_target_dbs",
+        "general_question": "general_answer",
+        "dangerous_question": "dangerous_question",
+        "fallback": "classify_question",
+        "error": END
+    })
+
+    # Continue with the context-aware flow, touching only the target databases
+    workflow.add_conditional_edges("connect_target_dbs", route_after_connect, {
+        "get_schemas": "get_target_schemas",
+        "execute": "execute_query",
+    })
+    workflow.add_edge("get_target_schemas", "generate_query")
     workflow.add_edge("generate_query", "execute_query")
     workflow.add_edge("execute_query", "join_data")
 
@@ -559,19 +1100,26 @@ multi_db_query_app = create_multi_db_query_graph()
 
 # 5. The Main Orchestrator Function
 async def process_natural_language_query(
-    request: NLQueryRequest
+    request: NLQueryRequest,
+    progress=None
 ) -> FinalResponse:
+    """Runs the graph for one question; `progress(event, data)` is called as each stage finishes."""
     
     model_provider = request.model_provider or 'gemini'
     chat_history = request.chat_history or []
     llm = LLMConfig(model_provider, chat_history)
+    llm.organization_id = request.organization_id
+    llm.bypass_cache = request.bypass_cache
 
     initial_state = MultiDBQueryState(
         request=request,
         db_connections={}, 
+        unreachable_sources=[],
         db_schemas={}, 
         error=[],
-        llm=llm
+        diagnostics={},
+        llm=llm,
+        progress=progress
     )
    
     final_state = await multi_db_query_app.ainvoke(initial_state)
@@ -580,4 +1128,12 @@ async def process_natural_language_query(
         error_message = ', '.join(final_state['error'])
         return FinalResponse(success=False, response_type="general_answer", summary=f"An error occurred: {error_message}", error_message=error_message)
     
-    return final_state["final_response"]
\ No newline at end of file
+    final_response = final_state["final_response"]
+    if final_state.get("unreachable_sources"):
+        final_response.unreachable_sources = final_state["unreachable_sources"]
+    diagnostics = dict(final_state.get("diagnostics") or {})
+    if llm.usage:
+        diagnostics["llm_usage"] = llm.usage
+    if diagnostics:
+        final_response.diagnostics = diagnostics
+    return final_response
\ No newline at end of file
@@ -0,0 +1,265 @@
+import copy
+import hashlib
+import json
+import logging
+import math
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import Config
+from src.services.schema_retrieval_service import tokenize
+from src.utils.redis_store import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+# Words that do not change what a question asks for
+STOPWORDS = {
+    "a", "an", "the", "of", "for", "in", "on", "to", "and", "with", "from", "me", "show", "give",
+    "list", "get", "find", "what", "which", "is", "are", "was", "were", "do", "doe", "did", "can", "could", "you",
+    "please", "all", "our", "my", "their", "tell", "display", "i", "we",
+    "want", "see", "it", "that", "this", "there", "at", "be", "as",
+}
+
+
+# Words that change the shape of the result rather than its subject: "how many users" needs a count,
+# "list all users" the rows. Plans are only reused between questions with the same markers.
+SHAPE_MARKERS = {
+    "count": {"count", "many", "number"},
+    "sum": {"total", "sum", "much"},
+    "average": {"average", "avg", "mean"},
+    "min": {"min", "minimum", "lowest", "smallest", "least", "cheapest", "earliest"},
+    "max": {"max", "maximum", "highest", "largest", "biggest", "most", "latest"},
+    "group": {"by", "per", "each", "every", "breakdown", "grouped"},
+    "order": {"top", "bottom", "sort", "sorted", "rank", "ranked", "first", "last", "newest", "oldest", "recent"},
+    "distinct": {"distinct", "unique"},
+}
+
+
+# Words that make a question depend on the conversation before it ("now split it by month")
+FOLLOW_UP_WORDS = {"it", "that", "those", "them", "these", "this", "same", "instead", "again", "also", "now", "previou", "above"}
+
+
+def is_follow_up(question: str) -> bool:
+    return any(term in FOLLOW_UP_WORDS for term in tokenize(question))
+
+
+def question_shape(question: str) -> List[str]:
+    """Aggregation, grouping, ordering and limit markers of a question (see SHAPE_MARKERS)."""
+    terms = set(tokenize(question))
+    return sorted(marker for marker, words in SHAPE_MARKERS.items() if terms & words)
+
+
+def normalize_question(question: str) -> List[str]:
+    """Lowercased, lightly stemmed content words of a question."""
+    return [term for term in tokenize(question) if term not in STOPWORDS]
+
+
+def _literals_in_plan(plan: Dict[str, Any]) -> List[str]:
+    """String and number literals used by the plan's queries (SQL strings or Mongo objects)."""
+    literals = []
+
+    def walk(value, key=None):
+        # Mongo query objects: string values are literals, except collection names and $field references
+        if isinstance(value, dict):
+            for k, v in value.items():
+                walk(v, k)
+        elif isinstance(value, list):
+            for v in value:
+                walk(v, key)
+        elif isinstance(value, str) and key != "collection" and not value.startswith("$"):
+            literals.append(value)
+
+    for query_info in plan.get("queries", []):
+        query = query_info.get("query")
+        if isinstance(query, str):
+            literals.extend(re.findall(r"'((?:[^']|'')*)'", query))
+        else:
+            walk(query)
+    return [lit.lower() for lit in literals if lit.strip()]
+
+
+def _similarity(a: List[str], b: List[str]) -> float:
+    """Cosine of word counts blended with character-trigram overlap, both order-insensitive."""
+    if not a or not b:
+        return 0.0
+    ca, cb = Counter(a), Counter(b)
+    dot = sum(ca[t] * cb[t] for t in ca)
+    cosine = dot / (math.sqrt(sum(v * v for v in ca.values())) * math.sqrt(sum(v * v for v in cb.values())))
+
+    def trigrams(terms):
+        grams = set()
+        for term in terms:
+            padded = f"  {term} "
+            grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+        return grams
+
+    ta, tb = trigrams(a), trigrams(b)
+    jaccard = len(ta & tb) / len(ta | tb) if ta | tb else 0.0
+    return 0.7 * cosine + 0.3 * jaccard
+
+
+class PlanCache:
+    """
+    Per-organization store of validated query plans, looked up by question similarity.
+
+    A plan is stored once it executed successfully, together with the question,
+    intent, target databases and schema version it was generated for. A new
+    question reuses a stored plan only when all of those match exactly, the
+    numbers and the shape markers (count, total, grouping, ordering, ...) in
+    both questions are identical, every literal the plan filters on
+    appears in the new question, and the similarity of the normalized questions
+    reaches the configured threshold. Follow-up questions additionally need a
+    matching previous question.
+
+    Entries live in an in-process LRU and are mirrored to a Redis hash per
+    organization and schema version, so all workers share them. A sorted set
+    next to the hash orders its entries by store time; the hash is trimmed to
+    the newest `max_entries` and lookups only read those.
+    """
+
+    REDIS_PREFIX = "plan_cache"
+
+    def __init__(self, max_entries: int = None, ttl_seconds: int = None):
+        self.max_entries = max_entries or Config.PLAN_CACHE_MAX_ENTRIES
+        self.ttl_seconds = ttl_seconds or Config.PLAN_CACHE_TTL_SECONDS
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+
+    @staticmethod
+    def _entry_id(organization_id: str, schema_version: str, intent: str, db_ids: List[str], terms: List[str]) -> str:
+        raw = "\x1f".join([organization_id, schema_version or "", intent, ",".join(sorted(db_ids)), " ".join(sorted(terms))])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:24]
+
+
+    def lookup(self, organization_id: str, schema_version: str, intent: str, db_ids: List[str], question: str, context: str = "") -> Optional[Tuple[Dict[str, Any], float, Dict[str, Any]]]:
+        """
+        Returns (plan, confidence, entry) for the best matching stored plan, or None.
+        `context` is the previous question of the conversation; it must match too
+        when the question is a follow-up.
+        """
+        terms = normalize_question(question)
+        context_terms = normalize_question(context) if is_follow_up(question) else []
+        numbers = sorted(re.findall(r"\d+(?:\.\d+)?", question))
+        shape = question_shape(question)
+        question_text = question.lower()
+        target = sorted(db_ids)
+
+        best, best_score = None, 0.0
+        for entry in self._candidates(organization_id, schema_version):
+            if entry["intent"] != intent or entry["db_ids"] != target or entry["numbers"] != numbers:
+                continue
+            # Entries stored before shapes were recorded have none and are never reused
+            if entry.get("shape") != shape:
+                continue
+            if any(lit not in question_text for lit in entry["literals"]):
+                continue
+            if (context_terms or entry.get("context_terms")) and _similarity(context_terms, entry.get("context_terms") or []) < Config.PLAN_CACHE_SIMILARITY_THRESHOLD:
+                continue
+            score = _similarity(terms, entry["terms"])
+            if score > best_score:
+                best, best_score = entry, score
+
+        if best is None or best_score < Config.PLAN_CACHE_SIMILARITY_THRESHOLD:
+            return None
+        with self._lock:
+            if best["id"] in self._entries:
+                self._entries.move_to_end(best["id"])
+        return copy.deepcopy(best["plan"]), round(best_score, 4), best
+
+
+    def store(self, organization_id: str, schema_version: str, intent: str, db_ids: List[str], question: str, plan: Dict[str, Any], context: str = "") -> None:
+        terms = normalize_question(question)
+        if not terms:
+            return
+        entry = {
+            "organization_id": organization_id,
+            "schema_version": schema_version,
+            "intent": intent,
+            "db_ids": sorted(db_ids),
+            "question": question,
+            "terms": terms,
+            "context_terms": normalize_question(context) if is_follow_up(question) else [],
+            "numbers": sorted(re.findall(r"\d+(?:\.\d+)?", question)),
+            "shape": question_shape(question),
+            "literals": _literals_in_plan(plan),
+            "plan": plan,
+            "stored_at": time.time(),
+        }
+        entry["id"] = self._entry_id(organization_id, schema_version, intent, db_ids, terms + ["|"] + entry["context_terms"])
+        with self._lock:
+            self._entries[entry["id"]] = entry
+            self._entries.move_to_end(entry["id"])
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+        redis = get_redis()
+        if redis is not None:
+            try:
+                key = self._redis_key(organization_id, schema_version)
+                order_key = f"{key}:order"
+                pipe = redis.pipeline()
+                pipe.hset(key, entry["id"], json.dumps(entry, default=str))
+                pipe.zadd(order_key, {entry["id"]: entry["stored_at"]})
+                pipe.expire(key, self.ttl_seconds)
+                pipe.expire(order_key, self.ttl_seconds)
+                pipe.zrange(order_key, 0, -self.max_entries - 1)
+                evicted = pipe.execute()[-1]
+                if evicted:
+                    pipe = redis.pipeline()
+                    pipe.hdel(key, *evicted)
+                    pipe.zrem(order_key, *evicted)
+                    pipe.execute()
+            except Exception as e:
+                logger.warning(f"Failed to store query plan in Redis: {e}")
+
+
+    def discard(self, entry: Dict[str, Any]) -> None:
+        """Drops a stored plan, e.g. after it failed to execute."""
+        with self._lock:
+            self._entries.pop(entry["id"], None)
+        redis = get_redis()
+        if redis is not None:
+            try:
+                key = self._redis_key(entry["organization_id"], entry["schema_version"])
+                pipe = redis.pipeline()
+                pipe.hdel(key, entry["id"])
+                pipe.zrem(f"{key}:order", entry["id"])
+                pipe.execute()
+            except Exception as e:
+                logger.warning(f"Failed to discard query plan from Redis: {e}")
+
+
+    def _candidates(self, organization_id: str, schema_version: str) -> List[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            candidates = {
+                entry_id: entry for entry_id, entry in self._entries.items()
+                if entry["organization_id"] == organization_id and entry["schema_version"] == schema_version
+                and now - entry["stored_at"] < self.ttl_seconds
+            }
+
+        redis = get_redis()
+        if redis is not None:
+            try:
+                key = self._redis_key(organization_id, schema_version)
+                newest = redis.zrevrangebyscore(f"{key}:order", "+inf", now - self.ttl_seconds, start=0, num=self.max_entries)
+                missing = [entry_id.decode() if isinstance(entry_id, bytes) else entry_id for entry_id in newest]
+                missing = [entry_id for entry_id in missing if entry_id not in candidates]
+                for entry_id, raw in zip(missing, redis.hmget(key, missing) if missing else []):
+                    if raw is not None:
+                        candidates[entry_id] = json.loads(raw)
+            except Exception as e:
+                logger.warning(f"Failed to read query plans from Redis: {e}")
+        return list(candidates.values())
+
+
+    def _redis_key(self, organization_id: str, schema_version: str) -> str:
+        return f"{self.REDIS_PREFIX}:{organization_id}:{schema_version}"
+
+
+plan_cache = PlanCache()
@@ -6,8 +6,10 @@ from sqlalchemy.ext.asyncio import AsyncEngine
 from pymongo.database import Database as MongoDatabase
 from bson import ObjectId
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import ConnectionFailure
 
 from src.utils.exceptions import SecurityError, QueryExecutionError
+from src.utils.connection_pool import mongo_client_registry
 import logging
 
 logger = logging.getLogger(__name__)
@@ -138,5 +140,9 @@ class SafeQueryExecutor:
             raise QueryExecutionError(self.db_id, "Failed to decode MongoDB query JSON from LLM.")
         except QueryExecutionError: # Re-raise custom exceptions directly
             raise
+        except ConnectionFailure as e:
+            # Make the next request health check the shared client before reusing it
+            mongo_client_registry.report_failure(db.client)
+            raise QueryExecutionError(self.db_id, f"MongoDB query execution failed: {e}")
         except Exception as e:
             raise QueryExecutionError(self.db_id, f"MongoDB query execution failed: {e}")
\ No newline at end of file
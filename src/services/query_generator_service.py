@@ -1,6 +1,7 @@
 from src.prompts.plan_generation_prompt import get_multi_db_query_plan_prompt
 from src.utils.llm_configuration import LLMConfig
 from src.utils.exceptions import LLMNotConfiguredError
+from src.utils.json_stream import JSONArrayStreamParser
 
 import logging
 import json
@@ -11,7 +12,7 @@ class QueryGenerator:
     def __init__(self):
         pass
 
-    async def generate_query_plan(self, model: LLMConfig, intent: str, schemas_for_planning: dict, question: str) -> dict:
+    async def generate_query_plan(self, model: LLMConfig, intent: str, schemas_for_planning: dict, question: str, db_ids: list = None) -> dict:
         if not model:
             logger.error("LLM for query generator is not configured.")
             raise LLMNotConfiguredError("LLM for query generator is not configured.")
@@ -30,30 +31,9 @@ class QueryGenerator:
 
         # 2. Call the LLM
         try:
-            plan = model.generate_response(prompt)  
-
-            # The LLM should return a valid JSON object representing the plan
-            if not isinstance(plan, dict):
-                logger.error("LLM response is not a valid JSON object.")
-                raise ValueError("LLM response is not a valid JSON object.")
-            if 'join_on' not in plan or 'queries' not in plan:
-                logger.error("LLM response does not contain required keys: 'join_on' and 'queries'.")
-                raise ValueError("LLM response does not contain required keys: 'join_on' and 'queries'.")
-            if not isinstance(plan['join_on'], list) or not isinstance(plan['queries'], list):
-                logger.error("LLM response 'join_on' and 'queries' must be lists.")
-                raise ValueError("LLM response 'join_on' and 'queries' must be lists.")
-
-            # Validate 'join_on' entries and ensure db_id are string-convertible
-            for join_entry in plan['join_on']:
-                if not isinstance(join_entry, list):
-                    logger.error("Each 'join_on' entry must be a list.")
-                    raise ValueError("Each 'join_on' entry must be a list")
-
-            # Validate 'queries' entries and ensure db_id are string-convertible
-            for query_info in plan["queries"]:
-                if not isinstance(query_info, dict) or 'db_id' not in query_info or 'query' not in query_info:
-                    logger.error("Each 'query' entry must be a dictionary with 'db_id' and 'query'.")
-                    raise ValueError("Each 'query' entry must be a dictionary with 'db_id' and 'query'.")
+            plan = await model.agenerate_response(prompt, stage="plan")  
+
+            self.validate_plan(plan, db_ids)
             return plan
 
         except json.JSONDecodeError as e:
@@ -61,4 +41,73 @@ class QueryGenerator:
             raise RuntimeError(f"Failed to parse JSON from multi-db plan response: {e}") from e
         except Exception as e:
             logger.error(f"LLM query plan generation failed: {e}")
-            raise RuntimeError("LLM query plan generation failed.") from e
\ No newline at end of file
+            raise RuntimeError("LLM query plan generation failed.") from e
+
+
+    async def stream_query_plan(self, model: LLMConfig, intent: str, schemas_for_planning: dict, question: str, on_query, db_ids: list = None) -> dict:
+        """
+        Like `generate_query_plan`, but streams the completion and calls `on_query(query_info)`
+        for every entry of `queries` as soon as it is fully parsed, while the rest of the plan
+        is still being generated. The complete plan is validated and returned at the end.
+        """
+        if not model:
+            logger.error("LLM for query generator is not configured.")
+            raise LLMNotConfiguredError("LLM for query generator is not configured.")
+
+        try:
+            prompt = get_multi_db_query_plan_prompt(
+                schemas=schemas_for_planning,
+                user_question=question,
+                intent=intent
+            )
+        except Exception as e:
+            logger.error(f"Error building the multi-db prompt: {e}")
+            raise ValueError("Error building the multi-db prompt") from e
+
+        try:
+            parser = JSONArrayStreamParser("queries")
+            async for chunk in model.astream_response(prompt, stage="plan"):
+                for query_info in parser.feed(chunk):
+                    on_query(query_info)
+
+            plan = model.parse_json_response(parser.text)
+            self.validate_plan(plan, db_ids)
+            return plan
+
+        except json.JSONDecodeError as e:
+            logger.error(f"Failed to parse JSON from multi-db plan response: {e}")
+            raise RuntimeError(f"Failed to parse JSON from multi-db plan response: {e}") from e
+        except Exception as e:
+            logger.error(f"LLM query plan generation failed: {e}")
+            raise RuntimeError("LLM query plan generation failed.") from e
+
+    @staticmethod
+    def validate_plan(plan: dict, db_ids: list = None) -> None:
+        """Raises ValueError when `plan` is not a well-formed data assembly plan (optionally limited to `db_ids`)."""
+        # The LLM should return a valid JSON object representing the plan
+        if not isinstance(plan, dict):
+            logger.error("LLM response is not a valid JSON object.")
+            raise ValueError("LLM response is not a valid JSON object.")
+        if 'join_on' not in plan or 'queries' not in plan:
+            logger.error("LLM response does not contain required keys: 'join_on' and 'queries'.")
+            raise ValueError("LLM response does not contain required keys: 'join_on' and 'queries'.")
+        if not isinstance(plan['join_on'], list) or not isinstance(plan['queries'], list):
+            logger.error("LLM response 'join_on' and 'queries' must be lists.")
+            raise ValueError("LLM response 'join_on' and 'queries' must be lists.")
+
+        # Validate 'join_on' entries and ensure db_id are string-convertible
+        for join_entry in plan['join_on']:
+            if not isinstance(join_entry, list):
+                logger.error("Each 'join_on' entry must be a list.")
+                raise ValueError("Each 'join_on' entry must be a list")
+
+        # Validate 'queries' entries and ensure db_id are string-convertible
+        for query_info in plan["queries"]:
+            if not isinstance(query_info, dict) or 'db_id' not in query_info or 'query' not in query_info:
+                logger.error("Each 'query' entry must be a dictionary with 'db_id' and 'query'.")
+                raise ValueError("Each 'query' entry must be a dictionary with 'db_id' and 'query'.")
+        if db_ids is not None:
+            unknown = [str(query_info['db_id']) for query_info in plan['queries'] if str(query_info['db_id']) not in db_ids]
+            if unknown:
+                logger.error(f"Plan queries databases outside the selected ones: {', '.join(unknown)}")
+                raise ValueError(f"Plan queries databases outside the selected ones: {', '.join(unknown)}")
\ No newline at end of file
@@ -0,0 +1,170 @@
+import asyncio
+import json
+import logging
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+from cachetools import TTLCache
+
+from config import Config
+from src.models.db import DBConnectionParams
+from src.utils.connection_pool import credential_fingerprint
+from src.utils.redis_store import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+class SchemaCache:
+    """
+    Two-tier cache of introspected schemas, keyed per data source.
+
+    L1 is an in-process TTL cache, L2 is Redis (shared by all workers). An
+    entry is either a lightweight digest (tables, columns and foreign keys,
+    enough to classify a question) or a full representation that also carries
+    example data for the query planner. A digest never overwrites a full entry.
+
+    Every data source has a version counter in Redis. Invalidating a source
+    bumps it, so stale L1 entries in other workers are discarded on their next
+    lookup. Full entries also record a catalog fingerprint, which callers can
+    compare against a cheap live query to detect schema changes.
+    """
+
+    REDIS_PREFIX = "schema_cache"
+
+    def __init__(self, maxsize: int = None, ttl_seconds: int = None):
+        self.ttl_seconds = ttl_seconds or Config.SCHEMA_CACHE_TTL_SECONDS
+        self._entries: TTLCache = TTLCache(maxsize=maxsize or Config.SCHEMA_CACHE_MAX_ENTRIES, ttl=self.ttl_seconds)
+        self._lock = threading.Lock()
+
+
+    @staticmethod
+    def key_for(params: DBConnectionParams) -> Tuple[str, str]:
+        password = params.password.get_secret_value() if params.password else None
+        fingerprint = credential_fingerprint(params.db_type, params.host, params.port, params.username, password, params.database, params.schemas)
+        return params.id, fingerprint
+
+
+    async def get_digest(self, params: DBConnectionParams) -> Optional[Dict[str, Any]]:
+        """
+        Returns the cached schema without example data, if any entry exists.
+        Digests are not checked against the live fingerprint (that would mean
+        connecting to every granted database just to classify a question); they
+        are trusted until invalidated or expired. A stale digest can at most
+        mislead classification: the full schema of each target database is
+        re-validated before planning, and re-inspecting it refreshes the entry.
+        """
+        entry = await self._lookup(params)
+        if entry is None:
+            return None
+        digest = {"db_type": entry["db_type"], "schema": entry["schema"]}
+        for key in ("schema_lines", "fingerprint"):
+            if key in entry:
+                digest[key] = entry[key]
+        return digest
+
+
+    async def get_entry(self, params: DBConnectionParams) -> Optional[Dict[str, Any]]:
+        """Returns the cached entry as stored, whether a digest or a full representation."""
+        return await self._lookup(params)
+
+
+    async def get_full(self, params: DBConnectionParams) -> Optional[Dict[str, Any]]:
+        """Returns the cached schema only if it includes example data."""
+        entry = await self._lookup(params)
+        if entry is None or "example_data" not in entry:
+            return None
+        return entry
+
+
+    async def put(self, params: DBConnectionParams, schema_repr: Dict[str, Any]) -> None:
+        key = self.key_for(params)
+        version = await asyncio.to_thread(self._redis_version, params.id)
+        entry = {**schema_repr, "version": version}
+        with self._lock:
+            existing = self._entries.get(key)
+            if existing is not None and "example_data" in existing and "example_data" not in entry and existing.get("version") == version:
+                return
+            self._entries[key] = entry
+        await asyncio.to_thread(self._redis_set, key, entry)
+
+
+    def invalidate(self, data_source_id: str) -> int:
+        """Drops the local entries for a data source and bumps its shared version."""
+        with self._lock:
+            keys = [k for k in self._entries.keys() if k[0] == data_source_id]
+            for k in keys:
+                self._entries.pop(k, None)
+
+        redis = get_redis()
+        if redis is not None:
+            try:
+                redis.incr(self._version_key(data_source_id))
+            except Exception as e:
+                logger.warning(f"Failed to bump schema cache version in Redis: {e}")
+
+        logger.info(f"Invalidated cached schema for data source {data_source_id}")
+        return len(keys)
+
+
+    async def _lookup(self, params: DBConnectionParams) -> Optional[Dict[str, Any]]:
+        key = self.key_for(params)
+        with self._lock:
+            entry = self._entries.get(key)
+
+        version = await asyncio.to_thread(self._redis_version, params.id)
+        if entry is not None:
+            if entry.get("version") == version:
+                return entry
+            with self._lock:
+                self._entries.pop(key, None)
+
+        entry = await asyncio.to_thread(self._redis_get, key)
+        if entry is None or entry.get("version") != version:
+            return None
+        with self._lock:
+            self._entries[key] = entry
+        return entry
+
+
+    def _version_key(self, data_source_id: str) -> str:
+        return f"{self.REDIS_PREFIX}:{data_source_id}:version"
+
+
+    def _entry_key(self, key: Tuple[str, str]) -> str:
+        return f"{self.REDIS_PREFIX}:{key[0]}:{key[1]}"
+
+
+    def _redis_version(self, data_source_id: str) -> int:
+        redis = get_redis()
+        if redis is None:
+            return 0
+        try:
+            return int(redis.get(self._version_key(data_source_id)) or 0)
+        except Exception as e:
+            logger.warning(f"Failed to read schema cache version from Redis: {e}")
+            return 0
+
+
+    def _redis_get(self, key: Tuple[str, str]) -> Optional[Dict[str, Any]]:
+        redis = get_redis()
+        if redis is None:
+            return None
+        try:
+            raw = redis.get(self._entry_key(key))
+            return json.loads(raw) if raw else None
+        except Exception as e:
+            logger.warning(f"Failed to read cached schema from Redis: {e}")
+            return None
+
+
+    def _redis_set(self, key: Tuple[str, str], entry: Dict[str, Any]) -> None:
+        redis = get_redis()
+        if redis is None:
+            return
+        try:
+            redis.setex(self._entry_key(key), self.ttl_seconds, json.dumps(entry, default=str))
+        except Exception as e:
+            logger.warning(f"Failed to store schema in Redis: {e}")
+
+
+schema_cache = SchemaCache()
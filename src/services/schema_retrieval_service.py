@@ -0,0 +1,169 @@
+import hashlib
+import json
+import logging
+import math
+import re
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from cachetools import TTLCache
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+def tokenize(text: str) -> List[str]:
+    """Splits identifiers and prose into lowercase terms (snake_case, camelCase and dotted names included)."""
+    if not text:
+        return []
+    text = re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", str(text))
+    terms = []
+    for word in re.findall(r"[A-Za-z0-9]+", text.lower()):
+        # Light stemming so 'orders' matches 'order'
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        terms.append(word)
+    return terms
+
+
+def estimate_tokens(obj: Any) -> int:
+    """Rough prompt token count: about four characters per token of the text (or its JSON rendering)."""
+    text = obj if isinstance(obj, str) else json.dumps(obj, default=str)
+    return len(text) // 4
+
+
+class SchemaRetrievalIndex:
+    """
+    BM25 index over the tables (or collections) of one database.
+
+    Each table is a document made of its name, its column names, the names of
+    its foreign-key neighbours and any descriptions stored in SchemaMetadata.
+    The table name is weighted higher than the other fields.
+    """
+
+    K1 = 1.2
+    B = 0.75
+    TABLE_NAME_WEIGHT = 3
+
+    def __init__(self, schema: Dict[str, Any], descriptions: Optional[Dict[str, Any]] = None):
+        descriptions = descriptions or {}
+        self.neighbours: Dict[str, set] = {table: set() for table in schema}
+        for table, details in schema.items():
+            for fk in details.get("foreign_keys", []) if isinstance(details, dict) else []:
+                referred = fk.get("referred_table")
+                if referred in self.neighbours:
+                    self.neighbours[table].add(referred)
+                    self.neighbours[referred].add(table)
+
+        self.term_freqs: Dict[str, Counter] = {}
+        for table, details in schema.items():
+            terms = tokenize(table) * self.TABLE_NAME_WEIGHT
+            for column in self._column_names(details):
+                terms.extend(tokenize(column))
+            for neighbour in self.neighbours[table]:
+                terms.extend(tokenize(neighbour))
+
+            table_desc = descriptions.get(table) or {}
+            terms.extend(tokenize(table_desc.get("description")))
+            for column_desc in (table_desc.get("columns") or {}).values():
+                terms.extend(tokenize(column_desc))
+            self.term_freqs[table] = Counter(terms)
+
+        self.doc_lengths = {table: sum(freqs.values()) for table, freqs in self.term_freqs.items()}
+        self.avg_length = (sum(self.doc_lengths.values()) / len(self.doc_lengths)) if self.doc_lengths else 0.0
+        doc_freqs = Counter(term for freqs in self.term_freqs.values() for term in freqs)
+        n = len(self.term_freqs)
+        self.idf = {term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in doc_freqs.items()}
+
+
+    @staticmethod
+    def _column_names(details: Any) -> List[str]:
+        if not isinstance(details, dict):
+            return []
+        if "columns" in details:
+            return [col["name"] if isinstance(col, dict) else str(col) for col in details["columns"]]
+        # MongoDB collections list dotted field paths
+        return list((details.get("fields") or {}).keys())
+
+
+    def score(self, question: str) -> Dict[str, float]:
+        query_terms = set(tokenize(question))
+        scores = {}
+        for table, freqs in self.term_freqs.items():
+            length_norm = 1 - self.B + self.B * (self.doc_lengths[table] / self.avg_length if self.avg_length else 0)
+            total = 0.0
+            for term in query_terms:
+                tf = freqs.get(term)
+                if tf:
+                    total += self.idf[term] * tf * (self.K1 + 1) / (tf + self.K1 * length_norm)
+            if total > 0:
+                scores[table] = total
+        return scores
+
+
+    def select(self, question: str, top_k: int) -> List[str]:
+        """
+        Returns the top-k matching tables plus their foreign-key neighbours, in
+        schema order. Falls back to every table when nothing matches.
+        """
+        scores = self.score(question)
+        if not scores:
+            return list(self.term_freqs.keys())
+        top = sorted(scores, key=scores.get, reverse=True)[:top_k]
+        relevant = set(top)
+        for table in top:
+            relevant.update(self.neighbours[table])
+        return [table for table in self.term_freqs if table in relevant]
+
+
+class SchemaRetrievalService:
+    """
+    Builds and caches a retrieval index per database schema, and prunes schemas
+    down to the tables relevant to a question before they reach the planner.
+    Indexes are keyed by the schema's catalog fingerprint, so each one is built
+    once per schema version and reused by every later question.
+    """
+
+    def __init__(self):
+        self._indexes: TTLCache = TTLCache(maxsize=Config.SCHEMA_CACHE_MAX_ENTRIES, ttl=Config.SCHEMA_CACHE_TTL_SECONDS)
+        self._lock = threading.Lock()
+
+
+    def index_for(self, db_id: str, schema_repr: Dict[str, Any], descriptions: Optional[Dict[str, Any]] = None) -> SchemaRetrievalIndex:
+        schema = schema_repr.get("schema") or {}
+        version = schema_repr.get("fingerprint") or hashlib.sha256(json.dumps(sorted(schema.keys())).encode("utf-8")).hexdigest()
+        desc_hash = hashlib.sha256(json.dumps(descriptions or {}, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+        key = (db_id, version, desc_hash)
+        with self._lock:
+            index = self._indexes.get(key)
+        if index is None:
+            index = SchemaRetrievalIndex(schema, descriptions)
+            with self._lock:
+                self._indexes[key] = index
+        return index
+
+
+    def relevant_tables(self, db_id: str, schema_repr: Dict[str, Any], question: str, descriptions: Optional[Dict[str, Any]] = None) -> List[str]:
+        schema = schema_repr.get("schema") or {}
+        if len(schema) <= Config.SCHEMA_PRUNE_MIN_TABLES:
+            return list(schema.keys())
+        return self.index_for(db_id, schema_repr, descriptions).select(question, Config.SCHEMA_PRUNE_TOP_K)
+
+
+    def prune(self, db_id: str, schema_repr: Dict[str, Any], question: str, descriptions: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Returns a copy of `schema_repr` limited to the relevant tables and their example data."""
+        schema = schema_repr.get("schema") or {}
+        tables = set(self.relevant_tables(db_id, schema_repr, question, descriptions))
+        if len(tables) == len(schema):
+            return schema_repr
+
+        pruned = {**schema_repr, "schema": {t: d for t, d in schema.items() if t in tables}}
+        if isinstance(schema_repr.get("example_data"), dict):
+            pruned["example_data"] = {t: rows for t, rows in schema_repr["example_data"].items() if t in tables}
+        logger.info(f"Pruned schema for {db_id} to {len(tables)} of {len(schema)} tables.")
+        return pruned
+
+
+schema_retrieval = SchemaRetrievalService()
@@ -0,0 +1,70 @@
+import logging
+import threading
+from typing import Any, Dict
+
+from src.utils.redis_store import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+class SpeculationTracker:
+    """
+    Outcome counters of speculative plan generation.
+
+    For users with a single granted database the planner starts while the
+    classifier is still running. An outcome is a 'hit' when the classifier
+    agreed and the speculative plan was used, a 'miss' when it disagreed and
+    the speculation was cancelled or discarded, and 'failed' when the
+    speculation itself raised. Tokens spent on discarded speculations are
+    counted as wasted. Counters are kept per worker and mirrored to Redis.
+    """
+
+    REDIS_KEY = "speculative_planning:stats"
+    COUNTERS = ("launched", "hits", "misses", "failed", "cancelled_in_flight", "wasted_input_tokens", "wasted_output_tokens")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {name: 0 for name in self.COUNTERS}
+
+
+    def record(self, outcome: str, wasted_usage: Dict[str, Dict[str, int]] = None, cancelled_in_flight: bool = False) -> None:
+        """`outcome` is 'hits', 'misses' or 'failed'; `wasted_usage` is the forked LLM's per-stage usage."""
+        increments = {"launched": 1, outcome: 1, "cancelled_in_flight": int(cancelled_in_flight)}
+        for totals in (wasted_usage or {}).values():
+            increments["wasted_input_tokens"] = increments.get("wasted_input_tokens", 0) + totals.get("input_tokens", 0)
+            increments["wasted_output_tokens"] = increments.get("wasted_output_tokens", 0) + totals.get("output_tokens", 0)
+
+        with self._lock:
+            for name, value in increments.items():
+                self._counters[name] += value
+
+        redis = get_redis()
+        if redis is not None:
+            try:
+                pipe = redis.pipeline()
+                for name, value in increments.items():
+                    if value:
+                        pipe.hincrby(self.REDIS_KEY, name, value)
+                pipe.execute()
+            except Exception as e:
+                logger.warning(f"Failed to update speculation stats in Redis: {e}")
+
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            worker = dict(self._counters)
+        worker["hit_rate"] = round(worker["hits"] / worker["launched"], 4) if worker["launched"] else None
+
+        shared = None
+        redis = get_redis()
+        if redis is not None:
+            try:
+                shared = {(k.decode() if isinstance(k, bytes) else k): int(v) for k, v in redis.hgetall(self.REDIS_KEY).items()}
+                launched = shared.get("launched", 0)
+                shared["hit_rate"] = round(shared.get("hits", 0) / launched, 4) if launched else None
+            except Exception as e:
+                logger.warning(f"Failed to read speculation stats from Redis: {e}")
+        return {"worker": worker, "shared": shared}
+
+
+speculation_tracker = SpeculationTracker()
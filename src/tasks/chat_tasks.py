@@ -0,0 +1,98 @@
+import asyncio
+import logging
+import time
+
+from celery import shared_task
+
+from config import Config
+from src.extensions import db
+from src.models.chat import ChatSession
+from src.models.user import User
+from src.services.chat_service import ChatService
+from src.services.chat_job_service import chat_jobs
+from src.controllers.ai_controller import AICompute
+from src.utils.async_runner import run_coroutine_sync
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(bind=True, name="chat.answer_question", max_retries=None)
+def answer_question(self, job_id: str, session_id: str, user_id: str, organization_id: str, user_query: str, bypass_cache: bool = False, skip_unreachable_sources: bool = None):
+    """
+    Answers one chat question in the background and saves the exchange like
+    post_message does. Credentials never pass through the broker: the inputs
+    are rebuilt here from the session and user ids.
+    """
+    # Per-organization fairness: over the cap, the job goes back to the end of the queue.
+    # Without Redis to count slots the question runs anyway rather than staying queued forever.
+    slot_claimed = False
+    if not self.request.is_eager:
+        try:
+            slot_claimed = chat_jobs.acquire_slot(organization_id)
+            over_cap = not slot_claimed
+        except Exception as e:
+            logger.warning(f"Could not claim a running slot for chat job {job_id}, running without the fairness cap: {e}")
+            over_cap = False
+        if over_cap:
+            chat_jobs.update(job_id, detail="Waiting for a running question of the organization to finish")
+            raise self.retry(countdown=Config.CHAT_JOB_RETRY_DELAY_SECONDS)
+
+    start_time = time.time()
+    try:
+        chat_jobs.update(job_id, status="running", detail=None, started_at=start_time)
+        session = ChatSession.query.filter_by(id=session_id, user_id=user_id).first()
+        user = db.session.get(User, user_id)
+        if session is None or user is None:
+            raise ValueError("Chat session or user no longer exists")
+
+        ai_inputs = ChatService.build_ai_inputs(session, user, user_query, bypass_cache=bypass_cache, skip_unreachable_sources=skip_unreachable_sources)
+        if ai_inputs is None:
+            raise PermissionError("You do not have access to any databases to query.")
+
+        ai_response_content, ai_metadata = run_coroutine_sync(
+            _process_with_progress(job_id, ai_inputs),
+            timeout=Config.CHAT_JOB_TIMEOUT_SECONDS
+        )
+        ai_message = ChatService.save_exchange(
+            session_id=session_id,
+            user_id=user_id,
+            organization_id=organization_id,
+            user_query=user_query,
+            ai_content=ai_response_content,
+            ai_metadata=ai_metadata
+        )
+        chat_jobs.update(job_id, status="succeeded", result=ai_message.to_dict(), finished_at=time.time())
+        logger.info(f"Chat job {job_id} finished in {(time.time() - start_time) * 1000:.2f} ms")
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Chat job {job_id} failed: {e}")
+        chat_jobs.update(job_id, status="failed", error=str(e), finished_at=time.time())
+    finally:
+        if slot_claimed:
+            chat_jobs.release_slot(organization_id)
+
+
+async def _process_with_progress(job_id: str, ai_inputs: dict):
+    """
+    Runs the orchestrator while recording its progress events on the job.
+    The callback is invoked on the event loop, so the Redis writes go to a
+    thread, each one after the previous so the events keep their order.
+    """
+    last_write = None
+
+    async def write(previous, event, data):
+        if previous is not None:
+            await asyncio.wait([previous])
+        await asyncio.to_thread(chat_jobs.add_progress, job_id, event, data)
+
+    def progress(event, data):
+        nonlocal last_write
+        if event in chat_jobs.PROGRESS_EVENTS:
+            last_write = asyncio.ensure_future(write(last_write, event, data))
+
+    try:
+        return await AICompute.process_query(**ai_inputs, progress=progress)
+    finally:
+        # Polling clients should see every event before the final status
+        if last_write is not None:
+            await asyncio.gather(last_write, return_exceptions=True)
@@ -0,0 +1,113 @@
+import asyncio
+import atexit
+import concurrent.futures
+import logging
+import os
+import threading
+from typing import Any, Awaitable, Optional
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundEventLoop:
+    """
+    A long-lived asyncio event loop running in a dedicated daemon thread.
+
+    Sync Flask views submit orchestrator coroutines to it instead of calling
+    `asyncio.run` per request, so async engines, Motor clients and LLM HTTP
+    sessions created while answering one question stay bound to a live loop
+    and can be reused by the next one.
+    """
+
+    def __init__(self, name: str = "askit-event-loop"):
+        self.name = name
+        self.pid = os.getpid()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._started = threading.Event()
+
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        return self._loop
+
+
+    def start(self) -> "BackgroundEventLoop":
+        if self._thread and self._thread.is_alive():
+            return self
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run_forever, name=self.name, daemon=True)
+        self._thread.start()
+        self._started.wait()
+        logger.info(f"Background event loop '{self.name}' started in process {self.pid}")
+        return self
+
+
+    def _run_forever(self) -> None:
+        asyncio.set_event_loop(self._loop)
+        self._loop.call_soon(self._started.set)
+        try:
+            self._loop.run_forever()
+        finally:
+            self._loop.close()
+
+
+    def submit(self, coro: Awaitable[Any]) -> concurrent.futures.Future:
+        """Schedules a coroutine on the loop and returns a thread-safe future."""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+
+    def run(self, coro: Awaitable[Any], timeout: Optional[float] = None) -> Any:
+        """Runs a coroutine on the loop and blocks the calling thread until it finishes."""
+        future = self.submit(coro)
+        try:
+            return future.result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise TimeoutError(f"Background task did not finish within {timeout} seconds.")
+
+
+    def stop(self, timeout: float = 5.0) -> None:
+        if not self._loop or not self._loop.is_running():
+            return
+        try:
+            self.run(_close_shared_pools(), timeout=timeout)
+        except Exception as e:
+            logger.warning(f"Failed to close shared pools on shutdown: {e}")
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=timeout)
+
+
+async def _close_shared_pools() -> None:
+    """Releases pooled database connections and LLM clients owned by the running loop."""
+    from src.utils.connection_pool import engine_registry, mongo_client_registry
+    from src.utils.llm_clients import llm_client_registry
+    await engine_registry.adispose_all()
+    mongo_client_registry.close_all()
+    await llm_client_registry.aclose_all()
+
+
+_background_loop: Optional[BackgroundEventLoop] = None
+_background_loop_lock = threading.Lock()
+
+
+def get_background_loop() -> BackgroundEventLoop:
+    """
+    Returns this worker's background loop, starting it on first use. A forked
+    worker never inherits its parent's loop thread, so it starts its own.
+    """
+    global _background_loop
+    with _background_loop_lock:
+        if _background_loop is None or _background_loop.pid != os.getpid():
+            _background_loop = BackgroundEventLoop().start()
+            atexit.register(_background_loop.stop)
+        return _background_loop
+
+
+def run_coroutine_sync(coro: Awaitable[Any], timeout: Optional[float] = None) -> Any:
+    """Sync bridge: runs `coro` on the worker's background loop and returns its result."""
+    if timeout is None:
+        timeout = Config.ORCHESTRATOR_TIMEOUT_SECONDS
+    return get_background_loop().run(coro, timeout=timeout)
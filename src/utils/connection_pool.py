@@ -0,0 +1,308 @@
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+def credential_fingerprint(*parts: Any) -> str:
+    """
+    Returns a short, non-reversible fingerprint of connection credentials.
+    Used to key pooled connections so that a credential change never reuses
+    a pool authenticated with the old secret.
+    """
+    raw = "\x1f".join("" if p is None else str(p) for p in parts)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def _current_loop() -> Optional[asyncio.AbstractEventLoop]:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+@dataclass
+class _EngineEntry:
+    engine: AsyncEngine
+    loop: asyncio.AbstractEventLoop
+    last_used: float
+
+
+class EngineRegistry:
+    """
+    Process-wide registry of SQLAlchemy async engines for customer data sources.
+
+    Engines are keyed by data source id plus a credential fingerprint, so the
+    second question against the same database reuses the warm connection pool
+    instead of paying a fresh TCP/TLS/auth handshake. The registry is capped
+    (least recently used engines are disposed first) and engines that sat idle
+    longer than the configured TTL are disposed on the next access.
+
+    Async engines are bound to the event loop that created them; an entry
+    created on a different (or closed) loop is discarded and rebuilt.
+    """
+
+    def __init__(
+        self,
+        max_engines: int = None,
+        idle_ttl_seconds: int = None,
+        pool_size: int = None,
+        max_overflow: int = None,
+        pool_recycle_seconds: int = None,
+    ):
+        self.max_engines = max_engines or Config.DB_ENGINE_MAX_PER_WORKER
+        self.idle_ttl_seconds = idle_ttl_seconds or Config.DB_ENGINE_IDLE_TTL_SECONDS
+        self.pool_size = pool_size or Config.DB_POOL_SIZE
+        self.max_overflow = max_overflow if max_overflow is not None else Config.DB_MAX_OVERFLOW
+        self.pool_recycle_seconds = pool_recycle_seconds or Config.DB_POOL_RECYCLE_SECONDS
+
+        self._engines: "OrderedDict[Tuple[str, str], _EngineEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._pending_disposals = set()
+
+
+    def get_engine(self, data_source_id: str, connection_string: str) -> Tuple[AsyncEngine, bool]:
+        """
+        Returns a pooled engine for the data source and whether it was newly created.
+        Must be called from within a running event loop.
+        """
+        key = (data_source_id, credential_fingerprint(connection_string))
+        loop = asyncio.get_running_loop()
+        now = time.monotonic()
+        stale: List[_EngineEntry] = []
+        created = False
+
+        with self._lock:
+            stale.extend(self._pop_idle(now))
+
+            entry = self._engines.get(key)
+            if entry is not None and (entry.loop is not loop or entry.loop.is_closed()):
+                stale.append(self._engines.pop(key))
+                entry = None
+
+            if entry is None:
+                engine = create_async_engine(
+                    connection_string,
+                    echo=False,
+                    pool_size=self.pool_size,
+                    max_overflow=self.max_overflow,
+                    pool_recycle=self.pool_recycle_seconds,
+                    pool_pre_ping=True,
+                )
+                entry = _EngineEntry(engine=engine, loop=loop, last_used=now)
+                self._engines[key] = entry
+                created = True
+
+                while len(self._engines) > self.max_engines:
+                    evicted_key, evicted = self._engines.popitem(last=False)
+                    logger.info(f"Engine registry full, evicting least recently used engine for {evicted_key[0]}")
+                    stale.append(evicted)
+            else:
+                self._engines.move_to_end(key)
+                entry.last_used = now
+
+        for old in stale:
+            self._dispose(old)
+
+        return entry.engine, created
+
+
+    def invalidate(self, data_source_id: str) -> int:
+        """Disposes every engine held for a data source. Returns the number disposed."""
+        with self._lock:
+            keys = [k for k in self._engines if k[0] == data_source_id]
+            entries = [self._engines.pop(k) for k in keys]
+
+        for entry in entries:
+            self._dispose(entry)
+        if entries:
+            logger.info(f"Disposed {len(entries)} pooled engine(s) for data source {data_source_id}")
+        return len(entries)
+
+
+    def dispose_all(self) -> None:
+        """Disposes every engine in the registry (used on worker shutdown)."""
+        with self._lock:
+            entries = list(self._engines.values())
+            self._engines.clear()
+        for entry in entries:
+            self._dispose(entry)
+
+
+    async def adispose_all(self) -> None:
+        """Disposes every engine, awaiting those owned by the running loop."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            entries = list(self._engines.values())
+            self._engines.clear()
+        for entry in entries:
+            if entry.loop is loop:
+                try:
+                    await entry.engine.dispose()
+                except Exception as e:
+                    logger.warning(f"Failed to dispose pooled engine: {e}")
+            else:
+                self._dispose(entry)
+
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "engines": len(self._engines),
+                "max_engines": self.max_engines,
+                "idle_ttl_seconds": self.idle_ttl_seconds,
+            }
+
+
+    def _pop_idle(self, now: float) -> List[_EngineEntry]:
+        """Removes engines idle longer than the TTL. Caller must hold the lock."""
+        idle_keys = [k for k, e in self._engines.items() if now - e.last_used > self.idle_ttl_seconds]
+        return [self._engines.pop(k) for k in idle_keys]
+
+
+    def _dispose(self, entry: _EngineEntry) -> None:
+        """
+        Disposes an engine on the loop that owns it. If that loop is gone the
+        pool is simply dereferenced, as its connections cannot be closed cleanly.
+        """
+        try:
+            if entry.loop.is_closed() or not entry.loop.is_running():
+                entry.engine.sync_engine.dispose(close=False)
+            elif entry.loop is _current_loop():
+                task = entry.loop.create_task(entry.engine.dispose())
+                self._pending_disposals.add(task)
+                task.add_done_callback(self._pending_disposals.discard)
+            else:
+                asyncio.run_coroutine_threadsafe(entry.engine.dispose(), entry.loop)
+        except Exception as e:
+            logger.warning(f"Failed to dispose pooled engine: {e}")
+
+
+@dataclass
+class _MongoClientEntry:
+    client: AsyncIOMotorClient
+    loop: asyncio.AbstractEventLoop
+    last_used: float
+    healthy: bool = False
+
+
+class MotorClientRegistry:
+    """
+    Process-wide cache of Motor clients, one per cluster URI.
+
+    A Motor client already runs its own background topology monitoring, so
+    sharing one per cluster means the SRV lookup, topology discovery and
+    connection pool are paid once per worker instead of once per question.
+    The `ping` health check only runs for a freshly created client or after a
+    caller reported a failure on it. The number of clients is bounded, with
+    the least recently used client closed first.
+    """
+
+    def __init__(self, max_clients: int = None, idle_ttl_seconds: int = None):
+        self.max_clients = max_clients or Config.MONGO_MAX_CLIENTS_PER_WORKER
+        self.idle_ttl_seconds = idle_ttl_seconds or Config.DB_ENGINE_IDLE_TTL_SECONDS
+
+        self._clients: "OrderedDict[str, _MongoClientEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+
+    def get_client(self, mongo_uri: str) -> Tuple[AsyncIOMotorClient, bool]:
+        """
+        Returns the cached client for a cluster URI and whether it needs a
+        health check before use (new client, or one that previously failed).
+        """
+        key = credential_fingerprint(mongo_uri)
+        loop = asyncio.get_running_loop()
+        now = time.monotonic()
+        stale: List[_MongoClientEntry] = []
+
+        with self._lock:
+            idle_keys = [k for k, e in self._clients.items() if now - e.last_used > self.idle_ttl_seconds]
+            stale.extend(self._clients.pop(k) for k in idle_keys)
+
+            entry = self._clients.get(key)
+            if entry is not None and (entry.loop is not loop or entry.loop.is_closed()):
+                stale.append(self._clients.pop(key))
+                entry = None
+
+            if entry is None:
+                client = AsyncIOMotorClient(
+                    mongo_uri,
+                    maxPoolSize=Config.MONGO_MAX_POOL_SIZE,
+                    maxIdleTimeMS=Config.DB_ENGINE_IDLE_TTL_SECONDS * 1000,
+                    serverSelectionTimeoutMS=Config.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+                    heartbeatFrequencyMS=Config.MONGO_HEARTBEAT_FREQUENCY_MS,
+                )
+                entry = _MongoClientEntry(client=client, loop=loop, last_used=now)
+                self._clients[key] = entry
+
+                while len(self._clients) > self.max_clients:
+                    _, evicted = self._clients.popitem(last=False)
+                    logger.info("Motor client registry full, closing least recently used client")
+                    stale.append(evicted)
+            else:
+                self._clients.move_to_end(key)
+                entry.last_used = now
+
+            needs_ping = not entry.healthy
+
+        for old in stale:
+            self._close(old)
+
+        return entry.client, needs_ping
+
+
+    def mark_healthy(self, client: AsyncIOMotorClient) -> None:
+        with self._lock:
+            for entry in self._clients.values():
+                if entry.client is client:
+                    entry.healthy = True
+                    return
+
+
+    def report_failure(self, client: AsyncIOMotorClient) -> None:
+        """Flags a client so the next caller re-runs the health check before using it."""
+        with self._lock:
+            for entry in self._clients.values():
+                if entry.client is client:
+                    entry.healthy = False
+                    return
+
+
+    def close_all(self) -> None:
+        with self._lock:
+            entries = list(self._clients.values())
+            self._clients.clear()
+        for entry in entries:
+            self._close(entry)
+
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "clients": len(self._clients),
+                "max_clients": self.max_clients,
+                "unhealthy": sum(1 for e in self._clients.values() if not e.healthy),
+            }
+
+
+    def _close(self, entry: _MongoClientEntry) -> None:
+        try:
+            entry.client.close()
+        except Exception as e:
+            logger.warning(f"Failed to close Motor client: {e}")
+
+
+engine_registry = EngineRegistry()
+mongo_client_registry = MotorClientRegistry()
@@ -1,12 +1,12 @@
 import logging
 from typing import Dict, Any, Union
 
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
-from motor.motor_asyncio import AsyncIOMotorClient
+from sqlalchemy.ext.asyncio import AsyncEngine
 from pymongo.database import Database as MongoDatabase
 
 from src.models.db import DBConnectionParams
 from src.utils.exceptions import ConnectionError
+from src.utils.connection_pool import engine_registry, mongo_client_registry
 
 logger = logging.getLogger(__name__)
 
@@ -15,11 +15,12 @@ async def get_db_connection(
     params: DBConnectionParams
 ) -> Union[AsyncEngine, MongoDatabase]:
     """
-    Creates and caches a database connection object for a given session.
+    Returns a database connection object for the given data source.
     
     This function acts as a factory, returning the correct type of connection
     object (a SQLAlchemy AsyncEngine or a PyMongo Database) based on the
-    provided parameters.
+    provided parameters. SQL engines are served from the process-wide
+    engine registry, so repeated questions reuse the same connection pool.
     """
     try:
         connection_object: Union[AsyncEngine, MongoDatabase]
@@ -45,7 +46,19 @@ async def get_db_connection(
                 f"{params.host}:{port}/{params.database}"
             )
 
-            engine = create_async_engine(connection_string, echo=False)
+            engine, created = engine_registry.get_engine(params.id, connection_string)
+            if created:
+                logger.info(f"Created pooled engine for data source {params.id}")
+                try:
+                    # Engines connect lazily; open the first pooled connection now so
+                    # unreachable sources surface here, within the connect timeout.
+                    async with engine.connect():
+                        pass
+                except BaseException:
+                    # Also on cancellation (a per-source timeout): a kept engine would
+                    # skip this probe next time and the source would count as reachable
+                    engine_registry.invalidate(params.id)
+                    raise
             connection_object = engine
 
         # --- MONGODB LOGIC ---
@@ -57,22 +70,25 @@ async def get_db_connection(
                 f"mongodb+srv://{params.username}:{password}@"
                 f"{params.host}/?retryWrites=true&w=majority"
             )
-            client = AsyncIOMotorClient(mongo_uri)
-            try:
-                # Attempt to access the database to ensure the connection is valid.
-                await client.admin.command('ping')  # This will raise an error if the connection fails.
-            except Exception as e:
-                logger.error(f"MongoDB connection failed: {e}")
-                raise ConnectionError(f"MongoDB connection failed: {e}")
+            client, needs_ping = mongo_client_registry.get_client(mongo_uri)
+            if needs_ping:
+                try:
+                    # Only new clients, or ones that previously failed, are health checked.
+                    await client.admin.command('ping')  # This will raise an error if the connection fails.
+                except Exception as e:
+                    mongo_client_registry.report_failure(client)
+                    logger.error(f"MongoDB connection failed: {e}")
+                    raise ConnectionError(params.id, f"MongoDB connection failed: {e}")
+                mongo_client_registry.mark_healthy(client)
 
             db = client[params.database]
             connection_object = db
         
         else:
-            raise ConnectionError(f"Unsupported database type: {params.db_type}")
+            raise ConnectionError(params.id, f"Unsupported database type: {params.db_type}")
 
         return connection_object
 
     except Exception as e:
         logger.error(f"Failed to create database connection: {e}")
-        raise ConnectionError(f"Database connection failed: {e}")
\ No newline at end of file
+        raise ConnectionError(params.id, f"Database connection failed: {e}")
\ No newline at end of file
@@ -62,6 +62,14 @@ class LLMNotConfiguredError(Error):
         super().__init__(message)
         self.context = context
 
+class LLMRateLimitedError(Error):
+    """Raised when an LLM call cannot be admitted, or stays throttled by the provider, within its deadline."""
+    def __init__(self, provider: str, model: str, reason: str):
+        super().__init__(f"LLM provider '{provider}/{model}' is rate limited: {reason}")
+        self.provider = provider
+        self.model = model
+        self.reason = reason
+
 class SecurityError(Error):
     """Raised when a security or authentication/authorization or Dangerous Query error occurs."""
     def __init__(self, reason: str):
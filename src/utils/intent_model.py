@@ -0,0 +1,100 @@
+import json
+import math
+import os
+import re
+from collections import Counter
+from typing import Dict, Iterable, List
+
+
+RESOURCES_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "resources")
+SEED_EXAMPLES_PATH = os.path.join(RESOURCES_DIR, "intent_seed_examples.json")
+MODEL_PATH = os.path.join(RESOURCES_DIR, "intent_model.json")
+
+
+def features(text: str) -> List[str]:
+    """Lowercased words plus word bigrams."""
+    words = re.findall(r"[a-z0-9']+", text.lower())
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def train(examples: Iterable[Dict[str, str]], alpha: float = 1.0) -> Dict:
+    """Trains a multinomial naive Bayes model from {'text', 'intent'} examples."""
+    class_counts = Counter()
+    term_counts: Dict[str, Counter] = {}
+    for example in examples:
+        intent = example["intent"]
+        class_counts[intent] += 1
+        term_counts.setdefault(intent, Counter()).update(features(example["text"]))
+
+    vocabulary = set(term for counts in term_counts.values() for term in counts)
+    total = sum(class_counts.values())
+    model = {"classes": sorted(class_counts), "priors": {}, "log_likelihoods": {}, "unknown": {}}
+    for intent in model["classes"]:
+        counts = term_counts[intent]
+        denominator = sum(counts.values()) + alpha * (len(vocabulary) + 1)
+        model["priors"][intent] = math.log(class_counts[intent] / total)
+        model["log_likelihoods"][intent] = {term: math.log((counts[term] + alpha) / denominator) for term in counts}
+        model["unknown"][intent] = math.log(alpha / denominator)
+    model["vocabulary"] = sorted(vocabulary)
+    return model
+
+
+class NaiveBayesIntentModel:
+    """Tiny intent model used by the local pre-classifier; trained offline from seed examples."""
+
+    def __init__(self, model: Dict):
+        self.classes = model["classes"]
+        self.priors = model["priors"]
+        self.log_likelihoods = model["log_likelihoods"]
+        self.unknown = model["unknown"]
+        self.vocabulary = set(model["vocabulary"])
+
+
+    @classmethod
+    def load(cls, path: str = MODEL_PATH) -> "NaiveBayesIntentModel":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+
+    def predict_proba(self, text: str) -> Dict[str, float]:
+        # Terms never seen in training carry no signal and are ignored
+        terms = [term for term in features(text) if term in self.vocabulary]
+        scores = {
+            intent: self.priors[intent] + sum(self.log_likelihoods[intent].get(term, self.unknown[intent]) for term in terms)
+            for intent in self.classes
+        }
+        top = max(scores.values())
+        exp = {intent: math.exp(score - top) for intent, score in scores.items()}
+        total = sum(exp.values())
+        return {intent: value / total for intent, value in exp.items()}
+
+
+def evaluate_holdout(examples: List[Dict[str, str]], thresholds: Iterable[float]) -> List[Dict[str, float]]:
+    """
+    Leave-one-out evaluation: each example is scored by a model trained on the
+    others. For every threshold, reports how many held-out examples would be
+    answered locally (coverage) and how many of those were right (precision).
+    """
+    held_out = []
+    for i, example in enumerate(examples):
+        scores = NaiveBayesIntentModel(train(examples[:i] + examples[i + 1:])).predict_proba(example["text"])
+        intent = max(scores, key=scores.get)
+        held_out.append((scores[intent], intent == example["intent"]))
+
+    report = []
+    for threshold in thresholds:
+        confident = [correct for confidence, correct in held_out if confidence >= threshold]
+        report.append({
+            "threshold": threshold,
+            "coverage": len(confident) / len(held_out) if held_out else 0.0,
+            "precision": sum(confident) / len(confident) if confident else None,
+        })
+    return report
+
+
+def train_from_seed(seed_path: str = SEED_EXAMPLES_PATH, model_path: str = MODEL_PATH) -> Dict:
+    with open(seed_path, "r", encoding="utf-8") as f:
+        model = train(json.load(f))
+    with open(model_path, "w", encoding="utf-8") as f:
+        json.dump(model, f, indent=1, sort_keys=True)
+    return model
@@ -0,0 +1,202 @@
+import json
+import logging
+from typing import Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class JSONArrayStreamParser:
+    """
+    Incremental scanner for streamed JSON text.
+
+    Text is fed chunk by chunk as the LLM emits it. Every element of the array
+    stored under `key` in the top-level object (e.g. the planner's `queries`)
+    is returned by `feed` as soon as its closing bracket arrives, so it can be
+    acted on while later elements and keys are still being generated.
+    Anything before the first '{' (such as a ```json fence) is ignored, and the
+    complete text stays available in `text` for the final, strict parse.
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+        self.text = ""
+        self._pos = 0
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_key: Optional[str] = None
+        self._expect_array = False
+        self._array_depth: Optional[int] = None
+        self._item_start: Optional[int] = None
+
+
+    def feed(self, chunk: str) -> List[Any]:
+        """Consumes `chunk` and returns the array elements completed by it."""
+        self.text += chunk
+        text = self.text
+        items = []
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._last_key = text[self._string_start + 1:i]
+                continue
+
+            if not self._started:
+                if ch == "{":
+                    self._started = True
+                    self._depth = 1
+                continue
+
+            # Only '[' may follow `"key":`; anything else means the value is not an array
+            if self._expect_array and not ch.isspace() and ch != "[":
+                self._expect_array = False
+
+            if ch == '"':
+                self._in_string = True
+                self._string_start = i
+            elif ch == ":":
+                self._expect_array = self._depth == 1 and self._array_depth is None and self._last_key == self.key
+            elif ch == ",":
+                if self._depth == 1:
+                    self._last_key = None
+            elif ch in "{[":
+                self._depth += 1
+                if self._expect_array:
+                    self._array_depth = self._depth
+                    self._expect_array = False
+                elif self._array_depth is not None and self._depth == self._array_depth + 1:
+                    self._item_start = i
+            elif ch in "}]":
+                if self._item_start is not None and self._depth == self._array_depth + 1:
+                    try:
+                        items.append(json.loads(text[self._item_start:i + 1]))
+                    except ValueError as e:
+                        logger.warning(f"Skipping unparsable streamed '{self.key}' element: {e}")
+                    self._item_start = None
+                self._depth -= 1
+                if self._array_depth is not None and self._depth < self._array_depth:
+                    self._array_depth = None
+        self._pos = len(text)
+        return items
+
+
+class JSONStringStreamParser:
+    """
+    Incremental extractor for one top-level string field of streamed JSON,
+    e.g. the `analysis` text of a summary. `feed` returns the newly decoded
+    characters of that string, so they can be forwarded token by token.
+    """
+
+    ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+    def __init__(self, key: str):
+        self.key = key
+        self.text = ""
+        self._pos = 0
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_key: Optional[str] = None
+        self._expect_value = False
+        self._capturing = False
+        self._done = False
+        # High half of a \uD83D\uDE00-style surrogate pair, held until the low half arrives
+        self._high_surrogate: Optional[int] = None
+
+
+    def feed(self, chunk: str) -> str:
+        self.text += chunk
+        text = self.text
+        out = []
+        i = self._pos
+        while i < len(text) and not self._done:
+            ch = text[i]
+            if self._capturing:
+                if self._escape:
+                    if ch == "u":
+                        if i + 5 > len(text):
+                            # Wait for the rest of the \uXXXX sequence
+                            break
+                        try:
+                            self._append_code_point(out, int(text[i + 1:i + 5], 16))
+                        except ValueError:
+                            pass
+                        i += 4
+                    else:
+                        self._flush_surrogate(out)
+                        out.append(self.ESCAPES.get(ch, ch))
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._flush_surrogate(out)
+                    self._capturing = False
+                    self._done = True
+                else:
+                    self._flush_surrogate(out)
+                    out.append(ch)
+            elif self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._last_key = text[self._string_start + 1:i]
+            elif not self._started:
+                if ch == "{":
+                    self._started = True
+                    self._depth = 1
+            elif self._expect_value and not ch.isspace():
+                self._expect_value = False
+                if ch == '"':
+                    self._capturing = True
+                else:
+                    continue
+            elif ch == '"':
+                self._in_string = True
+                self._string_start = i
+            elif ch == ":":
+                self._expect_value = self._depth == 1 and self._last_key == self.key
+            elif ch == ",":
+                if self._depth == 1:
+                    self._last_key = None
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+            i += 1
+        self._pos = i
+        return "".join(out)
+
+
+    def _append_code_point(self, out: List[str], code: int) -> None:
+        if 0xD800 <= code <= 0xDBFF:
+            self._flush_surrogate(out)
+            self._high_surrogate = code
+        elif 0xDC00 <= code <= 0xDFFF and self._high_surrogate is not None:
+            out.append(chr(0x10000 + ((self._high_surrogate - 0xD800) << 10) + (code - 0xDC00)))
+            self._high_surrogate = None
+        else:
+            self._flush_surrogate(out)
+            # A lone low surrogate cannot be encoded; replace it like a lone high one
+            out.append("\ufffd" if 0xDC00 <= code <= 0xDFFF else chr(code))
+
+
+    def _flush_surrogate(self, out: List[str]) -> None:
+        """Emits a high surrogate that was not followed by its low half."""
+        if self._high_surrogate is not None:
+            out.append("\ufffd")
+            self._high_surrogate = None
@@ -0,0 +1,171 @@
+import asyncio
+import logging
+import os
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+import google.generativeai as genai
+from google.generativeai import client as genai_client
+import httpx
+from anthropic import Anthropic, AsyncAnthropic
+from openai import OpenAI, AsyncOpenAI
+
+from config import Config
+from src.utils.connection_pool import credential_fingerprint
+
+logger = logging.getLogger(__name__)
+
+
+def _current_loop() -> Optional[asyncio.AbstractEventLoop]:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+class LLMClientRegistry:
+    """
+    Per-worker pool of LLM provider clients.
+
+    Clients are created once per provider and API key and shared by every
+    request, so the keep-alive HTTP/2 connections of their underlying httpx
+    pools survive from one question to the next. Conversation state lives in
+    `LLMConfig`, never in the shared clients.
+
+    Async clients are bound to the event loop that created them and are kept
+    per loop. This includes Gemini: genai's default async client is a single
+    process-wide grpc.aio channel tied to the first loop that used it, so every
+    Gemini model handle gets its own async transport and is kept per loop too.
+    The registry resets itself in a forked worker.
+    """
+
+    def __init__(self):
+        self._pid = os.getpid()
+        self._sync_clients: Dict[Tuple[str, str], Any] = {}
+        self._async_clients: Dict[Tuple[str, str, int], Tuple[Any, asyncio.AbstractEventLoop]] = {}
+        self._gemini_key: Optional[str] = None
+        self._gemini_models: Dict[Tuple[str, Optional[str], int], Tuple[Any, Optional[asyncio.AbstractEventLoop]]] = {}
+        self._lock = threading.Lock()
+
+
+    def _check_pid(self) -> None:
+        # Connections inherited across fork are shared with the parent; never reuse them
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._sync_clients.clear()
+            self._async_clients.clear()
+            self._gemini_key = None
+            self._gemini_models.clear()
+
+
+    @staticmethod
+    def _limits() -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=Config.LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=Config.LLM_MAX_CONNECTIONS,
+            keepalive_expiry=Config.LLM_KEEPALIVE_EXPIRY_SECONDS,
+        )
+
+
+    def get_sync_client(self, provider: str, api_key: str):
+        key = (provider, credential_fingerprint(api_key))
+        with self._lock:
+            self._check_pid()
+            client = self._sync_clients.get(key)
+            if client is None:
+                http_client = httpx.Client(http2=Config.LLM_HTTP2, limits=self._limits(), timeout=Config.LLM_REQUEST_TIMEOUT_SECONDS)
+                client_cls = Anthropic if provider == 'claude' else OpenAI
+                client = client_cls(api_key=api_key, http_client=http_client)
+                self._sync_clients[key] = client
+                logger.info(f"Created shared {provider} client")
+            return client
+
+
+    def get_async_client(self, provider: str, api_key: str):
+        """Returns the shared async client for the running event loop."""
+        loop = _current_loop()
+        key = (provider, credential_fingerprint(api_key), id(loop))
+        with self._lock:
+            self._check_pid()
+            entry = self._async_clients.get(key)
+            if entry is not None and entry[1] is loop and not (loop and loop.is_closed()):
+                return entry[0]
+            # Entries of loops that have since closed can never be used again
+            for stale in [k for k, (_, client_loop) in self._async_clients.items() if client_loop and client_loop.is_closed()]:
+                self._async_clients.pop(stale, None)
+            http_client = httpx.AsyncClient(http2=Config.LLM_HTTP2, limits=self._limits(), timeout=Config.LLM_REQUEST_TIMEOUT_SECONDS)
+            client_cls = AsyncAnthropic if provider == 'claude' else AsyncOpenAI
+            # Retries of async calls are paced by the admission controller (llm_admission_service)
+            client = client_cls(api_key=api_key, http_client=http_client, max_retries=0)
+            self._async_clients[key] = (client, loop)
+            logger.info(f"Created shared async {provider} client")
+            return client
+
+
+    def get_gemini_model(self, api_key: str, model_name: str, system_instruction: Optional[str] = None):
+        """
+        Configures the Gemini SDK once per key and returns a model handle shared
+        within the running event loop, with an async transport of its own.
+        """
+        loop = _current_loop()
+        key = (model_name, system_instruction, id(loop))
+        with self._lock:
+            self._check_pid()
+            if self._gemini_key != api_key:
+                genai.configure(api_key=api_key)
+                self._gemini_key = api_key
+                self._gemini_models.clear()
+            entry = self._gemini_models.get(key)
+            if entry is not None and entry[1] is loop and not (loop and loop.is_closed()):
+                return entry[0]
+            for stale in [k for k, (_, model_loop) in self._gemini_models.items() if model_loop and model_loop.is_closed()]:
+                self._gemini_models.pop(stale, None)
+            model = genai.GenerativeModel(model_name, system_instruction=system_instruction)
+            if loop is not None:
+                try:
+                    # Created inside the loop, so its grpc.aio channel belongs to that loop
+                    model._async_client = genai_client._client_manager.make_client("generative_async")
+                except Exception as e:
+                    logger.warning(f"Could not create a per-loop Gemini async client, using the SDK default: {e}")
+            self._gemini_models[key] = (model, loop)
+            return model
+
+
+    async def aclose_all(self) -> None:
+        """Closes the clients owned by the running loop and every sync client."""
+        loop = _current_loop()
+        with self._lock:
+            owned = [key for key, (_, client_loop) in self._async_clients.items() if client_loop is loop]
+            async_clients = [self._async_clients.pop(key)[0] for key in owned]
+            owned_models = [key for key, (_, model_loop) in self._gemini_models.items() if loop is not None and model_loop is loop]
+            gemini_clients = [getattr(self._gemini_models.pop(key)[0], '_async_client', None) for key in owned_models]
+            sync_clients = list(self._sync_clients.values())
+            self._sync_clients.clear()
+        for client in async_clients:
+            try:
+                await client.close()
+            except Exception as e:
+                logger.warning(f"Failed to close async LLM client: {e}")
+        for client in gemini_clients:
+            try:
+                if client is not None:
+                    await client.transport.close()
+            except Exception as e:
+                logger.warning(f"Failed to close Gemini async client: {e}")
+        for client in sync_clients:
+            try:
+                client.close()
+            except Exception as e:
+                logger.warning(f"Failed to close LLM client: {e}")
+
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "sync_clients": len(self._sync_clients),
+                "async_clients": len(self._async_clients),
+                "gemini_models": len(self._gemini_models),
+            }
+
+
+llm_client_registry = LLMClientRegistry()
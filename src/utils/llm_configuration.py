@@ -1,20 +1,48 @@
 # main.pyimport os
-import google.generativeai as genai
-from openai import OpenAI
-from anthropic import Anthropic
 from config import Config
-from src.utils.exceptions import LLMNotConfiguredError
+from src.utils.exceptions import LLMNotConfiguredError, LLMRateLimitedError
+from src.utils.llm_clients import llm_client_registry
+from src.services.llm_cache_service import llm_response_cache
+from src.services.llm_admission_service import llm_admission
+from src.services.llm_hedging_service import llm_hedging
+import asyncio
 import logging
+import time
 import re, json
 
 logger = logging.getLogger(__name__)
 
 
+# Sent with every call in stateless mode; the stage prompt carries the actual instructions.
+SYSTEM_PROMPT = (
+    "You are AskIt, an assistant that answers questions about an organization's databases. "
+    "You only ever plan read-only queries. Follow the instructions of each request exactly and, "
+    "when asked for JSON, reply with a single raw JSON object and nothing else."
+)
+
+
 class LLMConfig:
     SUPPORTED_PROVIDERS = ['gemini', 'claude', 'openai']
+    CONTEXT_MODES = ['stateless', 'session']
 
-    def __init__(self, model_provider: str = None, initial_history: list = None, model_name: str = None):
+    def __init__(self, model_provider: str = None, initial_history: list = None, model_name: str = None, context_mode: str = None):
         self.model_provider = model_provider.lower()
+
+        # 'stateless': every call sends the system prompt, a compact conversation summary and the stage prompt only.
+        # 'session': prompts accumulate in one conversation, so each call re-sends all earlier prompts.
+        self.context_mode = (context_mode or Config.LLM_CONTEXT_MODE).lower()
+        if self.context_mode not in self.CONTEXT_MODES:
+            logger.warning(f"Unsupported LLM context mode: '{self.context_mode}'. Defaulting to 'stateless'.")
+            self.context_mode = 'stateless'
+        # Token usage per pipeline stage, e.g. {'plan': {'calls': 1, 'input_tokens': 1200, 'output_tokens': 300}}
+        self.usage = {}
+
+        # Response cache scope, set per request: the organization, the schema version and a bypass flag
+        self.organization_id = None
+        self.schema_version = None
+        self.bypass_cache = False
+        # Stateless copies on the other providers of a stage's provider chain (see `_stage_chain`)
+        self._peers = {}
         
         if self.model_provider not in self.SUPPORTED_PROVIDERS:
             logger.warning(f"Unsupported model provider: '{model_provider}'. Supported providers are: {self.SUPPORTED_PROVIDERS}")
@@ -26,13 +54,15 @@ class LLMConfig:
         
         # Initialize the appropriate client and model
         self._client = None
+        # Provider clients are shared per worker (see llm_clients); only conversation state lives here
+        self._api_key = None
         if self.model_provider == 'gemini':
             api_key = Config.GEMINI_API_KEY
             if not api_key:
                 raise LLMNotConfiguredError("GOOGLE_API_KEY environment variable not set.")
-            genai.configure(api_key=api_key)
             self.model_name = model_name or 'gemini-2.0-flash'
-            self._client = genai.GenerativeModel(self.model_name)
+            self._client = llm_client_registry.get_gemini_model(api_key, self.model_name)
+            self._stateless_model = llm_client_registry.get_gemini_model(api_key, self.model_name, SYSTEM_PROMPT)
             # Start a chat session with the initial history
             self.chat_history = self._prepare_gemini_history()
             self._chat_session = self._client.start_chat(history=self.chat_history) # History here may be redundant
@@ -43,7 +73,8 @@ class LLMConfig:
             if not api_key:
                 raise LLMNotConfiguredError("ANTHROPIC_API_KEY environment variable not set.")
             self.model_name = model_name or 'claude-3-haiku-20240307'
-            self._client = Anthropic(api_key=api_key)
+            self._api_key = api_key
+            self._client = llm_client_registry.get_sync_client('claude', api_key)
             self.chat_history = self._prepare_history()
 
 
@@ -52,7 +83,8 @@ class LLMConfig:
             if not api_key:
                 raise LLMNotConfiguredError("OPENAI_API_KEY environment variable not set.")
             self.model_name = model_name or 'gpt-4o'
-            self._client = OpenAI(api_key=api_key)
+            self._api_key = api_key
+            self._client = llm_client_registry.get_sync_client('openai', api_key)
             self.chat_history = self._prepare_history()
         
         # default
@@ -60,9 +92,9 @@ class LLMConfig:
             api_key = Config.GEMINI_API_KEY
             if not api_key:
                 raise ValueError("GOOGLE_API_KEY environment variable not set.")
-            genai.configure(api_key=api_key)
             self.model_name = 'gemini-2.0-flash' # A good default
-            self._client = genai.GenerativeModel(self.model_name)
+            self._client = llm_client_registry.get_gemini_model(api_key, self.model_name)
+            self._stateless_model = llm_client_registry.get_gemini_model(api_key, self.model_name, SYSTEM_PROMPT)
             # Start a chat session with the initial history
             self._chat_session = self._client.start_chat(history=self._prepare_gemini_history())
 
@@ -86,6 +118,32 @@ class LLMConfig:
         return gemini_history
     
 
+    def _summarize_history(self) -> str:
+        """
+        Compacts the conversation for stateless calls: the latest messages only,
+        with answers reduced to their analysis text, queries and table shapes.
+        """
+        limit = Config.LLM_HISTORY_SUMMARY_CHARS
+        lines = []
+        for msg in self.initial_history[-Config.LLM_HISTORY_SUMMARY_MESSAGES:]:
+            content = msg.content
+            if isinstance(content, dict):
+                parts = []
+                if content.get("analysis"):
+                    parts.append(str(content["analysis"])[:limit])
+                for query in (content.get("generated_query") or {}).get("queries", []):
+                    parts.append(f"query on {query.get('db_id')}: {json.dumps(query.get('query'), default=str)[:limit]}")
+                for table in content.get("data") or []:
+                    if isinstance(table, dict):
+                        columns = [col["name"] if isinstance(col, dict) else col for col in table.get("columns") or []]
+                        parts.append(f"table {table.get('table_name', '')}: columns {columns}, {table.get('row_count', len(table.get('rows') or []))} rows")
+                text = " | ".join(parts)
+            else:
+                text = str(content)[:limit]
+            lines.append(f"{msg.role}: {text}")
+        return "\n".join(lines)
+
+
     # For claude and openai
     def _prepare_history(self):
         history = []
@@ -114,6 +172,7 @@ class LLMConfig:
                 # Claude requires the full history each time
                 response = self._client.messages.create(
                     model=self.model_name,
+                    max_tokens=Config.LLM_MAX_OUTPUT_TOKENS,
                     messages=self.chat_history
                 )
                 response_text = response.content[0].text
@@ -134,6 +193,372 @@ class LLMConfig:
 
 
 
+    async def agenerate_response(self, prompt: str, stage: str = "default", include_history: bool = True) -> dict:
+        """
+        Async counterpart of `generate_response`. Uses the providers' async
+        clients so a pending LLM call never blocks the event loop; providers
+        without one are run in a worker thread.
+
+        In stateless mode only the system prompt, the conversation summary (when
+        `include_history` is set) and `prompt` are sent, and responses are served
+        from the organization's response cache when possible. Token usage is
+        recorded under `stage`.
+        """
+        if self._api_key is None and not hasattr(getattr(self, '_chat_session', None), 'send_message_async'):
+            return await asyncio.to_thread(self.generate_response, prompt)
+
+        if self.context_mode != 'stateless':
+            start_time = time.time()
+            response_text, usage = await self._acall_session(prompt)
+            self._record_usage(stage, usage, (time.time() - start_time) * 1000)
+            return self.parse_json_response(response_text)
+
+        content = self._stateless_content(prompt, include_history)
+        chain = self._stage_chain(stage)
+        cache_key, cached = await self._cached_response(stage, content, chain)
+        if cached is not None:
+            return cached
+
+        start_time = time.time()
+        if chain and chain != [self]:
+            winner, response, usage = await self._ahedged_response(stage, content, chain, start_time)
+            elapsed = (time.time() - start_time) * 1000
+        else:
+            response_text, usage = await self._acall_stateless(content)
+            elapsed = (time.time() - start_time) * 1000
+            self._record_usage(stage, usage, elapsed)
+            winner, response = self, self.parse_json_response(response_text)
+
+        if cache_key is not None and isinstance(response, dict):
+            input_tokens, output_tokens = usage or (None, None)
+            await llm_response_cache.put(cache_key, response, elapsed, input_tokens, output_tokens, winner.model_provider, winner.model_name)
+        return response
+
+
+    async def astream_response(self, prompt: str, stage: str = "default", include_history: bool = True):
+        """
+        Streaming counterpart of `agenerate_response`: an async generator of the
+        completion text as the provider emits it. Usage is recorded and the parsed
+        response cached once the stream is exhausted.
+
+        Only stateless calls are streamed; in session mode, for providers without
+        an async client and on a cache hit the whole response is yielded at once.
+        """
+        stateless_model = getattr(self, '_stateless_model', None)
+        if self.context_mode != 'stateless' or (self._api_key is None and not hasattr(stateless_model, 'generate_content_async')):
+            yield json.dumps(await self.agenerate_response(prompt, stage, include_history), default=str)
+            return
+
+        content = self._stateless_content(prompt, include_history)
+        chain = self._stage_chain(stage)
+        cache_key, cached = await self._cached_response(stage, content, chain)
+        if cached is not None:
+            yield json.dumps(cached, default=str)
+            return
+
+        start_time = time.time()
+        result = {"peer": self}
+        stream = self._astream_hedged(stage, content, chain, result) if chain and chain != [self] else self._astream_stateless(stage, content, result)
+        async for text in stream:
+            yield text
+
+        elapsed = (time.time() - start_time) * 1000
+        response = self.parse_json_response(result["text"])
+        if cache_key is not None and isinstance(response, dict):
+            input_tokens, output_tokens = result["usage"] or (None, None)
+            await llm_response_cache.put(cache_key, response, elapsed, input_tokens, output_tokens, result["peer"].model_provider, result["peer"].model_name)
+
+
+    async def _astream_stateless(self, stage: str, content: str, result: dict):
+        """
+        Streams one stateless completion from this provider and records its usage.
+        The full text and the usage are left in `result` once the stream is exhausted.
+        """
+        start_time = time.time()
+        estimated = llm_admission.estimate_tokens(len(SYSTEM_PROMPT) + len(content))
+        deadline = llm_admission.deadline()
+        attempt = 0
+        while True:
+            await llm_admission.acquire(self.model_provider, self.model_name, estimated, deadline)
+            chunks, usage = [], None
+            try:
+                if self.model_provider == 'claude':
+                    async with self._async_client().messages.stream(
+                        model=self.model_name,
+                        max_tokens=Config.LLM_MAX_OUTPUT_TOKENS,
+                        system=SYSTEM_PROMPT,
+                        messages=[{"role": "user", "content": content}]
+                    ) as stream:
+                        async for text in stream.text_stream:
+                            chunks.append(text)
+                            yield text
+                        final = await stream.get_final_message()
+                    usage = (final.usage.input_tokens, final.usage.output_tokens)
+
+                elif self.model_provider == 'openai':
+                    stream = await self._async_client().chat.completions.create(
+                        model=self.model_name,
+                        messages=[{"role": "system", "content": SYSTEM_PROMPT}, {"role": "user", "content": content}],
+                        stream=True,
+                        stream_options={"include_usage": True}
+                    )
+                    async for chunk in stream:
+                        if chunk.usage:
+                            usage = (chunk.usage.prompt_tokens, chunk.usage.completion_tokens)
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            text = chunk.choices[0].delta.content
+                            chunks.append(text)
+                            yield text
+
+                else:
+                    response = await self._stateless_model.generate_content_async(content, stream=True)
+                    async for chunk in response:
+                        text = chunk.text if chunk.parts else ""
+                        chunks.append(text)
+                        yield text
+                    usage = self._gemini_usage(response)
+                break
+
+            except LLMRateLimitedError:
+                raise
+            except Exception as e:
+                # Text already forwarded cannot be taken back, so only failures before the first chunk are retried
+                delay = None if chunks else llm_admission.retry_delay(self.model_provider, self.model_name, e, attempt, deadline)
+                if delay is None:
+                    raise LLMNotConfiguredError(e)
+            finally:
+                llm_admission.release(self.model_provider, self.model_name, estimated, usage)
+            attempt += 1
+            await asyncio.sleep(delay)
+
+        self._record_usage(stage, usage, (time.time() - start_time) * 1000)
+        result.update(text="".join(chunks), usage=usage)
+
+
+    async def _astream_hedged(self, stage: str, content: str, chain: list, result: dict):
+        """
+        `_astream_stateless` over the stage's provider chain: the provider that
+        streams its first chunk first wins and the others are cancelled. A
+        streamed answer cannot be validated before it ends, so the race is
+        decided on the first chunk; later failures of the winner are raised.
+        """
+        streams, results = {}, {}
+
+        async def first_chunk(peer):
+            results[peer] = {}
+            streams[peer] = peer._astream_stateless(stage, content, results[peer])
+            return await streams[peer].__anext__()
+
+        try:
+            winner, chunk = await llm_hedging.race(f"{stage}_stream", chain, first_chunk, lambda peer, text: text)
+            yield chunk
+            async for text in streams[winner]:
+                yield text
+            result.update(results[winner], peer=winner)
+        finally:
+            for stream in streams.values():
+                await stream.aclose()
+            self._merge_peer_usage(chain)
+
+
+    async def _ahedged_response(self, stage: str, content: str, chain: list, start_time: float):
+        """
+        Sends `content` through the stage's provider chain (see `llm_hedging`)
+        and returns the peer that answered first with a JSON object, that object
+        and its usage.
+        """
+        def accept(peer, reply):
+            response_text, usage = reply
+            peer._record_usage(stage, usage, (time.time() - start_time) * 1000)
+            response = peer.parse_json_response(response_text)
+            if not isinstance(response, dict):
+                raise ValueError("Response is not a JSON object")
+            return response, usage
+
+        try:
+            winner, (response, usage) = await llm_hedging.race(stage, chain, lambda peer: peer._acall_stateless(content), accept)
+            return winner, response, usage
+        finally:
+            self._merge_peer_usage(chain)
+
+
+    def _stage_chain(self, stage: str) -> list:
+        """
+        The LLMConfigs of the stage's provider chain (LLM_STAGE_PROVIDERS), this
+        one included when listed. Providers without an API key are skipped.
+        Empty when the stage has no chain; only stateless calls are hedged.
+        """
+        chain = []
+        for provider, model in llm_hedging.chain(stage):
+            if provider == self.model_provider and model in (None, self.model_name):
+                peer = self
+            else:
+                if (provider, model) not in self._peers:
+                    try:
+                        self._peers[(provider, model)] = self.fork(provider, model)
+                    except Exception as e:
+                        logger.warning(f"Skipping {provider}/{model or 'default'} in the '{stage}' provider chain: {e}")
+                        self._peers[(provider, model)] = None
+                peer = self._peers[(provider, model)]
+            if peer is not None and peer not in chain:
+                chain.append(peer)
+        return chain
+
+
+    def _merge_peer_usage(self, chain: list) -> None:
+        for peer in chain:
+            if peer is not self:
+                self.merge_usage(peer)
+                peer.usage = {}
+
+
+    def _stateless_content(self, prompt: str, include_history: bool) -> str:
+        history = self._summarize_history() if include_history else ""
+        return f"### Conversation so far ###\n{history}\n\n{prompt}" if history else prompt
+
+
+    async def _cached_response(self, stage: str, content: str, chain: list = None):
+        """
+        Identical stateless requests of the same organization are answered from the cache.
+        Returns (cache key, cached response); the key is None when caching does not apply.
+        Hedged stages are keyed by their whole provider chain, since any peer may answer;
+        the entry records which one did.
+        """
+        if not (Config.LLM_CACHE_ENABLED and self.organization_id):
+            return None, None
+        if self.bypass_cache:
+            await llm_response_cache.record_bypass(self.organization_id)
+            return None, None
+        provider, model = self.model_provider, self.model_name
+        if chain and chain != [self]:
+            provider, model = "hedged", ",".join(f"{peer.model_provider}/{peer.model_name}" for peer in chain)
+        cache_key = llm_response_cache.make_key(self.organization_id, provider, model, stage, self.schema_version, f"{SYSTEM_PROMPT}\n{content}")
+        cached = await llm_response_cache.get(cache_key)
+        if cached is not None:
+            self.usage.setdefault(stage, {"calls": 0, "input_tokens": 0, "output_tokens": 0}).setdefault("cache_hits", 0)
+            self.usage[stage]["cache_hits"] += 1
+            logger.info(f"LLM cache hit [{stage}] {provider}/{model}")
+        return cache_key, cached
+
+
+    async def _acall_stateless(self, content: str):
+        # Admitted by the provider/model rate limits; throttling and 5xx responses are retried there
+        estimated = llm_admission.estimate_tokens(len(SYSTEM_PROMPT) + len(content))
+        try:
+            return await llm_admission.call(self.model_provider, self.model_name, estimated, lambda: self._arequest_stateless(content))
+        except LLMRateLimitedError:
+            raise
+        except Exception as e:
+            raise LLMNotConfiguredError(e)
+
+
+    async def _arequest_stateless(self, content: str):
+        if self.model_provider == 'claude':
+            response = await self._async_client().messages.create(
+                model=self.model_name,
+                max_tokens=Config.LLM_MAX_OUTPUT_TOKENS,
+                system=SYSTEM_PROMPT,
+                messages=[{"role": "user", "content": content}]
+            )
+            return response.content[0].text, (response.usage.input_tokens, response.usage.output_tokens)
+
+        elif self.model_provider == 'openai':
+            response = await self._async_client().chat.completions.create(
+                model=self.model_name,
+                messages=[{"role": "system", "content": SYSTEM_PROMPT}, {"role": "user", "content": content}]
+            )
+            return response.choices[0].message.content, (response.usage.prompt_tokens, response.usage.completion_tokens)
+
+        else:
+            response = await self._stateless_model.generate_content_async(content)
+            return response.text.strip(), self._gemini_usage(response)
+
+
+    async def _acall_session(self, prompt: str):
+        # Add user's prompt to our internal history
+        self.chat_history.append({"role": "user", "content": prompt})
+
+        estimated = llm_admission.estimate_tokens(len(json.dumps(self.chat_history, default=str)))
+        try:
+            return await llm_admission.call(self.model_provider, self.model_name, estimated, lambda: self._arequest_session(prompt))
+        except Exception as e:
+            self.chat_history.pop()
+            if isinstance(e, LLMRateLimitedError):
+                raise
+            raise LLMNotConfiguredError(e)
+
+
+    async def _arequest_session(self, prompt: str):
+        if self.model_provider == 'claude':
+            # Claude requires the full history each time
+            response = await self._async_client().messages.create(
+                model=self.model_name,
+                max_tokens=Config.LLM_MAX_OUTPUT_TOKENS,
+                messages=self.chat_history
+            )
+            return response.content[0].text, (response.usage.input_tokens, response.usage.output_tokens)
+
+        elif self.model_provider == 'openai':
+            # OpenAI also requires the full history
+            response = await self._async_client().chat.completions.create(
+                model=self.model_name,
+                messages=self.chat_history
+            )
+            return response.choices[0].message.content, (response.usage.prompt_tokens, response.usage.completion_tokens)
+
+        else:
+            # Gemini (and the default): send only the new prompt to the ongoing session
+            response = await self._chat_session.send_message_async(prompt)
+            return response.text.strip(), self._gemini_usage(response)
+
+
+    def _async_client(self):
+        # Resolved per call: async clients belong to the event loop that awaits them
+        return llm_client_registry.get_async_client(self.model_provider, self._api_key)
+
+
+    @staticmethod
+    def _gemini_usage(response):
+        metadata = getattr(response, 'usage_metadata', None)
+        if metadata is None:
+            return None, None
+        return metadata.prompt_token_count, metadata.candidates_token_count
+
+
+    def _record_usage(self, stage: str, usage, elapsed_ms: float) -> None:
+        input_tokens, output_tokens = usage or (None, None)
+        totals = self.usage.setdefault(stage, {"calls": 0, "input_tokens": 0, "output_tokens": 0})
+        totals["calls"] += 1
+        totals["input_tokens"] += input_tokens or 0
+        totals["output_tokens"] += output_tokens or 0
+        logger.info(f"LLM usage [{stage}] {self.model_provider}/{self.model_name} ({self.context_mode}): input={input_tokens} output={output_tokens} tokens, {elapsed_ms:.2f} ms")
+
+
+    def fork(self, model_provider: str = None, model_name: str = None) -> "LLMConfig":
+        """
+        A stateless copy with the same provider, model, history and cache scope,
+        for calls that run concurrently with this one (e.g. speculative planning).
+        With `model_provider` the copy uses that provider instead (and its default
+        model unless `model_name` is given). Its usage is tracked separately; see `merge_usage`.
+        """
+        provider = (model_provider or self.model_provider).lower()
+        if model_name is None and provider == self.model_provider:
+            model_name = self.model_name
+        forked = LLMConfig(provider, self.initial_history, model_name, 'stateless')
+        forked.organization_id = self.organization_id
+        forked.schema_version = self.schema_version
+        forked.bypass_cache = self.bypass_cache
+        return forked
+
+
+    def merge_usage(self, other: "LLMConfig") -> None:
+        for stage, totals in other.usage.items():
+            merged = self.usage.setdefault(stage, {"calls": 0, "input_tokens": 0, "output_tokens": 0})
+            for name, value in totals.items():
+                merged[name] = merged.get(name, 0) + value
+
+
+
     def parse_json_response(self, response_text):
         # If already a dict, return as is
         if isinstance(response_text, dict):
@@ -0,0 +1,9 @@
+from src.extensions import redis_client
+
+
+def get_redis():
+    """
+    Returns the shared Redis client, or None when Redis is not configured.
+    Works outside of a Flask app context, e.g. on the orchestrator's event loop.
+    """
+    return getattr(redis_client, "_redis_client", None)
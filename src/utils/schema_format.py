@@ -0,0 +1,101 @@
+import json
+import re
+from datetime import date, datetime
+from typing import Any, Dict, Optional
+
+
+# Explains the compact notation to the LLM; included once per prompt.
+SCHEMA_FORMAT_LEGEND = (
+    "Schema notation: one table per line as `table(column:type, ...)`. "
+    "`PK` marks primary key columns, `?` marks nullable columns and `->table.column` is a foreign key. "
+    "MongoDB collections are written as `collection{field.path:type, ...}`, with alternatives separated by `|`."
+)
+
+# Verbose SQL type names and their short forms
+_TYPE_ALIASES = {
+    "integer": "int",
+    "bigint": "bigint",
+    "smallint": "smallint",
+    "character varying": "varchar",
+    "character": "char",
+    "timestamp without time zone": "timestamp",
+    "timestamp with time zone": "timestamptz",
+    "time without time zone": "time",
+    "double precision": "double",
+    "boolean": "bool",
+}
+
+
+def _json_default(obj: Any) -> str:
+    # BSON and date/time values that json cannot serialize natively
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    return str(obj)
+
+
+def _short_type(type_name: Any) -> str:
+    text = str(type_name).strip().lower()
+    match = re.match(r"^([a-z ]+?)\s*(\(.*\))?$", text)
+    if not match:
+        return text
+    base, size = match.group(1), match.group(2) or ""
+    return _TYPE_ALIASES.get(base, base).replace(" ", "_") + size
+
+
+def render_table(name: str, details: Dict[str, Any]) -> str:
+    """Renders one table or collection as a single line of the compact notation."""
+    if "fields" in details:
+        fields = ", ".join(f"{field}:{'|'.join(types)}" for field, types in details["fields"].items())
+        note = f"  # {details['note']}" if details.get("note") else ""
+        return f"{name}{{{fields}}}{note}"
+
+    primary_key = set(details.get("primary_key") or [])
+    references = {fk["column"]: f"{fk['referred_table']}.{fk['referred_column']}" for fk in details.get("foreign_keys") or []}
+    columns = []
+    for col in details.get("columns", []):
+        text = f"{col['name']}:{_short_type(col['type'])}"
+        if col.get("nullable"):
+            text += "?"
+        if col["name"] in primary_key:
+            text += " PK"
+        if col["name"] in references:
+            text += f" ->{references[col['name']]}"
+        columns.append(text)
+    return f"{name}({', '.join(columns)})"
+
+
+def render_schema_lines(schema: Dict[str, Any]) -> Dict[str, str]:
+    """Renders every table of a schema; stored with the cached schema so prompts can reuse it."""
+    return {name: render_table(name, details) for name, details in schema.items()}
+
+
+def render_schema(schema_repr: Dict[str, Any]) -> str:
+    """
+    Renders the tables of `schema_repr["schema"]` in the compact notation, reusing
+    the precomputed lines when present. Only tables still in the schema are
+    rendered, so a pruned copy of a cached entry renders correctly.
+    """
+    lines = schema_repr.get("schema_lines") or {}
+    schema = schema_repr.get("schema") or {}
+    return "\n".join(lines.get(name) or render_table(name, details) for name, details in schema.items())
+
+
+def render_examples(example_data: Optional[Dict[str, Any]]) -> str:
+    """Renders example rows as one minified JSON line per table."""
+    if not example_data:
+        return "Not available"
+    return "\n".join(
+        f"{name}: {json.dumps(rows, separators=(',', ':'), default=_json_default)}"
+        for name, rows in example_data.items()
+    )
+
+
+def render_databases(schemas: Dict[str, Dict[str, Any]], include_examples: bool = False) -> str:
+    """Renders several databases, each headed by its id and type."""
+    blocks = []
+    for db_id, schema_repr in schemas.items():
+        block = f"[db_id: {db_id} | db_type: {schema_repr['db_type']}]\n{render_schema(schema_repr)}"
+        if include_examples:
+            block += f"\nexample_data:\n{render_examples(schema_repr.get('example_data'))}"
+        blocks.append(block)
+    return "\n\n".join(blocks)
@@ -0,0 +1,32 @@
+from src.services.plan_cache_service import PlanCache, question_shape
+
+
+def _plan(query):
+    return {"queries": [{"query_id": "q1", "db_id": "db1", "query_type": "sql", "query": query}]}
+
+
+def _lookup(cache, question):
+    return cache.lookup("org", "v1", "query", ["db1"], question)
+
+
+def test_count_question_does_not_reuse_listing_plan():
+    cache = PlanCache(max_entries=10, ttl_seconds=60)
+    cache.store("org", "v1", "query", ["db1"], "list all users", _plan("SELECT * FROM users"))
+
+    assert _lookup(cache, "how many users are there?") is None
+    assert _lookup(cache, "show me all users") is not None
+
+
+def test_aggregate_question_does_not_reuse_grouped_listing_plan():
+    cache = PlanCache(max_entries=10, ttl_seconds=60)
+    cache.store("org", "v1", "query", ["db1"], "show orders by customer", _plan("SELECT * FROM orders ORDER BY customer_id"))
+
+    assert _lookup(cache, "how much were orders for each customer") is None
+    assert _lookup(cache, "list the orders by customer") is not None
+
+
+def test_question_shape():
+    assert question_shape("list all users") == []
+    assert question_shape("how many users are there?") == ["count"]
+    assert question_shape("how much were orders for each customer") == ["group", "sum"]
+    assert question_shape("top 5 customers by total spend") == ["group", "order", "sum"]